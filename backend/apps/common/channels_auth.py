@@ -0,0 +1,58 @@
+"""
+JWT authentication for Channels WebSocket connections.
+
+Browsers cannot set headers on a WebSocket handshake, so the access token
+travels in the query string (`?token=<access token>`); native clients may
+send the usual `Authorization: Bearer <token>` header instead. A valid
+token replaces scope["user"]; without one the session user from
+AuthMiddlewareStack is kept (AnonymousUser for token-only clients).
+"""
+import logging
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+logger = logging.getLogger(__name__)
+
+
+def _token_from_scope(scope):
+    token = parse_qs(scope.get("query_string", b"").decode()).get("token")
+    if token:
+        return token[0]
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] == "Bearer":
+                return parts[1]
+    return None
+
+
+@database_sync_to_async
+def _user_for_token(raw_token):
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed) as e:
+        logger.info(f"Rejected WebSocket token: {e}")
+        return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Sets scope["user"] from a simplejwt access token when one is sent."""
+
+    async def __call__(self, scope, receive, send):
+        raw_token = _token_from_scope(scope)
+        if raw_token:
+            from django.contrib.auth.models import AnonymousUser
+
+            scope = dict(scope, user=await _user_for_token(raw_token) or AnonymousUser())
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Session auth with JWT on top; a token, when present, wins."""
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
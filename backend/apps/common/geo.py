@@ -0,0 +1,186 @@
+"""
+Geospatial helpers shared across VehicAid apps.
+
+Distances use the Haversine formula. The batched variants take arrays of
+candidate coordinates and return every distance in one NumPy call, which is
+what dispatch, pricing and spare-part search use instead of per-row loops.
+
+Providers are bucketed into geohash cells so that nearby lookups only have to
+read the handful of cells around a point instead of every online provider.
+"""
+from math import asin, ceil, cos, radians, sin, sqrt
+
+import numpy as np
+
+# Standard geohash base32 alphabet
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precision stored on provider rows (~1.2km x 0.6km cells)
+GEO_CELL_PRECISION = 6
+
+# Upper bound on prefixes used for a single lookup, keeps the OR query small
+MAX_LOOKUP_CELLS = 16
+
+KM_PER_DEGREE_LAT = 111.32
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres between two points."""
+    lat1, lon1, lat2, lon2 = map(radians, map(float, (lat1, lon1, lat2, lon2)))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def haversine_many(latitude, longitude, latitudes, longitudes):
+    """
+    Distances in kilometres from one point to many.
+
+    `latitudes` and `longitudes` may be any sequence (floats, Decimals) or
+    NumPy arrays; a float64 array of the same length is returned.
+    """
+    lat1 = radians(float(latitude))
+    lon1 = radians(float(longitude))
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Returns (lat_min, lat_max, lon_min, lon_max) enclosing the search circle.
+    Cheap enough to push into a database range filter before any distance
+    maths runs.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    dlat, dlon = _bounding_degrees(latitude, radius_km)
+    return (
+        max(latitude - dlat, -90.0),
+        min(latitude + dlat, 90.0),
+        longitude - dlon,
+        longitude + dlon,
+    )
+
+
+def nearest_within(latitude, longitude, latitudes, longitudes, radius_km, limit=None):
+    """
+    Returns (indices, distances) of the candidates within `radius_km`, nearest
+    first. A bounding-box mask discards far points before any trigonometry.
+    """
+    lats = np.asarray(latitudes, dtype=np.float64)
+    lons = np.asarray(longitudes, dtype=np.float64)
+    lat_min, lat_max, lon_min, lon_max = bounding_box(latitude, longitude, radius_km)
+
+    candidates = np.flatnonzero(
+        (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+    )
+    distances = haversine_many(latitude, longitude, lats[candidates], lons[candidates])
+
+    inside = distances <= radius_km
+    candidates = candidates[inside]
+    distances = distances[inside]
+
+    order = np.argsort(distances, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    return candidates[order], distances[order]
+
+
+def encode_geohash(latitude, longitude, precision=GEO_CELL_PRECISION):
+    """Encodes a coordinate pair into a geohash string of the given precision."""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def cell_dimensions(precision):
+    """Returns (height, width) in degrees of a geohash cell at `precision`."""
+    total_bits = 5 * precision
+    lon_bits = ceil(total_bits / 2)
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def _bounding_degrees(latitude, radius_km):
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    # Clamp cos() near the poles so the longitude span stays finite
+    dlon = radius_km / (KM_PER_DEGREE_LAT * max(cos(radians(latitude)), 0.01))
+    return dlat, dlon
+
+
+def _frange(start, stop, step):
+    value = start
+    while value < stop:
+        yield value
+        value += step
+    yield stop
+
+
+def covering_cells(latitude, longitude, radius_km, max_cells=MAX_LOOKUP_CELLS):
+    """
+    Returns the geohash prefixes that together cover a circle of `radius_km`
+    around the point. The finest precision that needs at most `max_cells`
+    prefixes is chosen, so small radii read tight cells and large radii fall
+    back to coarser ones.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    dlat, dlon = _bounding_degrees(latitude, radius_km)
+
+    precision = 1
+    for candidate in range(GEO_CELL_PRECISION, 0, -1):
+        height, width = cell_dimensions(candidate)
+        rows = ceil(2 * dlat / height) + 1
+        cols = ceil(2 * dlon / width) + 1
+        if rows * cols <= max_cells:
+            precision = candidate
+            break
+
+    height, width = cell_dimensions(precision)
+    lat_min = max(latitude - dlat, -90.0)
+    lat_max = min(latitude + dlat, 90.0)
+
+    cells = set()
+    for lat in _frange(lat_min, lat_max, height):
+        for lon in _frange(longitude - dlon, longitude + dlon, width):
+            # Wrap across the antimeridian
+            wrapped = ((lon + 180.0) % 360.0) - 180.0
+            cells.add(encode_geohash(lat, wrapped, precision))
+    return sorted(cells)
@@ -1,13 +1,218 @@
-import firebase_admin
-from firebase_admin import credentials, messaging
-from django.conf import settings
+"""
+Push notifications over Firebase Cloud Messaging.
+
+Pushes are sent in batches. PushBatch collects messages and flushes them in
+as few FCM calls as possible:
+
+- recipients of an identical message share send_each_for_multicast calls,
+- everything else goes out in send_each calls,
+- each call carries up to FCM_BATCH_SIZE (500, the FCM limit) messages.
+
+Tokens that FCM reports as unregistered or invalid are cleared from
+CustomUser.fcm_device_token with one UPDATE per flush, so dead devices are
+not retried forever. Delivery counters (sent, failed, pruned, skipped,
+calls) accumulate in the shared state store; see
+PushNotificationService.stats().
+
+send_to_user and send_to_users are one-flush wrappers. Inside a
+PushNotificationService.batch() block, send_to_user only queues, and the
+block's exit flushes everything at once.
+
+The FCM SDK is reached through a backend object. PUSH_FAKE_BACKEND swaps
+in FakeFCMBackend, which records messages instead of sending them, for
+tests and load runs.
+"""
 import logging
 import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import firebase_admin
+from django.conf import settings
+from firebase_admin import credentials, exceptions, messaging
 
 logger = logging.getLogger(__name__)
 
+STATS_KEY = "vehicaid:push:stats"
+STATS_FIELDS = ("sent", "failed", "pruned", "skipped", "calls")
+
+# FCM accepts at most 500 messages per send_each / multicast call
+FCM_MAX_BATCH = 500
+
+
+def is_dead_token_error(error):
+    """True for FCM errors meaning the token will never work again."""
+    if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+        return True
+    return isinstance(error, exceptions.InvalidArgumentError) and "registration token" in str(error).lower()
+
+
+class FCMBackend:
+    """Sends through the Firebase Admin SDK; returns None or the error per message."""
+
+    @property
+    def available(self):
+        PushNotificationService.initialize()
+        return PushNotificationService._initialized
+
+    def send_each(self, messages):
+        response = messaging.send_each(messages)
+        return [None if r.success else r.exception for r in response.responses]
+
+    def send_multicast(self, message):
+        response = messaging.send_each_for_multicast(message)
+        return [None if r.success else r.exception for r in response.responses]
+
+
+class FakeFCMBackend:
+    """
+    Records messages instead of sending them. Tokens in `invalid_tokens`
+    fail as unregistered; `calls` holds one entry per FCM call.
+    """
+    available = True
+
+    def __init__(self, invalid_tokens=()):
+        self.invalid_tokens = set(invalid_tokens)
+        self.calls = []
+        self.delivered = []
+        self._lock = threading.Lock()
+
+    def _deliver(self, token, title, body, data):
+        if token in self.invalid_tokens:
+            return messaging.UnregisteredError("Requested entity was not found.")
+        with self._lock:
+            self.delivered.append({"token": token, "title": title, "body": body, "data": data})
+        return None
+
+    def send_each(self, messages):
+        with self._lock:
+            self.calls.append(("send_each", len(messages)))
+        return [
+            self._deliver(m.token, m.notification.title, m.notification.body, m.data or {}) for m in messages
+        ]
+
+    def send_multicast(self, message):
+        with self._lock:
+            self.calls.append(("multicast", len(message.tokens)))
+        notification = message.notification
+        return [
+            self._deliver(token, notification.title, notification.body, message.data or {})
+            for token in message.tokens
+        ]
+
+
+def _state_client():
+    from apps.services.services.live_location import get_state_client
+
+    return get_state_client()
+
+
+class PushBatch:
+    """Collects push messages and sends them with as few FCM calls as possible."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.pending = []
+        self.skipped = 0
+
+    def add(self, user, title, body, data=None):
+        """Queues a push for `user`; returns False when they have no device token."""
+        if not user.fcm_device_token:
+            logger.warning(f"Skipping push notification: User {user.id} has no FCM token.")
+            self.skipped += 1
+            return False
+        # FCM data payloads are string to string
+        data = {str(k): str(v) for k, v in (data or {}).items()}
+        self.pending.append((user.id, user.fcm_device_token, title, body, data))
+        return True
+
+    def flush(self):
+        """
+        Sends everything queued. Returns {user id: True/False} for the
+        queued recipients.
+        """
+        pending, self.pending = self.pending, []
+        skipped, self.skipped = self.skipped, 0
+        backend = self.backend or PushNotificationService.get_backend()
+        counts = Counter(skipped=skipped)
+        if not pending:
+            PushNotificationService._record(counts)
+            return {}
+        if not backend.available:
+            logger.warning("Skipping push notifications: Firebase not initialized.")
+            counts["skipped"] += len(pending)
+            PushNotificationService._record(counts)
+            return {user_id: False for user_id, *_ in pending}
+
+        batch_size = min(getattr(settings, "FCM_BATCH_SIZE", FCM_MAX_BATCH), FCM_MAX_BATCH)
+        groups = {}
+        for entry in pending:
+            _, _, title, body, data = entry
+            groups.setdefault((title, body, tuple(sorted(data.items()))), []).append(entry)
+
+        outcomes, singles = [], []
+        for (title, body, _), entries in groups.items():
+            if len(entries) == 1:
+                singles.extend(entries)
+                continue
+            for start in range(0, len(entries), batch_size):
+                chunk = entries[start:start + batch_size]
+                message = messaging.MulticastMessage(
+                    tokens=[token for _, token, *_ in chunk],
+                    notification=messaging.Notification(title=title, body=body),
+                    data=chunk[0][4],
+                )
+                outcomes.extend(zip(chunk, self._call(backend.send_multicast, message, len(chunk))))
+                counts["calls"] += 1
+        for start in range(0, len(singles), batch_size):
+            chunk = singles[start:start + batch_size]
+            messages = [
+                messaging.Message(notification=messaging.Notification(title=title, body=body), data=data, token=token)
+                for _, token, title, body, data in chunk
+            ]
+            outcomes.extend(zip(chunk, self._call(backend.send_each, messages, len(chunk))))
+            counts["calls"] += 1
+
+        results, dead_tokens = {}, set()
+        for (user_id, token, *_), error in outcomes:
+            results[user_id] = error is None
+            if error is None:
+                counts["sent"] += 1
+                continue
+            counts["failed"] += 1
+            if is_dead_token_error(error):
+                dead_tokens.add(token)
+            else:
+                logger.error(f"Error sending FCM message to user {user_id}: {error}")
+        if dead_tokens:
+            counts["pruned"] += self._prune(dead_tokens)
+
+        PushNotificationService._record(counts)
+        return results
+
+    @staticmethod
+    def _call(send, payload, size):
+        try:
+            return send(payload)
+        except Exception as e:
+            # The whole call failed (network, auth): every message in it did
+            logger.error(f"FCM batch call failed: {e}")
+            return [e] * size
+
+    @staticmethod
+    def _prune(tokens):
+        from apps.users.models import CustomUser
+
+        pruned = CustomUser.objects.filter(fcm_device_token__in=tokens).update(fcm_device_token=None)
+        logger.info(f"Cleared {pruned} dead FCM device tokens.")
+        return pruned
+
+
 class PushNotificationService:
     _initialized = False
+    _backend = None
+    _local = threading.local()
 
     @classmethod
     def initialize(cls):
@@ -26,33 +231,79 @@ class PushNotificationService:
         except Exception as e:
             logger.error(f"Failed to initialize Firebase: {e}")
 
+    @classmethod
+    def get_backend(cls):
+        if cls._backend is None:
+            cls._backend = FakeFCMBackend() if getattr(settings, "PUSH_FAKE_BACKEND", False) else FCMBackend()
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend):
+        """Replaces the FCM backend (tests, load runs); returns the old one."""
+        previous, cls._backend = cls._backend, backend
+        return previous
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """Queues every send_to_user in the block and flushes them together on exit."""
+        outer = getattr(cls._local, "batch", None)
+        if outer is not None:
+            # Nested blocks join the outermost batch
+            yield outer
+            return
+        cls._local.batch = PushBatch()
+        try:
+            yield cls._local.batch
+            cls._local.batch.flush()
+        finally:
+            cls._local.batch = None
+
     @classmethod
     def send_to_user(cls, user, title, body, data=None):
         """
-        Sends a push notification to a specific user via FCM.
+        Sends a push notification to a specific user via FCM. Inside
+        batch() the push is only queued and True means it was queued.
         """
-        if not cls._initialized:
-            cls.initialize()
-            if not cls._initialized:
-                logger.warning("Skipping push notification: Firebase not initialized.")
-                return False
-
-        if not user.fcm_device_token:
-            logger.warning(f"Skipping push notification: User {user.id} has no FCM token.")
+        current = getattr(cls._local, "batch", None)
+        if current is not None:
+            return current.add(user, title, body, data)
+        batch = PushBatch()
+        if not batch.add(user, title, body, data):
+            batch.flush()
             return False
+        return batch.flush().get(user.id, False)
+
+    @classmethod
+    def send_to_users(cls, users, title, body, data=None):
+        """Sends the same push to many users in as few FCM calls as possible."""
+        batch = PushBatch()
+        for user in users:
+            batch.add(user, title, body, data)
+        return batch.flush()
 
+    @classmethod
+    def _record(cls, counts):
+        counts = {field: value for field, value in counts.items() if value}
+        if not counts:
+            return
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=data or {},
-                token=user.fcm_device_token,
-            )
-            response = messaging.send(message)
-            logger.info(f"Successfully sent message to user {user.id}: {response}")
-            return True
+            pipe = _state_client().pipeline(transaction=False)
+            for field, value in counts.items():
+                pipe.hincrby(STATS_KEY, field, value)
+            pipe.execute()
         except Exception as e:
-            logger.error(f"Error sending FCM message to user {user.id}: {e}")
-            return False
+            logger.warning(f"Could not record push metrics: {e}")
+
+    @classmethod
+    def stats(cls):
+        """Cumulative delivery counters and the delivery rate."""
+        raw = _state_client().hgetall(STATS_KEY) or {}
+        decoded = {
+            (k.decode() if isinstance(k, bytes) else k): int(v.decode() if isinstance(v, bytes) else v)
+            for k, v in raw.items()
+        }
+        stats = {field: decoded.get(field, 0) for field in STATS_FIELDS}
+        attempted = stats["sent"] + stats["failed"]
+        stats["delivery_rate"] = round(stats["sent"] / attempted, 4) if attempted else None
+        return stats
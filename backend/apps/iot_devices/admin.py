@@ -2,7 +2,7 @@
 
 from django.contrib import admin
 
-from .models import IoTDevice
+from .models import DeviceTelemetryHourly, IoTDevice
 
 
 @admin.register(IoTDevice)
@@ -39,3 +39,12 @@ class IoTDeviceAdmin(admin.ModelAdmin):
             },
         ),
     )
+
+
+@admin.register(DeviceTelemetryHourly)
+class DeviceTelemetryHourlyAdmin(admin.ModelAdmin):
+    list_display = ("device", "hour", "samples", "battery_min", "battery_avg", "battery_max", "button_presses")
+    search_fields = ("device__device_id",)
+    date_hierarchy = "hour"
+    ordering = ("-hour",)
+    list_select_related = ("device",)
@@ -5,3 +5,6 @@ class IotDevicesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.iot_devices"
     label = "iot_devices"
+
+    def ready(self):
+        from . import signals  # noqa: F401  Keep the fleet health summary in sync
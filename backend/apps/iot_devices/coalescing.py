@@ -0,0 +1,180 @@
+"""
+Write coalescing for device heartbeats.
+
+A parked vehicle heartbeats every few seconds with the same position and
+battery level, and every one of those used to rewrite its IoTDevice row
+and append a history row. The coalescer keeps each device's last persisted
+state in Redis and lets a reading through to the database only when it
+matters:
+
+- the device has no known state, or a button was pressed,
+- it moved at least IOT_COALESCE_DISTANCE_METERS from the last persisted
+  position,
+- its battery changed by at least IOT_COALESCE_BATTERY_DELTA,
+- IOT_COALESCE_MAX_INTERVAL_SECONDS passed since the last persisted reading
+  (a keep-alive row for the history).
+
+Readings held back only refresh the device's last-seen time in Redis; the
+flush_device_last_seen task writes those to the database in bulk. Received
+and written counts are kept so the write reduction can be monitored.
+
+filter() only decides; save() records the new states, and callers run it
+from transaction.on_commit. Otherwise a batch that rolled back would leave
+Redis believing its readings were persisted, and the next identical
+heartbeat would be held back although the database never saw it.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from apps.common.geo import haversine_km
+from apps.services.services.live_location import get_state_client
+
+from .models import IoTDevice
+
+STATE_KEY = "vehicaid:iot:heartbeat:state"
+DIRTY_KEY = "vehicaid:iot:heartbeat:dirty"
+STATS_KEY = "vehicaid:iot:heartbeat:stats"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class DeviceState:
+    """Last persisted reading of a device plus when it was last seen."""
+
+    __slots__ = ("latitude", "longitude", "battery", "persisted_at", "seen_at")
+
+    def __init__(self, latitude, longitude, battery, persisted_at, seen_at):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.battery = battery
+        self.persisted_at = persisted_at
+        self.seen_at = seen_at
+
+    def dumps(self):
+        battery = "" if self.battery is None else self.battery
+        return f"{self.latitude},{self.longitude},{battery},{self.persisted_at},{self.seen_at}"
+
+    @classmethod
+    def loads(cls, raw):
+        latitude, longitude, battery, persisted_at, seen_at = _decode(raw).split(",")
+        return cls(
+            float(latitude), float(longitude), int(battery) if battery else None,
+            float(persisted_at), float(seen_at),
+        )
+
+
+class HeartbeatCoalescer:
+    """Decides which readings are written to the database."""
+
+    def __init__(self, client, distance_meters=None, battery_delta=None, max_interval_seconds=None):
+        self.client = client
+        self.distance_km = (distance_meters or getattr(settings, "IOT_COALESCE_DISTANCE_METERS", 50)) / 1000
+        self.battery_delta = battery_delta or getattr(settings, "IOT_COALESCE_BATTERY_DELTA", 2)
+        self.max_interval = max_interval_seconds or getattr(settings, "IOT_COALESCE_MAX_INTERVAL_SECONDS", 900)
+        self._pending = None
+
+    def _changed(self, state, reading, at):
+        if state is None or reading.button:
+            return True
+        if at - state.persisted_at >= self.max_interval:
+            return True
+        if reading.battery is not None and (
+            state.battery is None or abs(reading.battery - state.battery) >= self.battery_delta
+        ):
+            return True
+        return haversine_km(state.latitude, state.longitude, reading.latitude, reading.longitude) >= self.distance_km
+
+    def filter(self, readings, received):
+        """
+        Returns the readings (ingestion Reading tuples, oldest first) that
+        must be persisted; the rest become last-seen updates. One round trip
+        loads the states of every device in the batch; save() writes them
+        back once the persisted readings are committed.
+        """
+        readings = list(readings)
+        if not readings:
+            return []
+        device_ids = list(dict.fromkeys(reading.device_id for reading in readings))
+        states = {
+            device_id: DeviceState.loads(raw) if raw else None
+            for device_id, raw in zip(device_ids, self.client.hmget(STATE_KEY, device_ids))
+        }
+
+        persisted, coalesced = [], set()
+        for reading in readings:
+            at = (reading.recorded_at or received).timestamp()
+            state = states[reading.device_id]
+            if self._changed(state, reading, at):
+                battery = reading.battery if reading.battery is not None else (state.battery if state else None)
+                states[reading.device_id] = DeviceState(
+                    float(reading.latitude), float(reading.longitude), battery, at, max(at, state.seen_at if state else at)
+                )
+                persisted.append(reading)
+                coalesced.discard(reading.device_id)
+            elif at > state.seen_at:
+                state.seen_at = at
+                coalesced.add(reading.device_id)
+
+        self._pending = (states, coalesced, len(readings), len(persisted))
+        return persisted
+
+    def save(self):
+        """Writes the device states and counters of the last filter() call."""
+        if self._pending is None:
+            return
+        (states, coalesced, received, persisted), self._pending = self._pending, None
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(STATE_KEY, mapping={device_id: state.dumps() for device_id, state in states.items() if state})
+        if coalesced:
+            pipe.sadd(DIRTY_KEY, *coalesced)
+        pipe.hincrby(STATS_KEY, "received", received)
+        pipe.hincrby(STATS_KEY, "persisted", persisted)
+        pipe.execute()
+
+    def last_seen_many(self, device_ids):
+        """{device_id: datetime} of the freshest heartbeat known in Redis."""
+        device_ids = list(device_ids)
+        if not device_ids:
+            return {}
+        return {
+            device_id: datetime.fromtimestamp(DeviceState.loads(raw).seen_at, tz=dt_timezone.utc)
+            for device_id, raw in zip(device_ids, self.client.hmget(STATE_KEY, device_ids)) if raw
+        }
+
+    def flush_last_seen(self, limit=1000):
+        """
+        Writes the last-seen time of up to `limit` devices whose newest
+        heartbeats were coalesced, with one bulk upsert. Returns the count.
+        """
+        device_ids = [_decode(member) for member in (self.client.spop(DIRTY_KEY, limit) or [])]
+        seen = self.last_seen_many(device_ids)
+        existing = set(IoTDevice.objects.filter(device_id__in=list(seen)).values_list("device_id", flat=True))
+        rows = [
+            IoTDevice(device_id=device_id, last_signal_time=seen_at, is_active=True)
+            for device_id, seen_at in seen.items() if device_id in existing
+        ]
+        IoTDevice.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=["device_id"], update_fields=["last_signal_time", "is_active"],
+        )
+        if rows:
+            self.client.hincrby(STATS_KEY, "swept", len(rows))
+        return len(rows)
+
+    def stats(self):
+        """Received readings vs database writes, and their ratio."""
+        raw = {_decode(k): int(_decode(v)) for k, v in (self.client.hgetall(STATS_KEY) or {}).items()}
+        received = raw.get("received", 0)
+        writes = raw.get("persisted", 0) + raw.get("swept", 0)
+        return {
+            "received": received,
+            "persisted": raw.get("persisted", 0),
+            "swept": raw.get("swept", 0),
+            "write_reduction": received / writes if writes else 0.0,
+        }
+
+
+def get_heartbeat_coalescer():
+    return HeartbeatCoalescer(get_state_client())
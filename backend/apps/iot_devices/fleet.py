@@ -0,0 +1,198 @@
+"""
+Incrementally maintained fleet health summary.
+
+The admin fleet page used to load and serialise every device to show a
+handful of totals. The totals now live in Redis and are adjusted as
+readings arrive, so reading them costs a few O(1)/O(log n) commands
+whatever the fleet size:
+
+- a hash of counters: registered devices and devices per battery band,
+- a hash of each device's current battery band, so a reading only moves a
+  device between bands when its band actually changes,
+- a sorted set of last-seen times, so "silent for more than N minutes" is
+  one ZCOUNT,
+- a set of active devices.
+
+Ingestion calls `record` for every accepted reading (coalesced heartbeats
+included, they still prove the device is alive); device saves and deletes
+keep registrations in step. `rebuild` recomputes everything from the
+database and runs nightly to correct any drift.
+"""
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from apps.services.services.live_location import get_state_client
+
+from .models import IoTDevice
+
+COUNTS_KEY = "vehicaid:iot:fleet:counts"
+BANDS_KEY = "vehicaid:iot:fleet:bands"
+SEEN_KEY = "vehicaid:iot:fleet:seen"
+ACTIVE_KEY = "vehicaid:iot:fleet:active"
+REBUILD_SUFFIX = ":rebuild"
+
+TOTAL = "total"
+UNKNOWN = "unknown"
+
+# (band, lowest battery level in it), highest first
+BATTERY_BANDS = (("good", 50), ("low", 20), ("critical", 0))
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def battery_band(level):
+    for band, floor in BATTERY_BANDS:
+        if level >= floor:
+            return band
+    return BATTERY_BANDS[-1][0]
+
+
+class FleetHealth:
+    """Reads and maintains the fleet counters."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _move_bands(self, pipe, batteries):
+        """Queues band changes for {device_id: battery level} on `pipe`."""
+        if not batteries:
+            return
+        current = dict(zip(batteries, self.client.hmget(BANDS_KEY, list(batteries))))
+        moved, deltas = {}, Counter()
+        for device_id, level in batteries.items():
+            band, previous = battery_band(level), _decode(current[device_id])
+            if band == previous:
+                continue
+            moved[device_id] = band
+            deltas[band] += 1
+            if previous:
+                deltas[previous] -= 1
+        if moved:
+            pipe.hset(BANDS_KEY, mapping=moved)
+        for band, delta in deltas.items():
+            if delta:
+                pipe.hincrby(COUNTS_KEY, band, delta)
+
+    def record(self, readings, received):
+        """Updates the summary from ingested Reading tuples (oldest first)."""
+        latest = {reading.device_id: reading for reading in readings}
+        if not latest:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        # GT: a delayed batch never makes a device look silent for longer
+        pipe.zadd(SEEN_KEY, {
+            device_id: (reading.recorded_at or received).timestamp() for device_id, reading in latest.items()
+        }, gt=True)
+        pipe.sadd(ACTIVE_KEY, *latest)
+        self._move_bands(pipe, {
+            device_id: reading.battery for device_id, reading in latest.items() if reading.battery is not None
+        })
+        pipe.execute()
+
+    def register(self, device, created=False):
+        """Brings the summary in line with a device saved outside ingestion."""
+        pipe = self.client.pipeline(transaction=False)
+        if created:
+            pipe.hincrby(COUNTS_KEY, TOTAL, 1)
+        pipe.zadd(SEEN_KEY, {device.device_id: device.last_signal_time.timestamp()}, gt=True)
+        if device.is_active:
+            pipe.sadd(ACTIVE_KEY, device.device_id)
+        else:
+            pipe.srem(ACTIVE_KEY, device.device_id)
+        if device.last_battery_level is not None:
+            self._move_bands(pipe, {device.device_id: device.last_battery_level})
+        pipe.execute()
+
+    def forget(self, device_id):
+        """Removes a deleted device from the summary."""
+        band = _decode(self.client.hmget(BANDS_KEY, [device_id])[0])
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(COUNTS_KEY, TOTAL, -1)
+        if band:
+            pipe.hincrby(COUNTS_KEY, band, -1)
+            pipe.hdel(BANDS_KEY, device_id)
+        pipe.zrem(SEEN_KEY, device_id)
+        pipe.srem(ACTIVE_KEY, device_id)
+        pipe.execute()
+
+    def summary(self, silent_minutes=None, now=None):
+        """Device counts by state, battery band and silence."""
+        silent_minutes = silent_minutes or getattr(settings, "IOT_SILENT_MINUTES", 30)
+        cutoff = (now or time.time()) - silent_minutes * 60
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(COUNTS_KEY)
+        pipe.scard(ACTIVE_KEY)
+        pipe.zcount(SEEN_KEY, "-inf", cutoff)
+        raw_counts, active, silent = pipe.execute()
+
+        counts = {_decode(k): int(_decode(v)) for k, v in (raw_counts or {}).items()}
+        total = counts.get(TOTAL, 0)
+        battery = {band: counts.get(band, 0) for band, _ in BATTERY_BANDS}
+        battery[UNKNOWN] = max(0, total - sum(battery.values()))
+        return {
+            "total": total,
+            "active": active,
+            "inactive": max(0, total - active),
+            "silent": silent,
+            "silent_minutes": silent_minutes,
+            "battery": battery,
+        }
+
+    def rebuild(self, chunk_size=5000):
+        """
+        Recomputes the summary from the database into scratch keys and swaps
+        them in, so readers never see a half-built summary. Returns the
+        number of devices counted.
+        """
+        scratch = {key: key + REBUILD_SUFFIX for key in (COUNTS_KEY, BANDS_KEY, SEEN_KEY, ACTIVE_KEY)}
+        self.client.delete(*scratch.values())
+
+        counts, written = Counter(), {COUNTS_KEY}
+        rows = IoTDevice.objects.values_list(
+            "device_id", "is_active", "last_battery_level", "last_signal_time"
+        ).order_by().iterator(chunk_size=chunk_size)
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                self._write_chunk(scratch, chunk, counts, written)
+                chunk = []
+        if chunk:
+            self._write_chunk(scratch, chunk, counts, written)
+        self.client.hset(scratch[COUNTS_KEY], mapping=counts or {TOTAL: 0})
+
+        # Live keys with nothing to replace them (e.g. no active devices left)
+        # are cleared; renaming a key that was never written would fail
+        pipe = self.client.pipeline(transaction=True)
+        for key, temporary in scratch.items():
+            if key in written:
+                pipe.rename(temporary, key)
+            else:
+                pipe.delete(key)
+        pipe.execute()
+        return counts[TOTAL]
+
+    def _write_chunk(self, scratch, chunk, counts, written):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(scratch[SEEN_KEY], {device_id: seen.timestamp() for device_id, _, _, seen in chunk})
+        written.add(SEEN_KEY)
+        active = [device_id for device_id, is_active, _, _ in chunk if is_active]
+        if active:
+            pipe.sadd(scratch[ACTIVE_KEY], *active)
+            written.add(ACTIVE_KEY)
+        bands = {device_id: battery_band(level) for device_id, _, level, _ in chunk if level is not None}
+        if bands:
+            pipe.hset(scratch[BANDS_KEY], mapping=bands)
+            written.add(BANDS_KEY)
+            counts.update(bands.values())
+        counts[TOTAL] += len(chunk)
+        pipe.execute()
+
+
+def get_fleet_health():
+    return FleetHealth(get_state_client())
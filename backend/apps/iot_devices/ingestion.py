@@ -0,0 +1,242 @@
+"""
+Batch ingestion of device readings.
+
+The MQTT gateway forwards readings in batches (a JSON array, an object with
+a "readings" array, or NDJSON, one reading per line). A batch is validated
+with a plain-Python schema instead of a DRF serializer per reading, then
+collapsed to the latest reading per device: heartbeats only ever update the
+device's last known state, so older readings in the same batch would be
+overwritten anyway. The result is one SELECT and one upsert per batch
+instead of one transaction per reading. Readings that pass the heartbeat
+coalescer are also appended to the DeviceTelemetry history, with one bulk
+INSERT. Every accepted reading updates the fleet health summary.
+
+Button presses are never collapsed away; each one still starts its own
+emergency job.
+"""
+import json
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .coalescing import get_heartbeat_coalescer
+from .fleet import get_fleet_health
+from .models import DeviceTelemetry, IoTDevice
+from .signals import process_iot_button_press_async
+
+Reading = namedtuple("Reading", "device_id latitude longitude battery button recorded_at")
+
+COORDINATE_PLACES = Decimal("0.00000001")
+
+# IoTDevice coordinates are DecimalField(max_digits=10, decimal_places=8)
+MAX_COORDINATE = Decimal("100")
+
+UPDATE_FIELDS = ["last_known_latitude", "last_known_longitude", "last_battery_level", "is_active", "last_signal_time"]
+
+
+class BatchFormatError(ValueError):
+    """The request body is not a JSON array, {"readings": [...]} or NDJSON."""
+
+
+def parse_batch(body, content_type=""):
+    """Decodes a request body into a list of raw reading dicts."""
+    try:
+        text = body.decode("utf-8") if isinstance(body, bytes) else body
+    except UnicodeDecodeError:
+        raise BatchFormatError("Body is not valid UTF-8.")
+
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        try:
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError as e:
+            raise BatchFormatError(f"Invalid NDJSON: {e}")
+
+    try:
+        payload = json.loads(text)
+    except ValueError as e:
+        raise BatchFormatError(f"Invalid JSON: {e}")
+    if isinstance(payload, dict):
+        payload = payload.get("readings")
+    if not isinstance(payload, list):
+        raise BatchFormatError('Expected a JSON array or {"readings": [...]}.')
+    return payload
+
+
+def _coordinate(value, low, high):
+    coordinate = Decimal(str(value)).quantize(COORDINATE_PLACES)
+    if not (low <= coordinate <= high) or abs(coordinate) >= MAX_COORDINATE:
+        raise ValueError("Out of range.")
+    return coordinate
+
+
+def _optional_int(value, low, high):
+    if value is None:
+        return None
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        value = int(value)
+    if isinstance(value, bool) or int(value) != value or not (low <= value <= high):
+        raise ValueError(f"Must be an integer between {low} and {high}.")
+    return int(value)
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError("Must be an ISO 8601 datetime or a Unix timestamp.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def validate_reading(raw):
+    """
+    Returns (Reading, None) for a valid reading or (None, errors), with the
+    same field rules as IoTDataSerializer. `recorded_at` may be given as
+    "timestamp"; readings without one count as received now.
+    """
+    if not isinstance(raw, dict):
+        return None, {"non_field_errors": ["Expected an object."]}
+
+    errors = {}
+    device_id = raw.get("device_id")
+    if not isinstance(device_id, str) or not device_id or len(device_id) > 50:
+        errors["device_id"] = ["A device ID of at most 50 characters is required."]
+
+    checks = {
+        "latitude": lambda: _coordinate(raw["latitude"], -90, 90),
+        "longitude": lambda: _coordinate(raw["longitude"], -180, 180),
+        "battery": lambda: _optional_int(raw.get("battery"), 0, 100),
+        "button_pressed": lambda: _optional_int(raw.get("button_pressed"), 1, 2),
+        "timestamp": lambda: _timestamp(raw.get("timestamp")),
+    }
+    values = {}
+    for field, check in checks.items():
+        try:
+            values[field] = check()
+        except KeyError:
+            errors[field] = ["This field is required."]
+        except (ValueError, TypeError, InvalidOperation, OverflowError) as e:
+            errors[field] = [str(e) if isinstance(e, ValueError) and str(e) else "Invalid value."]
+
+    if errors:
+        return None, errors
+    return Reading(
+        device_id=device_id,
+        latitude=values["latitude"],
+        longitude=values["longitude"],
+        battery=values["battery"],
+        button=values["button_pressed"],
+        recorded_at=values["timestamp"],
+    ), None
+
+
+def latest_per_device(readings, received):
+    """
+    Keeps the newest reading per device. Readings without a timestamp count
+    as taken at `received`; ties go to the later reading in the batch.
+    """
+    latest = {}
+    for reading in readings:
+        current = latest.get(reading.device_id)
+        if current is None or (reading.recorded_at or received) >= (current.recorded_at or received):
+            latest[reading.device_id] = reading
+    return latest
+
+
+def ingest_batch(raw_readings, batch_size=1000):
+    """
+    Validates and stores a batch of raw readings.
+
+    Returns a summary with the number of readings accepted, devices updated,
+    button presses queued and the rejected readings (by index in the batch).
+    """
+    received = timezone.now()
+    readings, rejected = [], []
+    for index, raw in enumerate(raw_readings):
+        reading, errors = validate_reading(raw)
+        if errors:
+            rejected.append({"index": index, "errors": errors})
+        else:
+            readings.append((index, reading))
+
+    devices = IoTDevice.objects.in_bulk(
+        list({reading.device_id for _, reading in readings}), field_name="device_id"
+    )
+
+    # Readings from unregistered devices are rejected, not silently dropped
+    accepted = []
+    for index, reading in readings:
+        if reading.device_id in devices:
+            accepted.append(reading)
+        else:
+            rejected.append({"index": index, "errors": {"device_id": ["Unknown or unregistered IoT Device ID."]}})
+    rejected.sort(key=lambda item: item["index"])
+
+    # Heartbeats that change nothing only refresh last-seen in Redis
+    accepted.sort(key=lambda reading: reading.recorded_at or received)
+    coalescer = get_heartbeat_coalescer()
+    persisted = coalescer.filter(accepted, received)
+
+    changed = []
+    for device_id, reading in latest_per_device(persisted, received).items():
+        device = devices[device_id]
+        recorded_at = reading.recorded_at or received
+        # A delayed batch must not roll a device back to an older position
+        if reading.recorded_at and recorded_at < device.last_signal_time:
+            continue
+        device.last_known_latitude = reading.latitude
+        device.last_known_longitude = reading.longitude
+        if reading.battery is not None:
+            device.last_battery_level = reading.battery
+        device.is_active = True
+        device.last_signal_time = recorded_at
+        changed.append(device)
+
+    presses = [reading for reading in accepted if reading.button]
+    with transaction.atomic():
+        # The coalescer only remembers readings as persisted once they are
+        transaction.on_commit(coalescer.save)
+        # Upsert of rows known to exist: a single INSERT .. ON CONFLICT DO
+        # UPDATE, far cheaper to build than bulk_update's CASE per row/field
+        IoTDevice.objects.bulk_create(
+            changed, batch_size=batch_size,
+            update_conflicts=True, unique_fields=["device_id"], update_fields=UPDATE_FIELDS,
+        )
+        DeviceTelemetry.objects.bulk_create([
+            DeviceTelemetry(
+                device_id=reading.device_id,
+                recorded_at=reading.recorded_at or received,
+                latitude=reading.latitude,
+                longitude=reading.longitude,
+                battery_level=reading.battery,
+                button_pressed=reading.button,
+            )
+            for reading in persisted
+        ], batch_size=batch_size)
+        # Emergency jobs read the device row, so queue them once it is committed
+        for reading in presses:
+            transaction.on_commit(lambda reading=reading: process_iot_button_press_async.delay(
+                device_id=reading.device_id,
+                button_id=reading.button,
+                latitude=float(reading.latitude),
+                longitude=float(reading.longitude),
+            ))
+
+    # Every accepted reading counts for fleet health, coalesced or not
+    get_fleet_health().record(accepted, received)
+
+    return {
+        "accepted": len(accepted),
+        "persisted": len(persisted),
+        "devices_updated": len(changed),
+        "button_presses": len(presses),
+        "rejected": rejected,
+    }
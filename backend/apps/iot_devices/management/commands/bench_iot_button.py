@@ -0,0 +1,120 @@
+"""
+Benchmark button-to-dispatch latency for IoT emergencies.
+
+Seeds a city of providers and a fleet of paired devices, then presses
+buttons one at a time through the whole path: batch ingestion, the
+commit hook, the button press task (run inline, so broker time is not
+included) and dispatch, until the request is DISPATCHED. Pricing and
+notifications after dispatch are stubbed out, like in simulate_dispatch.
+
+Two modes are compared:
+
+- triage: the old path through BookingAgent.process_booking, with the LLM
+  call replaced by a sleep of --llm-ms (Groq's typical round trip),
+- fast: BookingAgent.process_emergency, with no triage at all.
+
+Each mode runs in a transaction that is rolled back.
+"""
+import random
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import TestCase
+
+from apps.iot_devices.ingestion import ingest_batch
+from apps.iot_devices.models import IoTDevice
+from apps.iot_devices.signals import process_iot_button_press_async
+from apps.services.agent_logic import BookingAgent
+from apps.services.ai_triage import AITriageService
+from apps.services.models import ServiceRequest
+from apps.services.simulation import CITIES, city_point, percentile, seed_city, stub_external_services
+from apps.users.models import CustomUser, ServiceBooker
+
+PREFIX = "BENCH-BTN-"
+
+
+def triage_booking(agent, service_data, service_type, priority, **kwargs):
+    """The pre-fast-path behaviour: every press goes through triage."""
+    return agent.process_booking(service_data)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark IoT button-to-dispatch latency with and without LLM triage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=500, help='Available providers in the city')
+        parser.add_argument('--presses', type=int, default=100, help='Button presses to replay')
+        parser.add_argument('--city', default='bangalore', choices=sorted(CITIES))
+        parser.add_argument('--llm-ms', type=float, default=400.0, help='Simulated triage LLM round trip')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'mode':>8} {'presses':>8} {'dispatched':>11} {'p50':>10} {'p95':>10} {'p99':>10} {'queries/press':>14}"
+        )
+        for mode in ('triage', 'fast'):
+            self._run(mode, options)
+
+    def _run(self, mode, options):
+        rng = random.Random(7)
+        latencies, queries, finalize_calls = [], [], []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack, transaction.atomic():
+            stub_external_services(stack, finalize_calls)
+            # Run the press task inline, as a worker would pick it up
+            stack.enter_context(patch.object(
+                process_iot_button_press_async, "delay", lambda **kwargs: process_iot_button_press_async.run(**kwargs)
+            ))
+            if mode == 'triage':
+                delay = options['llm_ms'] / 1000
+
+                def analyze_request(service, description):
+                    time.sleep(delay)
+                    return {"intent": "BOOK_SERVICE", "suggested_type": "TOWING",
+                            "suggested_priority": "URGENT", "diagnostic_advice": ""}
+
+                stack.enter_context(patch.object(AITriageService, "__init__", return_value=None))
+                stack.enter_context(patch.object(AITriageService, "analyze_request", analyze_request))
+                stack.enter_context(patch.object(BookingAgent, "process_emergency", triage_booking))
+
+            seed_city(options['providers'], 0, city=options['city'])
+            # A device pairs with exactly one booker
+            CustomUser.objects.bulk_create([
+                CustomUser(username=f"{PREFIX}{i}", email=f"{PREFIX.lower()}{i}@sim.local")
+                for i in range(options['presses'])
+            ])
+            owners = CustomUser.objects.filter(username__startswith=PREFIX)
+            ServiceBooker.objects.bulk_create([ServiceBooker(user=user) for user in owners])
+            IoTDevice.objects.bulk_create([
+                IoTDevice(device_id=booker.user.username, paired_user=booker)
+                for booker in ServiceBooker.objects.filter(user__in=owners).select_related("user")
+            ])
+
+            hotspots = CITIES[options['city']]
+            with connection.execute_wrapper(count_query):
+                for i in range(options['presses']):
+                    lat, lng = city_point(rng, hotspots)
+                    reading = {
+                        "device_id": f"{PREFIX}{i}", "latitude": round(lat, 6), "longitude": round(lng, 6),
+                        "button_pressed": rng.choice((1, 2)),
+                    }
+                    start = time.perf_counter()
+                    with TestCase.captureOnCommitCallbacks(execute=True):
+                        ingest_batch([reading])
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+            dispatched = ServiceRequest.objects.filter(booker__in=owners, status="DISPATCHED").count()
+            transaction.set_rollback(True)
+
+        presses = options['presses']
+        self.stdout.write(
+            f"{mode:>8} {presses:>8} {dispatched:>11} "
+            f"{percentile(latencies, 0.50):>8.2f}ms {percentile(latencies, 0.95):>8.2f}ms "
+            f"{percentile(latencies, 0.99):>8.2f}ms {len(queries) / presses:>14.1f}"
+        )
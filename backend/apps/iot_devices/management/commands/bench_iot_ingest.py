@@ -0,0 +1,136 @@
+"""
+Benchmark the bulk IoT ingestion endpoint against the per-reading one.
+
+Seeds a fleet of devices, generates a stream of heartbeats (each device
+reporting several times; most vehicles parked with GPS jitter, a share of
+them driving) and posts it once reading by reading to data-ingest/ and
+once in batches to data-ingest/bulk/. Each mode runs with real commits,
+since per-transaction overhead is what is being measured; seeded devices
+are deleted afterwards. Rows written and the heartbeat coalescer's write
+reduction are reported per mode (--no-coalesce writes every reading).
+"""
+import json
+import random
+import time
+from unittest.mock import patch
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from apps.iot_devices.coalescing import DIRTY_KEY, STATE_KEY, STATS_KEY, get_heartbeat_coalescer
+from apps.iot_devices.models import DeviceTelemetry, IoTDevice
+from apps.services.services.live_location import get_state_client
+from apps.iot_devices.views import IoTBulkIngestionView, IoTDataIngestionView
+
+PREFIX = "BENCH-IOT-"
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-reading vs bulk IoT telemetry ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=200, help='Devices in the fleet')
+        parser.add_argument('--readings', type=int, default=2000, help='Heartbeats in the stream')
+        parser.add_argument('--batch', type=int, default=500, help='Readings per bulk request')
+        parser.add_argument('--ndjson', action='store_true', help='Send bulk batches as NDJSON')
+        parser.add_argument('--moving', type=float, default=0.1, help='Share of devices that are driving')
+        parser.add_argument('--no-coalesce', action='store_true', help='Write every heartbeat')
+
+    def handle(self, *args, **options):
+        rng = random.Random(5)
+        IoTDevice.objects.bulk_create([
+            IoTDevice(device_id=f"{PREFIX}{i}") for i in range(options['devices'])
+        ], ignore_conflicts=True)
+        readings = self._stream(rng, options)
+
+        factory = RequestFactory()
+        self.stdout.write(
+            f"{'mode':>12} {'requests':>9} {'readings/s':>11} {'p50':>10} {'p99':>10} "
+            f"{'queries/reading':>16} {'rows written':>13} {'reduction':>10}"
+        )
+        thresholds = {'IOT_COALESCE_DISTANCE_METERS': 0} if options['no_coalesce'] else {}
+        try:
+            # Throttling would cap either mode long before the database does
+            with patch.object(IoTDataIngestionView, 'throttle_classes', []), \
+                    patch.object(IoTBulkIngestionView, 'throttle_classes', []), \
+                    override_settings(**thresholds):
+                single = IoTDataIngestionView.as_view()
+                self._report('per-reading', len(readings), [
+                    lambda reading=reading: single(factory.post(
+                        '/api/v1/iot/data-ingest/', json.dumps(reading), content_type='application/json'
+                    ))
+                    for reading in readings
+                ])
+
+                bulk = IoTBulkIngestionView.as_view()
+                if options['ndjson']:
+                    content_type, encode = 'application/x-ndjson', lambda batch: "\n".join(map(json.dumps, batch))
+                else:
+                    content_type, encode = 'application/json', json.dumps
+                batches = [readings[i:i + options['batch']] for i in range(0, len(readings), options['batch'])]
+                self._report('bulk', len(readings), [
+                    lambda batch=batch: bulk(factory.post(
+                        '/api/v1/iot/data-ingest/bulk/', encode(batch), content_type=content_type
+                    ))
+                    for batch in batches
+                ])
+        finally:
+            IoTDevice.objects.filter(device_id__startswith=PREFIX).delete()
+
+    def _stream(self, rng, options):
+        """Heartbeats in time order: parked devices jitter ~5m, moving ones drive."""
+        positions = {
+            f"{PREFIX}{i}": [12.9716 + rng.gauss(0, 0.05), 77.5946 + rng.gauss(0, 0.05), 100, rng.random() < options['moving']]
+            for i in range(options['devices'])
+        }
+        device_ids = list(positions)
+        readings = []
+        for n in range(options['readings']):
+            device_id = device_ids[n % len(device_ids)]
+            position = positions[device_id]
+            if position[3]:
+                # ~100m per heartbeat
+                position[0] += rng.gauss(0, 0.001)
+                position[1] += rng.gauss(0, 0.001)
+            # Battery drains a percent every 50 heartbeats
+            if rng.random() < 0.02:
+                position[2] -= 1
+            readings.append({
+                "device_id": device_id,
+                "latitude": f"{position[0] + rng.gauss(0, 0.00004):.8f}",
+                "longitude": f"{position[1] + rng.gauss(0, 0.00004):.8f}",
+                "battery": position[2],
+            })
+        return readings
+
+    def _report(self, mode, reading_count, calls):
+        # Each mode starts from an empty coalescer and history
+        client = get_state_client()
+        for key in (STATE_KEY, DIRTY_KEY, STATS_KEY):
+            client.delete(key)
+        DeviceTelemetry.objects.filter(device__device_id__startswith=PREFIX).delete()
+
+        latencies = []
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            for call in calls:
+                start = time.perf_counter()
+                response = call()
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 202:
+                    self.stderr.write(f"{mode}: unexpected {response.status_code} {response.data}")
+        latencies.sort()
+        self.stdout.write(
+            f"{mode:>12} {len(calls):>9} {reading_count / (sum(latencies) / 1000):>11.0f} "
+            f"{latencies[len(latencies) // 2]:>8.2f}ms {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:>8.2f}ms "
+            f"{len(queries) / reading_count:>16.2f} "
+            f"{DeviceTelemetry.objects.filter(device__device_id__startswith=PREFIX).count():>13} "
+            f"{get_heartbeat_coalescer().stats()['write_reduction']:>9.1f}x"
+        )
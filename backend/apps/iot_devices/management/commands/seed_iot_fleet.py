@@ -0,0 +1,64 @@
+"""
+Register (or remove) the virtual devices driven by scripts/simulate_iot.py.
+
+    python manage.py seed_iot_fleet --devices 20000
+    python manage.py seed_iot_fleet --prefix SIM- --delete
+
+Ingestion rejects unknown device IDs, so a fleet has to exist before it
+can be simulated. Devices are created unpaired; pass --paired to pair
+each with a booker so that button presses create real requests.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.iot_devices.fleet import get_fleet_health
+from apps.iot_devices.models import IoTDevice
+from apps.users.models import CustomUser, ServiceBooker
+
+
+class Command(BaseCommand):
+    help = 'Create or delete the virtual IoT fleet used by scripts/simulate_iot.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=1000, help='Devices in the fleet')
+        parser.add_argument('--prefix', default='SIM-', help='Device ID prefix (must match the simulator)')
+        parser.add_argument('--paired', action='store_true', help='Pair every device with its own booker')
+        parser.add_argument('--delete', action='store_true', help='Delete the fleet instead of creating it')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if options['delete']:
+            deleted, _ = IoTDevice.objects.filter(device_id__startswith=prefix).delete()
+            CustomUser.objects.filter(username__startswith=f"iot_{prefix}").delete()
+            self.stdout.write(f"Deleted {deleted} rows for fleet {prefix}*.")
+        else:
+            with transaction.atomic():
+                created = self._create(prefix, options['devices'], options['paired'])
+            self.stdout.write(f"Fleet {prefix}* has {created} new devices.")
+        # bulk writes skip the signals that keep the fleet summary current
+        get_fleet_health().rebuild()
+
+    def _create(self, prefix, count, paired):
+        device_ids = [f"{prefix}{i}" for i in range(count)]
+        existing = set(IoTDevice.objects.filter(device_id__in=device_ids).values_list('device_id', flat=True))
+        missing = [device_id for device_id in device_ids if device_id not in existing]
+
+        bookers = {}
+        if paired and missing:
+            CustomUser.objects.bulk_create([
+                CustomUser(username=f"iot_{device_id}", email=f"iot_{device_id.lower()}@sim.local")
+                for device_id in missing
+            ], batch_size=1000, ignore_conflicts=True)
+            users = CustomUser.objects.filter(username__in=[f"iot_{device_id}" for device_id in missing])
+            ServiceBooker.objects.bulk_create(
+                [ServiceBooker(user=user) for user in users], batch_size=1000, ignore_conflicts=True
+            )
+            bookers = {
+                booker.user.username[len("iot_"):]: booker
+                for booker in ServiceBooker.objects.filter(user__in=users).select_related('user')
+            }
+
+        IoTDevice.objects.bulk_create([
+            IoTDevice(device_id=device_id, paired_user=bookers.get(device_id)) for device_id in missing
+        ], batch_size=1000)
+        return len(missing)
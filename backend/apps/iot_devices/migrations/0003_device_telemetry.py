@@ -0,0 +1,52 @@
+# Generated by Django 5.2.10 on 2026-10-18 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iot_devices', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceTelemetry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('recorded_at', models.DateTimeField()),
+                ('latitude', models.DecimalField(decimal_places=8, max_digits=10)),
+                ('longitude', models.DecimalField(decimal_places=8, max_digits=10)),
+                ('battery_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('button_pressed', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='telemetry', to='iot_devices.iotdevice')),
+            ],
+            options={
+                'verbose_name': 'Device Telemetry',
+                'verbose_name_plural': 'Device Telemetry',
+                'indexes': [models.Index(fields=['device', 'recorded_at'], name='iot_telemetry_device_time'), models.Index(fields=['recorded_at'], name='iot_telemetry_time')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeviceTelemetryHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour (UTC)')),
+                ('samples', models.PositiveIntegerField()),
+                ('latitude', models.DecimalField(decimal_places=8, max_digits=10)),
+                ('longitude', models.DecimalField(decimal_places=8, max_digits=10)),
+                ('battery_min', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('battery_max', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('battery_avg', models.FloatField(blank=True, null=True)),
+                ('button_presses', models.PositiveIntegerField(default=0)),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='telemetry_hourly', to='iot_devices.iotdevice')),
+            ],
+            options={
+                'verbose_name': 'Device Telemetry (hourly)',
+                'verbose_name_plural': 'Device Telemetry (hourly)',
+                'indexes': [models.Index(fields=['hour'], name='iot_telemetry_hourly_hour')],
+                'constraints': [models.UniqueConstraint(fields=('device', 'hour'), name='iot_telemetry_hourly_device_hour')],
+            },
+        ),
+    ]
@@ -38,3 +38,66 @@ class IoTDevice(models.Model):
 
     def __str__(self):
         return f"Device {self.device_id}"
+
+
+class DeviceTelemetry(models.Model):
+    """
+    Append-only history of device readings, one row per reading.
+
+    Rows are written in bulk by the ingestion paths and never updated. The
+    (device, recorded_at) index serves per-device range queries; the
+    recorded_at index serves the rollup and retention sweeps. Raw rows are
+    kept for IOT_TELEMETRY_RAW_RETENTION_DAYS and survive longer as hourly
+    DeviceTelemetryHourly rollups.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    device = models.ForeignKey(
+        IoTDevice, on_delete=models.CASCADE, related_name="telemetry", db_index=False
+    )
+    recorded_at = models.DateTimeField()
+    latitude = models.DecimalField(max_digits=10, decimal_places=8)
+    longitude = models.DecimalField(max_digits=10, decimal_places=8)
+    battery_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    button_pressed = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Device Telemetry"
+        verbose_name_plural = "Device Telemetry"
+        indexes = [
+            models.Index(fields=["device", "recorded_at"], name="iot_telemetry_device_time"),
+            models.Index(fields=["recorded_at"], name="iot_telemetry_time"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} @ {self.recorded_at:%Y-%m-%d %H:%M:%S}"
+
+
+class DeviceTelemetryHourly(models.Model):
+    """Hourly rollup of DeviceTelemetry, kept after the raw rows expire."""
+
+    device = models.ForeignKey(
+        IoTDevice, on_delete=models.CASCADE, related_name="telemetry_hourly", db_index=False
+    )
+    hour = models.DateTimeField(help_text="Start of the hour (UTC)")
+    samples = models.PositiveIntegerField()
+    # Centroid of the hour's positions: a downsampled location trail
+    latitude = models.DecimalField(max_digits=10, decimal_places=8)
+    longitude = models.DecimalField(max_digits=10, decimal_places=8)
+    battery_min = models.PositiveSmallIntegerField(null=True, blank=True)
+    battery_max = models.PositiveSmallIntegerField(null=True, blank=True)
+    battery_avg = models.FloatField(null=True, blank=True)
+    button_presses = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Device Telemetry (hourly)"
+        verbose_name_plural = "Device Telemetry (hourly)"
+        constraints = [
+            models.UniqueConstraint(fields=["device", "hour"], name="iot_telemetry_hourly_device_hour"),
+        ]
+        indexes = [
+            models.Index(fields=["hour"], name="iot_telemetry_hourly_hour"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} {self.hour:%Y-%m-%d %H}:00"
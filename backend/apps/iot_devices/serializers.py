@@ -23,3 +23,19 @@ class IoTDataSerializer(serializers.Serializer):
         except IoTDevice.DoesNotExist:
             raise serializers.ValidationError("Unknown or unregistered IoT Device ID.")
         return value
+
+
+class FleetDeviceSerializer(serializers.ModelSerializer):
+    """One row of the admin fleet listing."""
+
+    user = serializers.SerializerMethodField()
+    battery = serializers.IntegerField(source="last_battery_level")
+    last_signal = serializers.DateTimeField(source="last_signal_time")
+
+    class Meta:
+        model = IoTDevice
+        fields = ["device_id", "user", "is_active", "battery", "last_signal"]
+
+    def get_user(self, device):
+        # paired_user__user is select_related by the view
+        return device.paired_user.user.username if device.paired_user else "Unassigned"
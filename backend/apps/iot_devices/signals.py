@@ -1,6 +1,9 @@
 # backend/apps/iot_devices/signals.py
 
 from celery import shared_task
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from apps.services.agent_logic import BookingAgent
 
@@ -8,9 +11,18 @@ from apps.services.agent_logic import BookingAgent
 from apps.services.models import ServiceRequest
 
 # Import the necessary model
+from .fleet import get_fleet_health
 from .models import IoTDevice
 
+# The button already says what is needed, so presses skip AI triage:
+# button ID -> (service type, priority)
+IOT_BUTTON_SERVICES = {
+    1: ("MECHANIC", "HIGH"),
+    2: ("TOWING", "URGENT"),
+}
 
+
+# Routed to the priority queue by CELERY_TASK_ROUTES
 @shared_task(name="iot.process_button_press")
 def process_iot_button_press_async(
     device_id: str, button_id: int, latitude: float, longitude: float
@@ -19,9 +31,12 @@ def process_iot_button_press_async(
     Celery task to handle the actual creation and dispatch of the emergency request
     triggered by the IoT device.
     """
+    if button_id not in IOT_BUTTON_SERVICES:
+        return {"status": "error", "message": "Invalid button ID."}
+
     try:
         # Use the correctly imported IoTDevice model
-        device = IoTDevice.objects.select_related("paired_user").get(
+        device = IoTDevice.objects.select_related("paired_user__user").get(
             device_id=device_id
         )
     except IoTDevice.DoesNotExist:
@@ -33,25 +48,26 @@ def process_iot_button_press_async(
         return {"status": "error", "message": "Device is not paired."}
 
     user = device.paired_user
+    service_type, priority = IOT_BUTTON_SERVICES[button_id]
 
-    # Determine Service Type based on button press (1 or 2)
-    if button_id == 1:
-        service_type = "COMMON_FIX_IOT"
-        priority = "HIGH"
-    elif button_id == 2:
-        service_type = "MAJOR_TOWING_IOT"
-        priority = "URGENT"
-    else:
-        return {"status": "error", "message": "Invalid button ID."}
-
-    # 1. Use the unified BookingAgent to process the request
+    # 1. Book through the agent's fast path: no LLM round trip on an emergency
     agent = BookingAgent(user.user) # paired_user is a ServiceBooker, we need CustomUser
-    
-    result = agent.process_booking({
+
+    return agent.process_emergency({
         'latitude': latitude,
         'longitude': longitude,
-        'service_type': service_type,
-        'description': f"IoT Emergency: {service_type}"
-    })
+        'description': f"IoT Emergency: button {button_id} on device {device_id}"
+    }, service_type=service_type, priority=priority, source=ServiceRequest.SOURCE_IOT)
+
+
+# Keep the fleet health summary in step with devices saved or deleted
+# outside ingestion (admin, pairing); ingestion updates it itself
+@receiver(post_save, sender=IoTDevice)
+def register_fleet_device(sender, instance, created, **kwargs):
+    transaction.on_commit(lambda: get_fleet_health().register(instance, created=created))
+
 
-    return result
+@receiver(post_delete, sender=IoTDevice)
+def forget_fleet_device(sender, instance, **kwargs):
+    device_id = instance.device_id
+    transaction.on_commit(lambda: get_fleet_health().forget(device_id))
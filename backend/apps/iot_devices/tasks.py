@@ -0,0 +1,46 @@
+import logging
+
+from celery import shared_task
+
+from .coalescing import get_heartbeat_coalescer
+from .fleet import get_fleet_health
+from .telemetry import prune_telemetry, rollup_recent
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def rollup_device_telemetry():
+    """Rolls raw device readings of the last few hours up into hourly rows."""
+    count = rollup_recent()
+    logger.info(f"Rolled up {count} device-hours of telemetry.")
+    return f"Rolled up {count} device-hours."
+
+
+@shared_task
+def prune_device_telemetry():
+    """Deletes raw and hourly telemetry past their retention windows."""
+    deleted = prune_telemetry()
+    logger.info(f"Pruned telemetry: {deleted['raw']} raw rows, {deleted['hourly']} hourly rows.")
+    return deleted
+
+
+@shared_task
+def flush_device_last_seen(batch_size=1000):
+    """
+    Persists the last-seen time of devices whose recent heartbeats were
+    coalesced away, with one bulk write per batch.
+    """
+    coalescer = get_heartbeat_coalescer()
+    flushed = coalescer.flush_last_seen(limit=batch_size)
+    stats = coalescer.stats()
+    logger.info(f"Flushed last-seen for {flushed} devices; heartbeat write reduction {stats['write_reduction']:.1f}x.")
+    return f"Flushed last-seen for {flushed} devices."
+
+
+@shared_task
+def rebuild_fleet_health():
+    """Recomputes the fleet health counters from the database to undo any drift."""
+    total = get_fleet_health().rebuild()
+    logger.info(f"Rebuilt fleet health summary for {total} devices.")
+    return f"Rebuilt fleet health for {total} devices."
@@ -0,0 +1,127 @@
+"""
+Rollup and retention for the device telemetry history.
+
+Raw DeviceTelemetry rows are rolled up into one DeviceTelemetryHourly row
+per device and hour (sample count, centroid position, battery min/avg/max,
+button presses), then deleted once older than the raw retention window.
+Hourly rows are kept much longer, so battery-drain trends and coarse
+location trails outlive the raw data.
+"""
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import DeviceTelemetry, DeviceTelemetryHourly
+
+COORDINATE_PLACES = Decimal("0.00000001")
+
+ROLLUP_FIELDS = [
+    "samples", "latitude", "longitude", "battery_min", "battery_max", "battery_avg", "button_presses",
+]
+
+# Rows removed per DELETE, keeps each retention statement short
+PRUNE_CHUNK_SIZE = 10000
+
+
+def floor_hour(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_hours(start, end):
+    """
+    (Re)builds the hourly rollups for every hour in [start, end). Re-running
+    an hour overwrites its rollup, so late readings are picked up by simply
+    rolling the hour up again.
+    """
+    rows = (
+        DeviceTelemetry.objects.filter(recorded_at__gte=start, recorded_at__lt=end)
+        # Hours in UTC, not the site timezone (IST is offset by half an hour)
+        .annotate(bucket=TruncHour("recorded_at", tzinfo=dt_timezone.utc))
+        .values("device_id", "bucket")
+        .annotate(
+            sample_count=Count("id"),
+            avg_latitude=Avg("latitude"),
+            avg_longitude=Avg("longitude"),
+            min_battery=Min("battery_level"),
+            max_battery=Max("battery_level"),
+            avg_battery=Avg("battery_level"),
+            press_count=Count("button_pressed"),
+        )
+        .order_by()
+    )
+    rollups = [
+        DeviceTelemetryHourly(
+            device_id=row["device_id"],
+            hour=row["bucket"],
+            samples=row["sample_count"],
+            latitude=Decimal(str(row["avg_latitude"])).quantize(COORDINATE_PLACES),
+            longitude=Decimal(str(row["avg_longitude"])).quantize(COORDINATE_PLACES),
+            battery_min=row["min_battery"],
+            battery_max=row["max_battery"],
+            battery_avg=row["avg_battery"],
+            button_presses=row["press_count"],
+        )
+        for row in rows
+    ]
+    DeviceTelemetryHourly.objects.bulk_create(
+        rollups, batch_size=1000,
+        update_conflicts=True, unique_fields=["device", "hour"], update_fields=ROLLUP_FIELDS,
+    )
+    return len(rollups)
+
+
+def rollup_recent(now=None, lookback_hours=None):
+    """Rolls up the last `lookback_hours` completed hours."""
+    if lookback_hours is None:
+        lookback_hours = getattr(settings, "IOT_TELEMETRY_ROLLUP_LOOKBACK_HOURS", 3)
+    end = floor_hour(now or timezone.now())
+    return rollup_hours(end - timedelta(hours=lookback_hours), end)
+
+
+def _delete_before(queryset, field, cutoff, max_chunks):
+    deleted = 0
+    for _ in range(max_chunks):
+        # Chunked by primary key so no single statement locks millions of rows
+        ids = list(queryset.filter(**{f"{field}__lt": cutoff}).values_list("pk", flat=True)[:PRUNE_CHUNK_SIZE])
+        if not ids:
+            break
+        deleted += queryset.filter(pk__in=ids).delete()[0]
+    return deleted
+
+
+def prune_telemetry(now=None, max_chunks=100):
+    """Applies the raw and hourly retention windows. Returns rows deleted."""
+    now = now or timezone.now()
+    raw_days = getattr(settings, "IOT_TELEMETRY_RAW_RETENTION_DAYS", 14)
+    hourly_days = getattr(settings, "IOT_TELEMETRY_HOURLY_RETENTION_DAYS", 365)
+
+    # Never drop raw rows whose hour has not been rolled up yet
+    raw_cutoff = min(now - timedelta(days=raw_days), floor_hour(now) - timedelta(hours=1))
+    return {
+        "raw": _delete_before(DeviceTelemetry.objects, "recorded_at", raw_cutoff, max_chunks),
+        "hourly": _delete_before(DeviceTelemetryHourly.objects, "hour", now - timedelta(days=hourly_days), max_chunks),
+    }
+
+
+def device_history(device_id, start, end, resolution="raw", limit=None):
+    """
+    Readings of one device in [start, end), oldest first, as dicts. Served
+    from the (device, recorded_at) index for raw data and the (device, hour)
+    unique index for hourly rollups.
+    """
+    if resolution == "hourly":
+        queryset = DeviceTelemetryHourly.objects.filter(
+            device_id=device_id, hour__gte=floor_hour(start), hour__lt=end
+        ).order_by("hour").values("hour", "samples", "latitude", "longitude",
+                                  "battery_min", "battery_avg", "battery_max", "button_presses")
+    else:
+        queryset = DeviceTelemetry.objects.filter(
+            device_id=device_id, recorded_at__gte=start, recorded_at__lt=end
+        ).order_by("recorded_at").values("recorded_at", "latitude", "longitude", "battery_level", "button_pressed")
+    if limit:
+        queryset = queryset[:limit]
+    return list(queryset)
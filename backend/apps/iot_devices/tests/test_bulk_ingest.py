@@ -0,0 +1,97 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.iot_devices.ingestion import BatchFormatError, parse_batch, validate_reading
+from apps.iot_devices.models import IoTDevice
+
+
+def reading(device_id, lat="12.97160000", lng="77.59460000", **extra):
+    return {"device_id": device_id, "latitude": lat, "longitude": lng, **extra}
+
+
+def test_parses_arrays_wrapped_arrays_and_ndjson():
+    rows = [reading("A"), reading("B")]
+    assert parse_batch(json.dumps(rows).encode()) == rows
+    assert parse_batch(json.dumps({"readings": rows}).encode()) == rows
+    ndjson = "\n".join(json.dumps(row) for row in rows) + "\n"
+    assert parse_batch(ndjson.encode(), "application/x-ndjson") == rows
+    with pytest.raises(BatchFormatError):
+        parse_batch(b'{"device_id": "A"}')
+
+
+def test_validation_matches_single_reading_rules():
+    valid, errors = validate_reading(reading("A", battery=85, button_pressed=2))
+    assert errors is None and valid.battery == 85 and valid.button == 2
+
+    _, errors = validate_reading({"device_id": "A", "latitude": "91", "battery": 101, "button_pressed": 3})
+    assert set(errors) == {"latitude", "longitude", "battery", "button_pressed"}
+
+
+@pytest.mark.django_db
+class TestBulkIngestion:
+
+    @pytest.fixture
+    def api(self):
+        return APIClient()
+
+    @pytest.fixture
+    def url(self):
+        return reverse("iot-data-ingest-bulk")
+
+    def test_collapses_to_latest_reading_per_device(self, api, url, django_assert_max_num_queries):
+        IoTDevice.objects.create(device_id="DEV_A", last_battery_level=90)
+        IoTDevice.objects.create(device_id="DEV_B")
+        batch = [
+            reading("DEV_A", lat="12.10000000", battery=80, timestamp="2030-01-01T10:00:05Z"),
+            reading("DEV_A", lat="12.30000000", timestamp="2030-01-01T10:00:10Z"),
+            # Arrived late but older: must not win
+            reading("DEV_A", lat="12.20000000", battery=70, timestamp="2030-01-01T10:00:00Z"),
+            reading("DEV_B", battery=40),
+            reading("UNKNOWN"),
+            {"device_id": "DEV_B"},
+        ]
+
+        # Device lookup, one upsert and one history insert, whatever the batch size
+        with django_assert_max_num_queries(5):
+            response = api.post(url, batch, format="json")
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data["accepted"] == 4
+        assert response.data["devices_updated"] == 2
+        assert [item["index"] for item in response.data["rejected"]] == [4, 5]
+
+        device = IoTDevice.objects.get(device_id="DEV_A")
+        assert device.last_known_latitude == Decimal("12.30000000")
+        # Latest reading had no battery value; the previous one is kept
+        assert device.last_battery_level == 90
+        assert device.is_active is True
+        assert IoTDevice.objects.get(device_id="DEV_B").last_battery_level == 40
+
+    def test_ndjson_button_presses_are_all_queued(self, api, url, mocker, django_capture_on_commit_callbacks):
+        task = mocker.patch("apps.iot_devices.ingestion.process_iot_button_press_async.delay")
+        IoTDevice.objects.create(device_id="DEV_C")
+        body = "\n".join(json.dumps(row) for row in [
+            reading("DEV_C", button_pressed=1),
+            reading("DEV_C"),
+            reading("DEV_C", button_pressed=2),
+        ])
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api.post(url, body, content_type="application/x-ndjson")
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data["button_presses"] == 2
+        assert [call.kwargs["button_id"] for call in task.call_args_list] == [1, 2]
+
+    def test_rejects_malformed_and_oversized_batches(self, api, url, settings):
+        assert api.post(url, "not json", content_type="application/json").status_code == 400
+        assert api.post(url, [reading("NOPE")], format="json").status_code == 400
+
+        settings.IOT_INGEST_MAX_BATCH = 2
+        response = api.post(url, [reading("A")] * 3, format="json")
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import pytest
+from django.db import DatabaseError
+
+from apps.iot_devices.coalescing import get_heartbeat_coalescer
+from apps.iot_devices.ingestion import Reading, ingest_batch
+from apps.iot_devices.models import DeviceTelemetry, IoTDevice
+
+START = datetime(2030, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+
+def heartbeat(seconds, lat="12.97160000", battery=80, button=None, device_id="DEV_HB"):
+    return Reading(device_id, Decimal(lat), Decimal("77.59460000"), battery, button, START + timedelta(seconds=seconds))
+
+
+class TestCoalescingRules:
+
+    def test_only_meaningful_changes_pass(self):
+        coalescer = get_heartbeat_coalescer()
+        readings = [
+            heartbeat(0),                       # first sighting
+            heartbeat(10, lat="12.97162000"),   # ~2m of GPS jitter
+            heartbeat(20, battery=79),          # below the battery delta
+            heartbeat(30, lat="12.97300000"),   # ~150m: moved
+            heartbeat(40, battery=77),          # battery dropped 3
+            heartbeat(50, button=1),            # button press
+            heartbeat(60 + 900),                # keep-alive interval
+        ]
+        persisted = coalescer.filter(readings, START)
+        assert [r.recorded_at for r in persisted] == [readings[i].recorded_at for i in (0, 3, 4, 5, 6)]
+
+    def test_stationary_fleet_cuts_writes_by_an_order_of_magnitude(self):
+        coalescer = get_heartbeat_coalescer()
+        readings = [heartbeat(i * 5, device_id=f"DEV_P{d}") for i in range(60) for d in range(10)]
+        for start in range(0, len(readings), 100):
+            coalescer.filter(readings[start:start + 100], START)
+            coalescer.save()
+
+        stats = coalescer.stats()
+        assert stats["received"] == 600
+        assert stats["persisted"] == 10
+        assert stats["write_reduction"] >= 10
+
+
+@pytest.mark.django_db
+class TestCoalescedIngestion:
+
+    def test_held_back_heartbeats_are_swept_as_last_seen(self, django_capture_on_commit_callbacks):
+        IoTDevice.objects.create(device_id="DEV_HB")
+        raw = [
+            {"device_id": "DEV_HB", "latitude": "12.97160000", "longitude": "77.59460000", "battery": 80,
+             "timestamp": (START + timedelta(seconds=s)).isoformat()}
+            for s in (0, 5, 10)
+        ]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            summary = ingest_batch(raw)
+        assert (summary["accepted"], summary["persisted"]) == (3, 1)
+        assert DeviceTelemetry.objects.count() == 1
+        assert IoTDevice.objects.get(device_id="DEV_HB").last_signal_time == START
+
+        assert get_heartbeat_coalescer().flush_last_seen() == 1
+        assert IoTDevice.objects.get(device_id="DEV_HB").last_signal_time == START + timedelta(seconds=10)
+        # Nothing left to sweep
+        assert get_heartbeat_coalescer().flush_last_seen() == 0
+        assert get_heartbeat_coalescer().stats()["swept"] == 1
+
+    def test_rolled_back_batches_are_not_remembered(self, django_capture_on_commit_callbacks, mocker):
+        IoTDevice.objects.create(device_id="DEV_HB")
+        raw = [{"device_id": "DEV_HB", "latitude": "12.97160000", "longitude": "77.59460000", "battery": 80,
+                "timestamp": START.isoformat()}]
+        mocker.patch.object(DeviceTelemetry.objects, "bulk_create", side_effect=DatabaseError("disk full"))
+
+        with django_capture_on_commit_callbacks(execute=True), pytest.raises(DatabaseError):
+            ingest_batch(raw)
+        assert get_heartbeat_coalescer().stats()["received"] == 0
+
+        # The retried heartbeat is persisted, not held back as already seen
+        mocker.stopall()
+        with django_capture_on_commit_callbacks(execute=True):
+            assert ingest_batch(raw)["persisted"] == 1
@@ -0,0 +1,108 @@
+import time
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.iot_devices.fleet import battery_band, get_fleet_health
+from apps.iot_devices.ingestion import ingest_batch
+from apps.iot_devices.models import IoTDevice
+from apps.users.models import CustomUser, ServiceBooker
+
+
+def reading(device_id, battery=None, **extra):
+    return {"device_id": device_id, "latitude": "12.9716", "longitude": "77.5946", "battery": battery, **extra}
+
+
+@pytest.fixture
+def fleet(db, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        for i in range(4):
+            IoTDevice.objects.create(device_id=f"FLEET-{i}")
+    return get_fleet_health()
+
+
+@pytest.mark.django_db
+class TestFleetHealth:
+
+    def test_battery_bands(self):
+        assert [battery_band(level) for level in (0, 19, 20, 49, 50, 100)] == [
+            "critical", "critical", "low", "low", "good", "good"
+        ]
+
+    def test_ingestion_updates_summary(self, fleet):
+        ingest_batch([reading("FLEET-0", 80), reading("FLEET-1", 10), reading("FLEET-2", 30)])
+        # FLEET-0 drains into the low band
+        ingest_batch([reading("FLEET-0", 45)])
+
+        summary = fleet.summary()
+        assert summary["total"] == 4
+        assert (summary["active"], summary["inactive"]) == (3, 1)
+        assert summary["battery"] == {"good": 0, "low": 2, "critical": 1, "unknown": 1}
+
+    def test_silent_devices(self, fleet, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            IoTDevice.objects.create(device_id="FLEET-OLD", last_signal_time=timezone.now() - timedelta(hours=1))
+        assert fleet.summary(silent_minutes=30)["silent"] == 1
+        assert fleet.summary(silent_minutes=30, now=time.time() + 7200)["silent"] == 5
+
+        ingest_batch([reading("FLEET-OLD", 80)])
+        # A delayed reading does not make the device look silent again
+        ingest_batch([reading("FLEET-OLD", 80, timestamp=time.time() - 7200)])
+        assert fleet.summary(silent_minutes=30)["silent"] == 0
+
+    def test_delete_and_rebuild(self, fleet, django_capture_on_commit_callbacks):
+        ingest_batch([reading("FLEET-0", 80), reading("FLEET-1", 10)])
+        with django_capture_on_commit_callbacks(execute=True):
+            IoTDevice.objects.filter(device_id="FLEET-1").get().delete()
+        incremental = fleet.summary()
+        assert incremental["total"] == 3
+        assert incremental["battery"]["critical"] == 0
+
+        # Writes that bypass signals are only picked up by a rebuild
+        IoTDevice.objects.bulk_create([IoTDevice(device_id="FLEET-X", last_battery_level=5, is_active=True)])
+        assert fleet.rebuild() == 4
+        rebuilt = fleet.summary()
+        assert rebuilt["total"] == 4
+        assert rebuilt["active"] == 2
+        assert rebuilt["battery"] == {"good": 1, "low": 0, "critical": 1, "unknown": 2}
+
+    def test_fleet_health_endpoint(self, fleet, client):
+        admin = CustomUser.objects.create_user(username="fleet_admin", email="fleet_admin@example.com",
+                                               password="pass", is_staff=True)
+        client.force_authenticate(user=admin)
+        response = client.get(reverse("iot-fleet-health"), {"silent_minutes": 5})
+        assert response.status_code == 200
+        assert response.data["total"] == 4
+        assert response.data["silent_minutes"] == 5
+
+
+@pytest.mark.django_db
+class TestFleetListing:
+
+    def test_cursor_pages_with_constant_queries(self, client):
+        for i in range(5):
+            user = CustomUser.objects.create_user(username=f"fleet_owner{i}", email=f"fleet_owner{i}@example.com",
+                                                  password="pass")
+            IoTDevice.objects.create(device_id=f"LIST-{i}", paired_user=ServiceBooker.objects.create(user=user))
+        IoTDevice.objects.create(device_id="LIST-9")
+        admin = CustomUser.objects.create_user(username="list_admin", email="list_admin@example.com",
+                                               password="pass", is_staff=True)
+        client.force_authenticate(user=admin)
+
+        with CaptureQueriesContext(connection) as captured:
+            first = client.get(reverse("iot-fleet-status"), {"page_size": 4})
+        assert first.status_code == 200
+        assert [d["device_id"] for d in first.data["results"]] == ["LIST-0", "LIST-1", "LIST-2", "LIST-3"]
+        assert first.data["results"][0]["user"] == "fleet_owner0"
+        # Session/user lookups plus one page query, whatever the page size
+        page_queries = [q for q in captured if "iot_devices_iotdevice" in q["sql"]]
+        assert len(page_queries) == 1
+
+        second = client.get(first.data["next"])
+        assert [d["device_id"] for d in second.data["results"]] == ["LIST-4", "LIST-9"]
+        assert second.data["results"][1]["user"] == "Unassigned"
+        assert second.data["next"] is None
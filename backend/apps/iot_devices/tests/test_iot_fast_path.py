@@ -0,0 +1,66 @@
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+
+from apps.iot_devices.models import IoTDevice
+from apps.iot_devices.signals import process_iot_button_press_async
+from apps.services.models import OutboxMessage, ServiceRequest
+from apps.users.models import CustomUser, ServiceBooker, ServiceProvider
+
+
+@pytest.fixture
+def device(db):
+    user = CustomUser.objects.create_user(
+        username="fast_owner", email="fast_owner@example.com", password="pass", phone_number="9876543210"
+    )
+    return IoTDevice.objects.create(device_id="FAST-1", paired_user=ServiceBooker.objects.create(user=user))
+
+
+@pytest.fixture
+def provider(db):
+    user = CustomUser.objects.create_user(
+        username="fast_provider", email="fast_provider@example.com", password="pass", is_service_provider=True
+    )
+    return ServiceProvider.objects.create(
+        user=user, latitude=Decimal("12.9720"), longitude=Decimal("77.5950"), is_verified=True, is_available=True
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_side_effects():
+    with patch("apps.services.services.sms.SMSService.send_sms") as sms, \
+            patch("apps.services.dispatch_logic._enqueue_finalize_dispatch") as finalize:
+        yield sms, finalize
+
+
+@pytest.mark.django_db
+class TestIoTFastPath:
+
+    def test_button_press_skips_triage(self, device, provider, django_capture_on_commit_callbacks, no_side_effects):
+        sms, finalize = no_side_effects
+        with patch("apps.services.agent_logic.AITriageService") as triage, \
+                django_capture_on_commit_callbacks(execute=True):
+            result = process_iot_button_press_async(device_id="FAST-1", button_id=2, latitude=12.9716, longitude=77.5946)
+
+        triage.assert_not_called()
+        assert result["status"] == "SUCCESS"
+        service_request = ServiceRequest.objects.get(pk=result["request_id"])
+        assert (service_request.service_type, service_request.priority) == ("TOWING", "URGENT")
+        assert service_request.source == ServiceRequest.SOURCE_IOT
+        assert service_request.status == "DISPATCHED"
+        assert service_request.provider_id == provider.pk
+        # The confirmation SMS is left to the outbox, never sent on the worker thread
+        sms.assert_not_called()
+        assert OutboxMessage.objects.filter(channel="SMS", topic="service_request_created").count() == 1
+        # Pricing and notification for the emergency stay on the priority queue
+        assert finalize.call_args.kwargs == {"queue": settings.IOT_PRIORITY_QUEUE}
+
+    def test_invalid_button_is_rejected(self, device):
+        result = process_iot_button_press_async(device_id="FAST-1", button_id=3, latitude=12.9716, longitude=77.5946)
+        assert result == {"status": "error", "message": "Invalid button ID."}
+        assert not ServiceRequest.objects.exists()
+
+    def test_button_task_is_routed_to_priority_queue(self):
+        assert settings.CELERY_TASK_ROUTES[process_iot_button_press_async.name] == {"queue": settings.IOT_PRIORITY_QUEUE}
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.iot_devices.ingestion import ingest_batch
+from apps.iot_devices.models import DeviceTelemetry, DeviceTelemetryHourly, IoTDevice
+from apps.iot_devices.telemetry import device_history, prune_telemetry, rollup_recent
+from apps.users.models import CustomUser, ServiceBooker
+
+NOW = datetime(2030, 1, 10, 12, 20, tzinfo=dt_timezone.utc)
+
+
+def add_reading(device, minutes_ago, battery, lat="12.97000000", button=None):
+    return DeviceTelemetry.objects.create(
+        device=device, recorded_at=NOW - timedelta(minutes=minutes_ago),
+        latitude=Decimal(lat), longitude=Decimal("77.59000000"), battery_level=battery, button_pressed=button,
+    )
+
+
+@pytest.fixture
+def device(db):
+    return IoTDevice.objects.create(device_id="DEV_TS")
+
+
+@pytest.mark.django_db
+class TestTelemetryHistory:
+
+    def test_ingestion_appends_every_reading(self, device):
+        ingest_batch([
+            {"device_id": "DEV_TS", "latitude": "12.1", "longitude": "77.1", "battery": 90},
+            {"device_id": "DEV_TS", "latitude": "12.2", "longitude": "77.2", "battery": 89},
+        ])
+        assert DeviceTelemetry.objects.filter(device=device).count() == 2
+
+    def test_rollup_aggregates_completed_hours_and_reruns(self, device):
+        # 11:00-12:00 UTC is the last completed hour at NOW (12:20)
+        add_reading(device, 70, 80, lat="12.00000000")
+        add_reading(device, 50, 70, lat="12.20000000", button=1)
+        add_reading(device, 10, 60)  # current hour, not rolled up yet
+
+        assert rollup_recent(now=NOW, lookback_hours=2) == 1
+        hourly = DeviceTelemetryHourly.objects.get(device=device)
+        assert hourly.hour == datetime(2030, 1, 10, 11, tzinfo=dt_timezone.utc)
+        assert (hourly.samples, hourly.battery_min, hourly.battery_max) == (2, 70, 80)
+        assert hourly.latitude == Decimal("12.10000000")
+        assert hourly.button_presses == 1
+
+        # A late reading for the same hour is folded in on the next run
+        add_reading(device, 45, 50)
+        rollup_recent(now=NOW, lookback_hours=2)
+        hourly.refresh_from_db()
+        assert (hourly.samples, hourly.battery_min) == (3, 50)
+
+    def test_retention_keeps_recent_and_hourly_rows(self, device, settings):
+        settings.IOT_TELEMETRY_RAW_RETENTION_DAYS = 1
+        old = add_reading(device, 60 * 30, 90)
+        recent = add_reading(device, 30, 80)
+        rollup_recent(now=NOW, lookback_hours=48)
+
+        deleted = prune_telemetry(now=NOW)
+
+        assert deleted["raw"] == 1
+        assert not DeviceTelemetry.objects.filter(pk=old.pk).exists()
+        assert DeviceTelemetry.objects.filter(pk=recent.pk).exists()
+        assert DeviceTelemetryHourly.objects.filter(device=device).count() == 2
+
+    def test_device_range_query_uses_the_composite_index(self, device):
+        add_reading(device, 5, 90)
+        queryset = DeviceTelemetry.objects.filter(
+            device_id="DEV_TS", recorded_at__gte=NOW - timedelta(days=1), recorded_at__lt=NOW
+        ).order_by("recorded_at")
+        assert "iot_telemetry_device_time" in queryset.explain()
+        assert len(device_history("DEV_TS", NOW - timedelta(days=1), NOW)) == 1
+
+    def test_history_endpoint_serves_the_paired_device(self, device):
+        user = CustomUser.objects.create_user(username="ts_user", email="ts@example.com", password="pass")
+        device.paired_user = ServiceBooker.objects.create(user=user)
+        device.save()
+        add_reading(device, 90, 75)
+        add_reading(device, 5, 74)
+        rollup_recent(now=NOW, lookback_hours=3)
+
+        api = APIClient()
+        api.force_authenticate(user)
+        url = reverse("iot-device-history")
+        window = {"start": (NOW - timedelta(hours=3)).isoformat(), "end": NOW.isoformat()}
+
+        raw = api.get(url, window)
+        assert raw.status_code == 200
+        assert [point["battery_level"] for point in raw.data["points"]] == [75, 74]
+
+        hourly = api.get(url, {**window, "resolution": "hourly"})
+        assert [point["samples"] for point in hourly.data["points"]] == [1]
+
+    def test_history_endpoint_rejects_bad_dates_and_accepts_naive_ones(self, device):
+        user = CustomUser.objects.create_user(username="ts_dates", email="ts_dates@example.com", password="pass")
+        device.paired_user = ServiceBooker.objects.create(user=user)
+        device.save()
+        add_reading(device, 5, 74)
+
+        api = APIClient()
+        api.force_authenticate(user)
+        url = reverse("iot-device-history")
+
+        # Well-formed but impossible, and not a date at all
+        assert api.get(url, {"start": "2026-13-45T00:00:00"}).status_code == 400
+        assert api.get(url, {"end": "yesterday"}).status_code == 400
+
+        # No offset: read in the current time zone and compared with aware bounds
+        naive = api.get(url, {"start": (NOW - timedelta(hours=1)).replace(tzinfo=None).isoformat(),
+                              "end": NOW.isoformat()})
+        assert naive.status_code == 200
+        assert [point["battery_level"] for point in naive.data["points"]] == [74]
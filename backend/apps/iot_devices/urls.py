@@ -1,12 +1,28 @@
 from django.urls import path
 
-from .views import IoTDataIngestionView, IoTDeviceDetailView, IoTDeviceListView
+from .views import (
+    IoTBulkIngestionView,
+    IoTDataIngestionView,
+    IoTDeviceDetailView,
+    IoTDeviceHistoryView,
+    IoTDeviceListView,
+    IoTFleetHealthView,
+    IoTIngestStatsView,
+)
 
 urlpatterns = [
     # API endpoint to receive data from the external MQTT gateway
     path("data-ingest/", IoTDataIngestionView.as_view(), name="iot-data-ingest"),
+    # Batched readings (JSON array or NDJSON), one bulk write per batch
+    path("data-ingest/bulk/", IoTBulkIngestionView.as_view(), name="iot-data-ingest-bulk"),
     # Fetch status for the user's paired device
     path("status/", IoTDeviceDetailView.as_view(), name="iot-device-status"),
+    # Telemetry history (raw or hourly rollups) for the user's device
+    path("history/", IoTDeviceHistoryView.as_view(), name="iot-device-history"),
     # Enterprise fleet monitoring
     path("fleet-status/", IoTDeviceListView.as_view(), name="iot-fleet-status"),
+    # Fleet totals: active, silent and battery bands
+    path("fleet-health/", IoTFleetHealthView.as_view(), name="iot-fleet-health"),
+    # Heartbeat write coalescing metrics
+    path("ingest-stats/", IoTIngestStatsView.as_view(), name="iot-ingest-stats"),
 ]
@@ -1,34 +1,62 @@
 # backend/apps/iot_devices/views.py
 
+from django.conf import settings
 from django.db import transaction
+from datetime import timedelta
+
 from django.utils import timezone
-from rest_framework import status
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, status
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 
+# Import the model and serializer correctly
+from .models import DeviceTelemetry, IoTDevice
+from .serializers import FleetDeviceSerializer, IoTDataSerializer
+from .signals import process_iot_button_press_async
+from .coalescing import get_heartbeat_coalescer
+from .fleet import get_fleet_health
+from .ingestion import BatchFormatError, Reading, ingest_batch, parse_batch
+from .telemetry import device_history
+
 
-class IoTDeviceListView(APIView):
+class FleetCursorPagination(CursorPagination):
+    # device_id is the primary key: unique and never changes, so every page
+    # is an index seek however deep the admin scrolls
+    ordering = "device_id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class IoTDeviceListView(generics.ListAPIView):
     """
-    Enterprise endpoint to monitor entire fleet of IoT devices.
+    Enterprise endpoint to monitor entire fleet of IoT devices, one
+    cursor page at a time. Totals come from IoTFleetHealthView.
     """
     permission_classes = [IsAdminUser]
+    serializer_class = FleetDeviceSerializer
+    pagination_class = FleetCursorPagination
+    queryset = IoTDevice.objects.select_related("paired_user__user")
 
-    def get(self, request):
-        devices = IoTDevice.objects.all()
-        data = [{
-            "device_id": d.device_id,
-            "user": d.servicebooker.user.username if hasattr(d, 'servicebooker') else 'Unassigned',
-            "is_active": d.is_active,
-            "battery": d.last_battery_level,
-            "last_signal": d.last_signal_time
-        } for d in devices]
-        return Response(data)
 
-# Import the model and serializer correctly
-from .models import IoTDevice
-from .serializers import IoTDataSerializer
-from .signals import process_iot_button_press_async
+class IoTFleetHealthView(APIView):
+    """
+    Fleet health summary: active/inactive, devices silent for more than
+    ?silent_minutes= (default IOT_SILENT_MINUTES) and battery bands. Read
+    from incrementally maintained counters, so it costs the same for any
+    fleet size.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            silent_minutes = int(request.query_params.get("silent_minutes", 0)) or None
+        except ValueError:
+            return Response({"error": "silent_minutes must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_fleet_health().summary(silent_minutes=silent_minutes))
 
 
 class IoTDeviceDetailView(APIView):
@@ -41,13 +69,15 @@ class IoTDeviceDetailView(APIView):
         try:
             booker = request.user.servicebooker
             device = booker.iot_device
+            # Coalesced heartbeats are newer than the row until the next sweep
+            last_seen = get_heartbeat_coalescer().last_seen_many([device.device_id]).get(device.device_id)
             return Response({
                 "device_id": device.device_id,
                 "is_active": device.is_active,
                 "battery": device.last_battery_level,
                 "latitude": float(device.last_known_latitude) if device.last_known_latitude else None,
                 "longitude": float(device.last_known_longitude) if device.last_known_longitude else None,
-                "last_signal": device.last_signal_time
+                "last_signal": max(filter(None, [device.last_signal_time, last_seen]))
             })
         except (AttributeError, IoTDevice.DoesNotExist):
             return Response({"error": "No paired device found."}, status=status.HTTP_404_NOT_FOUND)
@@ -69,14 +99,30 @@ class IoTDataIngestionView(APIView):
             device_id = data["device_id"]
             button = data.get("button_pressed")
 
-            # 1. Update the device's last known status
-            IoTDevice.objects.filter(device_id=device_id).update(
-                last_known_latitude=data["latitude"],
-                last_known_longitude=data["longitude"],
-                last_battery_level=data.get("battery"),
-                is_active=True,
-                last_signal_time=timezone.now(),
-            )
+            # 1. Update the device's last known status, unless the heartbeat
+            # changes nothing worth a write (then only last-seen is refreshed)
+            now = timezone.now()
+            reading = Reading(device_id, data["latitude"], data["longitude"], data.get("battery"), button, None)
+            coalescer = get_heartbeat_coalescer()
+            # State is kept only if the writes below commit
+            transaction.on_commit(coalescer.save)
+            if coalescer.filter([reading], now):
+                IoTDevice.objects.filter(device_id=device_id).update(
+                    last_known_latitude=data["latitude"],
+                    last_known_longitude=data["longitude"],
+                    last_battery_level=data.get("battery"),
+                    is_active=True,
+                    last_signal_time=now,
+                )
+                DeviceTelemetry.objects.create(
+                    device_id=device_id,
+                    recorded_at=now,
+                    latitude=data["latitude"],
+                    longitude=data["longitude"],
+                    battery_level=data.get("battery"),
+                    button_pressed=button,
+                )
+            get_fleet_health().record([reading], now)
 
             # 2. Trigger the asynchronous job for button press
             if button in [1, 2]:
@@ -93,3 +139,100 @@ class IoTDataIngestionView(APIView):
             )
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class IoTBulkIngestionView(APIView):
+    """
+    Batch variant of IoTDataIngestionView for the MQTT gateway.
+
+    Accepts a JSON array of readings, {"readings": [...]}, or NDJSON
+    (Content-Type: application/x-ndjson). Readings are collapsed to the
+    latest per device and written with one bulk update per batch.
+    """
+
+    permission_classes = [AllowAny]
+    throttle_scope = "iot_ingest"
+
+    def post(self, request, format=None):
+        # Parsed here rather than through request.data, so NDJSON needs no
+        # extra parser and the body is decoded only once
+        try:
+            raw_readings = parse_batch(request.body, request.content_type or "")
+        except BatchFormatError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_batch = getattr(settings, "IOT_INGEST_MAX_BATCH", 5000)
+        if len(raw_readings) > max_batch:
+            return Response(
+                {"error": f"At most {max_batch} readings per batch."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        summary = ingest_batch(raw_readings)
+        if raw_readings and not summary["accepted"]:
+            return Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary, status=status.HTTP_202_ACCEPTED)
+
+
+def _query_datetime(value):
+    """
+    An aware datetime from an ISO 8601 query value (naive values are taken
+    in the current time zone), or None when the value is empty. Raises
+    ValueError for anything unparseable.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Not an ISO 8601 date-time: {value}")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class IoTDeviceHistoryView(APIView):
+    """
+    Telemetry history of the user's paired device (admins may pass
+    ?device_id=). Query: start, end (ISO 8601, default the last 24 hours)
+    and resolution=raw|hourly.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.is_staff and request.query_params.get("device_id"):
+            device_id = request.query_params["device_id"]
+        else:
+            device = IoTDevice.objects.filter(paired_user__user=request.user).only("device_id").first()
+            if device is None:
+                return Response({"error": "No paired device found."}, status=status.HTTP_404_NOT_FOUND)
+            device_id = device.device_id
+
+        try:
+            end = _query_datetime(request.query_params.get("end")) or timezone.now()
+            start = _query_datetime(request.query_params.get("start")) or end - timedelta(days=1)
+        except ValueError:
+            return Response({"error": "start and end must be ISO 8601 date-times."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        resolution = request.query_params.get("resolution", "raw")
+        if resolution not in ("raw", "hourly") or start >= end:
+            return Response({"error": "Invalid range or resolution."}, status=status.HTTP_400_BAD_REQUEST)
+
+        limit = getattr(settings, "IOT_HISTORY_MAX_POINTS", 10000)
+        points = device_history(device_id, start, end, resolution=resolution, limit=limit)
+        return Response({
+            "device_id": device_id,
+            "resolution": resolution,
+            "start": start,
+            "end": end,
+            "truncated": len(points) == limit,
+            "points": points,
+        })
+
+
+class IoTIngestStatsView(APIView):
+    """
+    Heartbeat write coalescing metrics: readings received, database writes
+    (persisted readings plus last-seen sweeps) and the reduction ratio.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_heartbeat_coalescer().stats())
@@ -9,8 +9,7 @@ from django.shortcuts import get_object_or_404
 from apps.payments.models import Payment
 from apps.services.models import ServiceRequest
 from apps.payments.utils.payment_utils import payment_service
-from apps.services.utils.email_utils import send_email
-from apps.services.utils.sms_utils import sms_service
+from apps.services.outbox import enqueue_email, enqueue_sms
 import logging
 
 logger = logging.getLogger(__name__)
@@ -135,10 +134,10 @@ def verify_payment(request):
             service_request.payment_status = 'PAID'
             service_request.save()
             
-            # Send notifications
+            # Queue notifications; the outbox relay delivers them
             try:
                 # Email
-                send_email(
+                enqueue_email(
                     subject=f'Payment Successful - Request #{service_request.id}',
                     text_content=f'Your payment of ₹{payment.amount} has been received successfully.',
                     html_content=f'''
@@ -149,13 +148,15 @@ def verify_payment(request):
                     <p>Payment ID: {razorpay_payment_id}</p>
                     </body></html>
                     ''',
-                    recipient_list=[request.user.email]
+                    recipient_list=[request.user.email],
+                    topic="payment_received"
                 )
                 
                 # SMS
-                sms_service.send_sms(
+                enqueue_sms(
                     request.user.phone_number,
-                    f"VehicAid: Payment of ₹{payment.amount} received for request #{service_request.id}. Thank you!"
+                    f"VehicAid: Payment of ₹{payment.amount} received for request #{service_request.id}. Thank you!",
+                    topic="payment_received"
                 )
             except Exception as e:
                 logger.error(f"Notification error: {str(e)}")
@@ -3,8 +3,9 @@ from .models import (
     ServiceRequest, SubscriptionPlan, Vehicle, UserSubscription,
     ServiceQuote, Review, VehicleExchange, VehiclePlacement,
     HelplineCall, SMSMessageLog, Wallet, WalletTransaction,
-    RewardsProgram, RewardTransaction, ChatMessage
+    RewardsProgram, RewardTransaction, ChatMessage, OutboxMessage
 )
+from .outbox import requeue
 
 class ChatMessageInline(admin.TabularInline):
     model = ChatMessage
@@ -34,3 +35,16 @@ admin.site.register(Wallet)
 admin.site.register(WalletTransaction)
 admin.site.register(RewardsProgram)
 admin.site.register(RewardTransaction)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "channel", "topic", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status", "channel", "topic")
+    readonly_fields = ("payload", "attempts", "last_error", "created_at", "sent_at")
+    ordering = ("-created_at",)
+    actions = ["requeue_messages"]
+
+    @admin.action(description="Requeue selected messages for delivery")
+    def requeue_messages(self, request, queryset):
+        self.message_user(request, f"Requeued {requeue(queryset)} messages.")
@@ -1,8 +1,9 @@
 import logging
+from functools import cached_property
+
 from django.db import transaction
 from apps.services.models import ServiceRequest, UserSubscription
 from apps.services.dispatch_logic import trigger_dispatch
-from apps.services.services.sms import SMSService
 from apps.services.ai_triage import AITriageService
 
 logger = logging.getLogger(__name__)
@@ -15,8 +16,11 @@ class BookingAgent:
     
     def __init__(self, user):
         self.user = user
-        self.sms_service = SMSService()
-        self.ai_triage = AITriageService()
+
+    @cached_property
+    def ai_triage(self):
+        # Built on first use; the emergency fast path never needs the LLM client
+        return AITriageService()
 
     @transaction.atomic
     def process_booking(self, service_data):
@@ -37,15 +41,36 @@ class BookingAgent:
                 "triage": triage
             }
         
+        # 4-6. Create, dispatch and confirm
+        return self._book(
+            service_data,
+            service_type=triage.get('suggested_type', 'MECHANIC'), # Automated categorization
+            priority=triage.get('suggested_priority', 'MEDIUM'), # Automated prioritization
+            source="AGENTIC_SERVICE",
+            advice=triage.get('diagnostic_advice', ''),
+        )
+
+    @transaction.atomic
+    def process_emergency(self, service_data, service_type, priority, source=ServiceRequest.SOURCE_IOT):
+        """
+        Fast path for emergencies whose service type and priority are already
+        known (an IoT button press): no triage round trip, straight to dispatch.
+        """
+        return self._book(
+            service_data, service_type=service_type, priority=priority, source=source,
+            advice="🚨 Emergency alert received.",
+        )
+
+    def _book(self, service_data, service_type, priority, source, advice):
         # 4. Create Service Request
         service_request = ServiceRequest.objects.create(
             booker=self.user,
             latitude=service_data.get('latitude'),
             longitude=service_data.get('longitude'),
-            service_type=triage.get('suggested_type', 'MECHANIC'), # Automated categorization
-            priority=triage.get('suggested_priority', 'MEDIUM'), # Automated prioritization
+            service_type=service_type,
+            priority=priority,
             customer_notes=service_data.get('description', ''),
-            source="AGENTIC_SERVICE"
+            source=source
         )
         
         logger.info(f"Agentic Booking: Created request {service_request.id} for user {self.user.username}")
@@ -53,20 +78,27 @@ class BookingAgent:
         # 5. Automation: Trigger Dispatch Logic
         dispatch_result = trigger_dispatch(service_request)
         
+        # 6. The booker's confirmation SMS was queued to the outbox by the
+        # post_save signal and goes out after commit, off this thread
         if dispatch_result['status'] == 'DISPATCHED':
-            # 6. Automation: Send Notifications
-            self.sms_service.send_service_request_confirmation(service_request)
-            advice = triage.get('diagnostic_advice', '')
             return {
                 "status": "SUCCESS",
                 "request_id": service_request.id,
                 "message": f"{advice}\n\n✅ MISSION TRIGGERED: I have successfully dispatched a provider to your coordinates. You can track them in your dashboard.",
                 "dispatch_details": dispatch_result
             }
+        elif dispatch_result['status'] == 'QUEUED':
+            # Surge batch mode: a provider is matched within the next few seconds
+            return {
+                "status": "SUCCESS",
+                "request_id": service_request.id,
+                "message": f"{advice}\n\n✅ MISSION QUEUED: Demand is high right now. I will assign the best available provider within seconds. You can track it in your dashboard.",
+                "dispatch_details": dispatch_result
+            }
         else:
             # Fallback logic could go here
             return {
                 "status": "PENDING_MANUAL",
                 "request_id": service_request.id,
-                "message": f"{triage.get('diagnostic_advice', '')}\n\nNo immediate provider found. Moved to manual assistance queue."
+                "message": f"{advice}\n\nNo immediate provider found. Moved to manual assistance queue."
             }
@@ -0,0 +1,233 @@
+"""
+Batch dispatch optimiser.
+
+During surges, dispatching one request at a time hands every request its
+nearest provider in arrival order, which strands later requests with far
+away leftovers. Here the pending requests of a short window are matched in
+one go: a request x provider cost matrix is built from distance, rating and
+service compatibility, and solved as an assignment problem (Hungarian
+method via SciPy) for the lowest total cost.
+"""
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from scipy.optimize import linear_sum_assignment
+
+from apps.common.geo import covering_cells, haversine_many
+from apps.services.models import ServiceRequest
+from apps.users.capabilities import can_serve, required_capabilities
+from apps.users.models import ProviderCapability, ServiceProvider
+
+from .dispatch_logic import assign_provider, claim_provider, claim_request, release_provider
+from .services.live_location import get_live_location_store
+
+logger = logging.getLogger(__name__)
+
+# One star below a perfect 5.0 rating costs as much as this many km of travel
+RATING_WEIGHT_KM = 2.0
+
+# Priority bonus in km; only matters when requests outnumber providers,
+# deciding which requests are served first
+PRIORITY_BONUS_KM = {"URGENT": 30.0, "HIGH": 15.0, "MEDIUM": 0.0, "LOW": 0.0}
+
+# Cost of pairs that must never be matched (out of range, cannot do the job)
+INFEASIBLE = 1e9
+
+# Nearest providers kept per request before solving, bounds the matrix width
+CANDIDATES_PER_REQUEST = 10
+
+BATCH_LOCK_KEY = "dispatch:batch:lock"
+
+
+def providers_near_requests(service_requests, radius_km, queryset=None):
+    """
+    Returns the available providers near any of the requests with one query,
+    reading only the geohash cells (and live positions) around each request.
+    """
+    if queryset is None:
+        queryset = ServiceProvider.objects.filter(is_verified=True, is_available=True, is_on_job=False)
+
+    # Skip providers who can do none of the requested services
+    required = set()
+    for service_request in service_requests:
+        codes = required_capabilities(service_request.service_type)
+        if codes is None:
+            required = None
+            break
+        required.update(codes)
+    if required is not None:
+        queryset = queryset.filter(pk__in=ProviderCapability.objects.filter(
+            service_type__in=required
+        ).values("provider_id"))
+
+    store = get_live_location_store()
+    cells = set()
+    live_ids = set()
+    for service_request in service_requests:
+        cells.update(covering_cells(service_request.latitude, service_request.longitude, radius_km))
+        live_ids.update(pid for pid, _ in store.search(service_request.latitude, service_request.longitude, radius_km))
+
+    cell_filter = Q(pk__in=live_ids) if live_ids else Q()
+    for cell in cells:
+        cell_filter |= Q(geo_cell__gte=cell, geo_cell__lt=cell + "{")
+
+    providers = list(
+        queryset.filter(cell_filter).only(
+            "user_id", "latitude", "longitude", "average_rating"
+        )
+    )
+    live_positions = store.get_many([p.pk for p in providers])
+    capabilities = {}
+    for provider_id, code in ProviderCapability.objects.filter(
+        provider_id__in=[p.pk for p in providers]
+    ).values_list("provider_id", "service_type"):
+        capabilities.setdefault(provider_id, set()).add(code)
+
+    located = []
+    for provider in providers:
+        position = live_positions.get(provider.pk)
+        if position is None:
+            if provider.latitude is None or provider.longitude is None:
+                continue
+            position = (float(provider.latitude), float(provider.longitude))
+        provider.position = position
+        provider.capability_codes = capabilities.get(provider.pk, set())
+        located.append(provider)
+    return located
+
+
+def build_cost_matrix(service_requests, providers, radius_km):
+    """
+    Returns (cost, distance_km), both shaped (requests, providers).
+    Cost is travel distance plus a rating penalty minus a priority bonus;
+    out-of-range and incompatible pairs cost INFEASIBLE.
+    """
+    lats = np.array([p.position[0] for p in providers], dtype=np.float64)
+    lngs = np.array([p.position[1] for p in providers], dtype=np.float64)
+    ratings = np.array([float(p.average_rating or 0) for p in providers], dtype=np.float64)
+
+    distance = np.empty((len(service_requests), len(providers)), dtype=np.float64)
+    feasible = np.empty_like(distance, dtype=bool)
+    for row, service_request in enumerate(service_requests):
+        distance[row] = haversine_many(service_request.latitude, service_request.longitude, lats, lngs)
+        feasible[row] = [can_serve(p.capability_codes, service_request.service_type) for p in providers]
+    feasible &= distance <= radius_km
+
+    # Unrated providers are neither rewarded nor punished
+    rating_penalty = np.where(ratings > 0, (5.0 - ratings) * RATING_WEIGHT_KM, 0.0)
+    priority_bonus = np.array(
+        [PRIORITY_BONUS_KM.get(r.priority, 0.0) for r in service_requests], dtype=np.float64
+    )
+    cost = distance + rating_penalty[None, :] - priority_bonus[:, None]
+    cost[~feasible] = INFEASIBLE
+    return cost, distance
+
+
+def solve_assignment(cost, candidates_per_request=CANDIDATES_PER_REQUEST):
+    """
+    Returns [(row, column)] minimising total cost, skipping infeasible pairs.
+    Columns that are not among any row's nearest candidates are dropped
+    first so the solver works on a small matrix even in dense areas.
+    """
+    if cost.size == 0:
+        return []
+
+    if cost.shape[1] > candidates_per_request:
+        nearest = np.argpartition(cost, candidates_per_request - 1, axis=1)[:, :candidates_per_request]
+        columns = np.unique(nearest)
+    else:
+        columns = np.arange(cost.shape[1])
+
+    rows, picked = linear_sum_assignment(cost[:, columns])
+    return [
+        (int(row), int(columns[col]))
+        for row, col in zip(rows, picked)
+        if cost[row, columns[col]] < INFEASIBLE
+    ]
+
+
+def batch_assign(service_requests, radius_km=None):
+    """
+    Matches the requests to providers jointly and assigns every pair whose
+    provider could still be claimed. Requests left over stay as they are and
+    are picked up by the next window.
+    """
+    service_requests = list(service_requests)
+    if radius_km is None:
+        radius_km = getattr(settings, "DISPATCH_SEARCH_RADIUS_KM", 50)
+    stats = {"requests": len(service_requests), "assigned": 0, "total_km": 0.0}
+    if not service_requests:
+        return stats
+
+    providers = providers_near_requests(service_requests, radius_km)
+    if not providers:
+        return stats
+
+    cost, distance = build_cost_matrix(service_requests, providers, radius_km)
+    for row, col in solve_assignment(cost):
+        provider = providers[col]
+        # Realtime dispatch or another worker may have taken this provider
+        if not claim_provider(provider.pk):
+            continue
+        service_request = service_requests[row]
+        with transaction.atomic():
+            # The row must still be as it was read: a provider may have
+            # accepted the job from the job board meanwhile
+            if not ServiceRequest.objects.select_for_update().filter(
+                pk=service_request.pk, status=service_request.status, provider_id=service_request.provider_id
+            ).exists():
+                release_provider(provider.pk)
+                continue
+            assign_provider(service_request, provider)
+        stats["assigned"] += 1
+        stats["total_km"] += float(distance[row, col])
+
+    logger.info(f"Batch dispatch assigned {stats['assigned']} of {stats['requests']} requests.")
+    return stats
+
+
+def dispatch_pending_batch(limit=None):
+    """
+    Runs one batch window over the oldest requests queued for batching (see
+    dispatch_logic.queue_for_batch) that have waited at least a window.
+    Only runs in DISPATCH_BATCH_MODE; otherwise pending requests belong to
+    inline dispatch and the job board.
+
+    Each request is claimed with a compare-and-set before matching, so a
+    request that inline dispatch or a provider accepting it from the job
+    board got first is skipped. Claimed requests left unmatched go back in
+    the queue for the next window.
+    """
+    if not getattr(settings, "DISPATCH_BATCH_MODE", False):
+        return {"status": "DISABLED"}
+    window = getattr(settings, "DISPATCH_BATCH_WINDOW_SECONDS", 5)
+    if not cache.add(BATCH_LOCK_KEY, "1", timeout=window * 6):
+        return {"status": "LOCKED"}
+
+    claimed = []
+    try:
+        limit = limit or getattr(settings, "DISPATCH_BATCH_SIZE", 500)
+        cutoff = timezone.now() - timedelta(seconds=window)
+        queued = ServiceRequest.objects.filter(
+            status="PENDING_DISPATCH", provider__isnull=True, batch_queued_at__lte=cutoff
+        ).order_by("batch_queued_at", "created_at")[:limit]
+        for service_request in queued:
+            if claim_request(service_request.pk):
+                # assign_provider saves the whole row; keep it out of the queue
+                service_request.batch_queued_at = None
+                claimed.append(service_request)
+        return batch_assign(claimed)
+    finally:
+        if claimed:
+            # Leftovers are due again at once, ahead of newer arrivals
+            ServiceRequest.objects.filter(
+                pk__in=[r.pk for r in claimed], status="PENDING_DISPATCH",
+                provider__isnull=True, batch_queued_at__isnull=True,
+            ).update(batch_queued_at=cutoff)
+        cache.delete(BATCH_LOCK_KEY)
@@ -1,53 +1,217 @@
-import json
+import asyncio
+import time
+from urllib.parse import parse_qs
 
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from apps.services.services import tracking_stream, tracking_wire
+from apps.services.services.live_location import GEO_MAX_LATITUDE, get_live_location_store
+
+# Close codes sent to the client (4000-4999 are application defined)
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+CLOSE_TOO_MANY_FRAMES = 4429
+
+
+def _coordinates(frame):
+    """(latitude, longitude) from a location frame, or None if invalid."""
+    try:
+        latitude, longitude = float(frame["latitude"]), float(frame["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-GEO_MAX_LATITUDE <= latitude <= GEO_MAX_LATITUDE and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
 
 
 class ServiceTrackingConsumer(AsyncWebsocketConsumer):
     """
     Handles real-time tracking updates for both Service Bookers and Providers.
+
+    Only the request's booker, its assigned provider and staff may connect
+    (JWT via apps.common.channels_auth). The provider's location frames are
+    not relayed one by one: each connection keeps only the latest position
+    and publishes it to the group and the live-location store at most once
+    every TRACKING_LOCATION_INTERVAL_SECONDS, so a chatty app costs the
+    channel layer one message per interval. A client sending more than
+    TRACKING_MAX_FRAMES_PER_SECOND frames is disconnected, and so is a
+    provider whose request was reassigned (checked on publish, at most every
+    TRACKING_PROVIDER_RECHECK_SECONDS).
+
+    Frames are encoded in the format negotiated by subprotocol (see
+    services.tracking_wire) and carry the request's stream sequence number;
+    a client reconnecting with `?since=<seq>` is replayed what it missed
+    (see services.tracking_stream).
     """
 
     async def connect(self):
-        # Authentication check needed here (e.g., using JWT from URL query)
         self.request_id = self.scope["url_route"]["kwargs"]["request_id"]
         self.room_group_name = f"service_{self.request_id}"
+        self.user = self.scope.get("user")
+        self.joined = False
+        self.pending_location = None
+        self.last_published = 0.0
+        self.flush_task = None
+        self.window_start = time.monotonic()
+        self.window_frames = 0
+        self.encoder = tracking_wire.negotiate(self.scope.get("subprotocols"))
+        self.last_seq = 0
 
-        # Join room group
+        if not self.user or not self.user.is_authenticated:
+            await self._refuse(CLOSE_UNAUTHENTICATED)
+            return
+        service_request = await self._load_request()
+        if service_request is None:
+            await self._refuse(CLOSE_NOT_FOUND)
+            return
+        self.provider_id = service_request["provider_id"]
+        self.provider_checked_at = time.monotonic()
+        if self.user.pk not in (service_request["booker_id"], self.provider_id) and not self.user.is_staff:
+            await self._refuse(CLOSE_FORBIDDEN)
+            return
+
+        # Join room group before reading the replay buffer so nothing falls in between
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        self.joined = True
+        await self.accept(subprotocol=self.encoder.subprotocol)
+        await self._resume(self._since())
+
+    async def _refuse(self, code):
+        # A close before accept reaches the client as a bare HTTP 403; accept
+        # first so it sees the reason
+        await self.accept(subprotocol=self.encoder.subprotocol)
+        await self.close(code=code)
+
+    def _since(self):
+        since = parse_qs(self.scope.get("query_string", b"").decode()).get("since")
+        if since and since[0].isdigit():
+            return int(since[0])
+        return None
 
-        await self.accept()
+    async def _resume(self, since):
+        """Replays the events after `since`, or tells the client where the stream is."""
+        current, missed = await sync_to_async(tracking_stream.replay)(self.request_id, since)
+        if missed:
+            for event in missed:
+                await getattr(self, event["type"])(event)
+        elif since is None or missed is None:
+            await self._send_frame(self.encoder.sync(current, resync=since is not None))
+        self.last_seq = max(self.last_seq, current)
 
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if self.flush_task:
+            self.flush_task.cancel()
+        if self.pending_location:
+            # The last position the provider sent is not lost
+            await self._publish(closing=True)
+        if self.joined:
+            # Leave room group
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    @database_sync_to_async
+    def _load_request(self):
+        from apps.services.models import ServiceRequest
+
+        if not self.request_id.isdigit():
+            return None
+        return ServiceRequest.objects.filter(pk=self.request_id).values("booker_id", "provider_id").first()
 
     # Receive message from WebSocket
-    async def receive(self, text_data):
-        # Messages from client are typically just simple pings or location broadcasts (for provider)
-        text_data_json = json.loads(text_data)
-
-        if "provider_location" in text_data_json:
-            # Example: Provider sends their updated location
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    "type": "status_update",
-                    "message": "location",
-                    "latitude": text_data_json["latitude"],
-                    "longitude": text_data_json["longitude"],
-                },
-            )
-
-    # Receive message from room group (sent by views.py or dispatch_logic)
+    async def receive(self, text_data=None, bytes_data=None):
+        if not self.joined:
+            return
+        if self._over_frame_limit():
+            await self.close(code=CLOSE_TOO_MANY_FRAMES)
+            return
+        frame = tracking_wire.decode(text_data, bytes_data)
+        # Messages from clients are pings or, from the provider, location updates
+        if frame is None or "provider_location" not in frame:
+            return
+        if self.provider_id is None or self.user.pk != self.provider_id:
+            return
+        coordinates = _coordinates(frame)
+        if coordinates is None:
+            return
+
+        self.pending_location = coordinates
+        wait = self.last_published + settings.TRACKING_LOCATION_INTERVAL_SECONDS - time.monotonic()
+        if wait <= 0:
+            await self._publish()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self._publish_after(wait))
+
+    def _over_frame_limit(self):
+        now = time.monotonic()
+        if now - self.window_start >= 1:
+            self.window_start, self.window_frames = now, 0
+        self.window_frames += 1
+        return self.window_frames > settings.TRACKING_MAX_FRAMES_PER_SECOND
+
+    async def _publish_after(self, delay):
+        await asyncio.sleep(delay)
+        self.flush_task = None
+        await self._publish()
+
+    async def _publish(self, closing=False):
+        """Sends the latest coalesced position to the group and the live store."""
+        latitude, longitude = self.pending_location
+        self.pending_location = None
+        self.last_published = time.monotonic()
+        if not await self._still_assigned():
+            # Reassigned (e.g. by escalation): stop reporting for this request
+            self.provider_id = None
+            if not closing:
+                await self.close(code=CLOSE_FORBIDDEN)
+            return
+        await sync_to_async(self._record_location)(latitude, longitude, time.time())
+
+    async def _still_assigned(self):
+        now = time.monotonic()
+        if now - self.provider_checked_at < settings.TRACKING_PROVIDER_RECHECK_SECONDS:
+            return True
+        service_request = await self._load_request()
+        self.provider_checked_at = now
+        return service_request is not None and service_request["provider_id"] == self.user.pk
+
+    def _record_location(self, latitude, longitude, timestamp):
+        get_live_location_store().update(self.provider_id, latitude, longitude, timestamp)
+        # Numbered and sent under the stream's lock so frames go out in order
+        tracking_stream.publish(self.request_id, {
+            "type": "location_update",
+            "latitude": latitude,
+            "longitude": longitude,
+            "timestamp": timestamp,
+            "sender": self.channel_name,
+        })
+
+    def _is_new(self, event):
+        # Events replayed at connect may arrive again live; unnumbered ones always pass
+        seq = event.get("seq")
+        if seq is None:
+            return True
+        if seq <= self.last_seq:
+            return False
+        self.last_seq = seq
+        return True
+
+    async def _send_frame(self, frame):
+        if self.encoder.binary:
+            await self.send(bytes_data=self.encoder.encode(frame))
+        else:
+            await self.send(text_data=self.encoder.encode(frame))
+
+    # Receive message from room group (chat and status events, see tracking_stream.publish)
     async def status_update(self, event):
-        # Send message to WebSocket
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "status": event["status"],
-                    "message": event["message"],
-                    "data": event.get("data", {}),
-                }
-            )
-        )
+        if self._is_new(event):
+            await self._send_frame(self.encoder.status(event))
+
+    async def location_update(self, event):
+        if not self._is_new(event):
+            return
+        # The provider already knows where they are
+        if event.get("sender") != self.channel_name:
+            await self._send_frame(self.encoder.location(event))
@@ -1,122 +1,154 @@
-from math import atan2, cos, radians, sin, sqrt
-import requests
 import logging
 
 from django.db import transaction
-from django.db.models import ExpressionWrapper, F, fields
+from django.db.models import ExpressionWrapper, F, Q, fields
 from django.conf import settings
 
+from apps.users.capabilities import required_capabilities
 from apps.users.models import ServiceProvider
-from apps.services.models import ServiceQuote, UserSubscription
+from apps.services.models import ServiceQuote, ServiceRequest, UserSubscription
 from .services.pricing import PricingService
+from .services.live_location import get_live_location_store
+from .services.distance_matrix import get_distance_matrix_client
 from decimal import Decimal
 from datetime import timedelta
 from django.utils import timezone
 from apps.common.notifications import PushNotificationService
+from apps.common.geo import covering_cells, haversine_km, nearest_within
 
 logger = logging.getLogger(__name__)
 
-# Haversine formula to calculate great-circle distance between two points on a sphere.
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Returns distance in kilometers using Haversine algorithm."""
-    R = 6371  # Radius of Earth in kilometers
-
-    lat1_rad = radians(lat1)
-    lon1_rad = radians(lon1)
-    lat2_rad = radians(lat2)
-    lon2_rad = radians(lon2)
+# First ring searched around a request; doubled until enough providers are found
+INITIAL_SEARCH_RING_KM = 2.0
 
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
+# Fresh candidate searches after every claim in a round was lost to a concurrent dispatch
+MAX_CLAIM_ROUNDS = 5
 
-    a = sin(dlat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-    return R * c
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Returns distance in kilometers using Haversine algorithm."""
+    return haversine_km(lat1, lon1, lat2, lon2)
 
 def get_real_distance(origin_lat, origin_lon, dest_lat, dest_lon):
     """
     Calculates distance using Google Maps Distance Matrix API if available,
     otherwise falls back to Haversine.
     """
-    api_key = getattr(settings, 'GOOGLE_MAPS_API_KEY', None)
-    
-    if api_key:
-        try:
-            url = "https://maps.googleapis.com/maps/api/distancematrix/json"
-            params = {
-                "origins": f"{origin_lat},{origin_lon}",
-                "destinations": f"{dest_lat},{dest_lon}",
-                "key": api_key,
-                "mode": "driving" # Assumes driving for roadside assistance
-            }
-            response = requests.get(url, params=params, timeout=5)
-            data = response.json()
-            
-            if data['status'] == 'OK' and data['rows'][0]['elements'][0]['status'] == 'OK':
-                # elements[0]['distance']['value'] is in meters
-                meters = data['rows'][0]['elements'][0]['distance']['value']
-                return meters / 1000.0 # Convert to km
-                
-        except Exception as e:
-            logger.error(f"Google Maps API failed: {e}. Falling back to Haversine.")
-            
+    route = get_distance_matrix_client().route((origin_lat, origin_lon), (dest_lat, dest_lon))
+    if route:
+        return route[0]
+
     return calculate_distance(origin_lat, origin_lon, dest_lat, dest_lon)
 
-def find_nearest_available_provider(service_request):
+def provider_position(provider, store=None):
+    """Returns the provider's freshest (lat, lng): live ping first, then the DB row."""
+    store = store or get_live_location_store()
+    live = store.get(provider.pk)
+    if live:
+        return live
+    if provider.latitude is None or provider.longitude is None:
+        return None
+    return float(provider.latitude), float(provider.longitude)
+
+
+def _providers_in_cells(latitude, longitude, radius_km, queryset):
+    store = get_live_location_store()
+
+    # Providers seen nearby in the live layer may not be flushed to their new cell yet
+    live_ids = [pid for pid, _ in store.search(latitude, longitude, radius_km)]
+    cell_filter = Q(pk__in=live_ids) if live_ids else Q()
+
+    # Prefix match written as a range so any btree index on geo_cell applies
+    # ('{' sorts right after 'z', the last geohash character)
+    for cell in covering_cells(latitude, longitude, radius_km):
+        cell_filter |= Q(geo_cell__gte=cell, geo_cell__lt=cell + "{")
+
+    candidates = list(queryset.filter(cell_filter))
+    live_positions = store.get_many([p.pk for p in candidates])
+
+    providers, lats, lngs = [], [], []
+    for provider in candidates:
+        position = live_positions.get(provider.pk)
+        if position is None:
+            if provider.latitude is None or provider.longitude is None:
+                continue
+            position = (provider.latitude, provider.longitude)
+        providers.append(provider)
+        lats.append(position[0])
+        lngs.append(position[1])
+    if not providers:
+        return []
+
+    # One vectorised Haversine call for every candidate in the cells
+    indices, distances = nearest_within(latitude, longitude, lats, lngs, radius_km)
+    found = []
+    for index, dist in zip(indices, distances):
+        provider = providers[index]
+        provider.distance_km = float(dist)
+        found.append(provider)
+    return found
+
+
+def nearby_providers(latitude, longitude, radius_km, limit=3, queryset=None):
+    """
+    Returns up to `limit` providers within `radius_km`, nearest first.
+
+    Only the geohash cells covering the search circle are read. The search
+    starts with a small ring and doubles it until `limit` providers are found,
+    so in dense areas the cost stays flat no matter how large the fleet is.
+    Each returned provider carries a `distance_km` attribute.
+    """
+    if queryset is None:
+        queryset = ServiceProvider.objects.all()
+
+    ring_km = min(INITIAL_SEARCH_RING_KM, radius_km)
+    while True:
+        # Results come back sorted by distance
+        ranked_providers = _providers_in_cells(latitude, longitude, ring_km, queryset)
+        if len(ranked_providers) >= limit or ring_km >= radius_km:
+            break
+        ring_km = min(ring_km * 2, radius_km)
+
+    return ranked_providers[:limit]
+
+
+def find_nearest_available_provider(service_request, radius_km=None):
     """
     Finds and ranks available providers based on distance and service compatibility.
     """
-    request_lat = service_request.latitude
-    request_lon = service_request.longitude
-    service_type = service_request.service_type
+    if radius_km is None:
+        radius_km = getattr(settings, 'DISPATCH_SEARCH_RADIUS_KM', 50)
+    limit = getattr(settings, 'DISPATCH_CANDIDATE_LIMIT', 3)
 
-    # 1. Filter: Get only available providers who are verified.
-    available_providers = (
-        ServiceProvider.objects.filter(
-            is_verified=True,
-            is_available=True,
-        )
+    # 1. Filter: Get only available providers who are verified and not on a job.
+    available_providers = ServiceProvider.objects.filter(
+        is_verified=True,
+        is_available=True,
+        is_on_job=False,
+    )
+
+    # Only providers able to do this kind of job (indexed capability join)
+    required = required_capabilities(service_request.service_type)
+    if required is not None:
+        available_providers = available_providers.filter(capabilities__service_type__in=required)
+
+    # 2. Rank by Haversine distance inside the neighbouring grid cells only.
+    # Real road distance is calculated for the chosen provider when quoting.
+    ranked_providers = nearby_providers(
+        service_request.latitude, service_request.longitude,
+        radius_km, limit=limit, queryset=available_providers
     )
-    
-    ranked_providers = []
-    
-    # We first do a pass with Haversine to roughly sort, then refine if needed.
-    # For now, to save API calls in 'Day 1', we might stick to Haversine for sorting 
-    # and use Real Matrix for the final quote, OR usage limit logic.
-    # Let's use get_real_distance only for the top candidates if list is long?
-    # Simple approach: Check all (if few) using real distance.
-    
-    for provider in available_providers:
-        if provider.latitude and provider.longitude:
-            # Use Haversine for initial ranking to avoid 100 API calls
-            dist = calculate_distance(
-                request_lat, request_lon, 
-                float(provider.latitude), float(provider.longitude)
-            )
-            provider.distance_km = dist
-            ranked_providers.append(provider)
-            
-    # Sort by distance
-    ranked_providers.sort(key=lambda x: x.distance_km)
 
     if not ranked_providers:
         return None
-
-    # Refine top 3 with real distance if API key present? 
-    # For simplicity in this iteration, we keep the order but calculate real distance for the chosen one later.
-    return ranked_providers[:3]
+    return ranked_providers
 
 def generate_automated_quote(service_request, provider):
     """
     Automates the generation of a dynamic price quote.
     """
-    # Use Real Distance for accurate pricing
-    dist = get_real_distance(
-        service_request.latitude, service_request.longitude,
-        float(provider.latitude), float(provider.longitude)
-    )
-    
+    # Real road distance is resolved by the pricing service's matrix client
+    position = provider_position(provider) if provider else None
+
     pricing_service = PricingService()
     
     # Get vehicle type from request (through vehicle relationship)
@@ -134,12 +166,13 @@ def generate_automated_quote(service_request, provider):
         elif 'BASIC' in user_plan: user_plan = 'BASIC'
         else: user_plan = 'FREE'
 
-    # Provider location (fallback to request loc if provider not yet assigned)
-    prov_lat = service_request.latitude
-    prov_lng = service_request.longitude
-    if service_request.provider:
-        prov_lat = service_request.provider.serviceprovider.latitude
-        prov_lng = service_request.provider.serviceprovider.longitude
+    # Provider location (fallback to request loc if provider not yet assigned
+    # or their position is unknown)
+    if position is None or not service_request.provider:
+        prov_lat = service_request.latitude
+        prov_lng = service_request.longitude
+    else:
+        prov_lat, prov_lng = position
 
     quote_data = pricing_service.calculate_quote(
         service_type=service_request.service_type,
@@ -163,43 +196,172 @@ def generate_automated_quote(service_request, provider):
     return quote
 
 
-@transaction.atomic
 def trigger_dispatch(service_request):
     """
     Coordinates the dispatch attempt to the nearest provider(s).
+
+    Dispatch is staged so no external call runs while a transaction is open:
+    the provider is claimed in a short transaction, and quoting (Distance
+    Matrix) plus the push notification (FCM) run after commit in
+    `finalize_dispatch`.
+
+    In batch mode (surges) the request is left pending and matched together
+    with the rest of its window by `batch_dispatch.dispatch_pending_batch`.
     """
-    # 1. Find candidates
-    candidates = find_nearest_available_provider(service_request)
+    if getattr(settings, 'DISPATCH_BATCH_MODE', False):
+        queue_for_batch(service_request)
+        return {"status": "QUEUED", "message": "Request queued for batch dispatch."}
+
+    # 1. Find candidates and claim the best one still free. Concurrent
+    # dispatches race on the same candidates; a lost claim moves on to the
+    # next candidate, and a fresh search excludes providers claimed meanwhile.
+    best_candidate = None
+    candidates = None
+    for _ in range(MAX_CLAIM_ROUNDS):
+        candidates = find_nearest_available_provider(service_request)
+        if not candidates:
+            break
+        best_candidate = next((c for c in candidates if claim_provider(c.pk)), None)
+        if best_candidate:
+            break
 
-    if not candidates:
+    if not best_candidate:
         # No providers available, notify Helpline UI via Channels
         return {"status": "NO_PROVIDER", "message": "No nearby providers available."}
 
-    # 2. Attempt dispatch to the best candidate
-    best_candidate = candidates[0]
+    # 2. Assign the claimed provider
+    assign_provider(service_request, best_candidate, [candidate.pk for candidate in candidates])
 
-    # Assign provider and update request status
-    service_request.provider = best_candidate.user
-    service_request.status = "DISPATCHED"
-    service_request.save()
+    return {
+        "status": "DISPATCHED",
+        "provider_id": best_candidate.user_id,
+    }
 
-    # 3. Automation: Generate dynamic price quote
-    quote = generate_automated_quote(service_request, best_candidate)
-    
-    # 4. Notify the Provider App (via Channels + FCM)
+
+def assign_provider(service_request, provider, candidate_ids=None):
+    """
+    Assigns an already claimed provider to the request in a short transaction
+    and queues quoting/notification for after commit. The claim is released
+    if the assignment cannot be saved.
+    """
+    previous_provider_id = service_request.provider_id
+    candidate_ids = candidate_ids or [provider.pk]
+
+    try:
+        with transaction.atomic():
+            # Assign provider, update status and the escalation watermark
+            service_request.mark_dispatched(provider.user)
+            service_request.save()
+
+            # Re-dispatch: the provider we moved away from is free again
+            if previous_provider_id and previous_provider_id != provider.pk:
+                release_provider(previous_provider_id)
+
+            # 3. Quote and notify once the claim is visible to other connections;
+            # device emergencies skip the shared queue
+            options = {}
+            if service_request.source == ServiceRequest.SOURCE_IOT:
+                options["queue"] = getattr(settings, "IOT_PRIORITY_QUEUE", "iot_priority")
+            transaction.on_commit(
+                lambda: _enqueue_finalize_dispatch(service_request.id, provider.user_id, candidate_ids, **options)
+            )
+    except Exception:
+        release_provider(provider.pk)
+        raise
+
+
+def escalation_radius_km(attempts):
+    """Search radius for re-dispatching a request already tried `attempts` times."""
+    base = getattr(settings, 'DISPATCH_SEARCH_RADIUS_KM', 50)
+    growth = getattr(settings, 'DISPATCH_ESCALATION_RADIUS_GROWTH', 1.5)
+    ceiling = getattr(settings, 'DISPATCH_MAX_SEARCH_RADIUS_KM', 150)
+    return min(base * growth ** attempts, ceiling)
+
+
+def claim_provider(provider_id):
+    """
+    Atomically reserves a provider for a job. A single conditional UPDATE
+    acts as compare-and-set, so of any number of concurrent claims exactly
+    one succeeds and nobody waits on a row lock.
+    """
+    return ServiceProvider.objects.filter(
+        pk=provider_id, is_available=True, is_on_job=False
+    ).update(is_on_job=True) == 1
+
+
+def queue_for_batch(service_request, queued_at=None):
+    """Marks a pending request for the next batch dispatch window."""
+    service_request.batch_queued_at = queued_at or timezone.now()
+    ServiceRequest.objects.filter(pk=service_request.pk).update(batch_queued_at=service_request.batch_queued_at)
+
+
+def claim_request(request_id):
+    """
+    Takes a queued request out of the batch queue with the same conditional
+    UPDATE compare-and-set as claim_provider; only one window wins it, and
+    never once it has a provider.
+    """
+    return ServiceRequest.objects.filter(
+        pk=request_id, status="PENDING_DISPATCH", provider__isnull=True, batch_queued_at__isnull=False
+    ).update(batch_queued_at=None) == 1
+
+
+def release_provider(provider_id):
+    """Makes a provider dispatchable again once their job is closed."""
+    ServiceProvider.objects.filter(pk=provider_id, is_on_job=True).update(is_on_job=False)
+
+
+def _enqueue_finalize_dispatch(request_id, provider_id, candidate_ids, queue=None):
+    from .tasks import finalize_dispatch_task
+
+    try:
+        if queue:
+            finalize_dispatch_task.apply_async((request_id, provider_id, candidate_ids), queue=queue)
+        else:
+            finalize_dispatch_task.delay(request_id, provider_id, candidate_ids)
+    except Exception as e:
+        # Broker unavailable: finish inline, still outside any transaction
+        logger.error(f"Could not queue finalize_dispatch for request {request_id}: {e}")
+        finalize_dispatch(request_id, provider_id, candidate_ids)
+
+
+def finalize_dispatch(request_id, provider_id, candidate_ids=None):
+    """
+    Post-commit stage of dispatch: prices the job and notifies the provider.
+    Skipped if the request was reassigned or closed in the meantime.
+    """
+    service_request = ServiceRequest.objects.select_related("vehicle", "booker").get(pk=request_id)
+    if service_request.provider_id != provider_id or service_request.status != "DISPATCHED":
+        logger.info(f"Request {request_id} changed before finalize_dispatch ran; skipping.")
+        return {"status": "STALE", "request_id": request_id}
+
+    provider = ServiceProvider.objects.select_related("user").get(pk=provider_id)
+
+    # Route every candidate in one matrix call; this quote and any re-dispatch
+    # to the runners-up are then answered from the route cache
+    candidates = ServiceProvider.objects.filter(pk__in=candidate_ids or [provider_id])
+    PricingService().prefetch_distances(
+        [position for position in map(provider_position, candidates) if position],
+        [(service_request.latitude, service_request.longitude)],
+    )
+
+    # Automation: Generate dynamic price quote
+    quote = generate_automated_quote(service_request, provider)
+
+    # Notify the Provider App (via Channels + FCM)
     # This notification is handled in the consumers.py file via a real-time event
-    
+
     # Send Push Notification
     PushNotificationService.send_to_user(
-        user=best_candidate.user,
+        user=provider.user,
         title="Valid Service Request",
         body=f"New {service_request.service_type} request nearby!",
         data={"request_id": str(service_request.id)}
     )
 
     return {
-        "status": "DISPATCHED", 
-        "provider_id": best_candidate.user_id,
+        "status": "DISPATCHED",
+        "provider_id": provider_id,
         "quote_id": quote.id,
         "total_amount": quote.dynamic_total
     }
@@ -0,0 +1,81 @@
+"""
+Benchmark the admin notification fan-out that runs on every new request.
+
+Seeds an admin team and a booker inside a transaction that is rolled back,
+then creates the same in-app notifications for a run of requests with the
+old one-INSERT-per-admin loop and with notify_new_request. Reports queries
+per booking and the per-booking latency.
+"""
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.services.models import ServiceRequest
+from apps.services.signals import notify_new_request
+from apps.users.models import CustomUser, Notification
+
+
+def notify_per_admin(service_request):
+    """The fan-out as it was: one INSERT per admin."""
+    Notification.objects.create(
+        user=service_request.booker,
+        title="Service Requested",
+        message=f"Your request for {service_request.service_type} has been received and is being processed."
+    )
+    for admin in CustomUser.objects.filter(is_superuser=True):
+        Notification.objects.create(
+            user=admin,
+            title="New Service Request",
+            message=f"New {service_request.service_type} request from {service_request.booker.username}."
+        )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-admin against bulk in-app notification fan-out for new requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--admins', type=int, default=50, help='Superusers to notify')
+        parser.add_argument('--requests', type=int, default=200, help='Bookings to fan out')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'mode':>9} {'queries':>8} {'rows':>7} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode, fan_out in (('per-admin', notify_per_admin), ('bulk', notify_new_request)):
+            with transaction.atomic():
+                requests = self._seed(options)
+                timings, queries = [], []
+
+                def count(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count):
+                    for service_request in requests:
+                        start = time.perf_counter()
+                        fan_out(service_request)
+                        timings.append((time.perf_counter() - start) * 1000)
+                rows = Notification.objects.filter(title__in=("Service Requested", "New Service Request")).count()
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                self.stdout.write(
+                    f"{mode:>9} {len(queries) / len(requests):>8.1f} {rows:>7} "
+                    f"{statistics.median(timings):>8.2f} {p95:>8.2f}"
+                )
+                transaction.set_rollback(True)
+
+    def _seed(self, options):
+        prefix = "bfanout_"
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f"{prefix}admin{i}", email=f"{prefix}admin{i}@bench.local", is_superuser=True,
+                       is_staff=True)
+            for i in range(options['admins'])
+        ] + [CustomUser(username=f"{prefix}booker", email=f"{prefix}booker@bench.local")])
+        booker = CustomUser.objects.get(username=f"{prefix}booker")
+        # bulk_create skips the post_save handler, so nothing is fanned out yet
+        ServiceRequest.objects.bulk_create([
+            ServiceRequest(booker=booker, service_type="TOWING",
+                           latitude=Decimal("19.076000"), longitude=Decimal("72.877700"))
+            for _ in range(options['requests'])
+        ])
+        return list(ServiceRequest.objects.filter(booker=booker).select_related('booker'))
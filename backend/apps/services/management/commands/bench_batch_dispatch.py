@@ -0,0 +1,50 @@
+"""
+Benchmark batch dispatch against the greedy one-request-at-a-time path.
+
+Seeds a surge (many pending requests, a limited provider pool; see
+apps.services.simulation) inside a transaction that is rolled back, then
+dispatches the same backlog with sequential trigger_dispatch calls and with
+one batch_assign call. Reports assignments, total and mean travel distance,
+and assignments per second.
+"""
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.services.batch_dispatch import batch_assign
+from apps.services.dispatch_logic import trigger_dispatch
+from apps.services.simulation import CITIES, assignment_quality, seed_city, stub_external_services
+
+
+class Command(BaseCommand):
+    help = 'Benchmark batch (Hungarian) dispatch against greedy sequential dispatch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Pending requests in the surge')
+        parser.add_argument('--providers', type=int, default=220, help='Available providers')
+        parser.add_argument('--city', default='mumbai', choices=sorted(CITIES))
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'mode':>7} {'assigned':>9} {'total km':>10} {'mean km':>9} {'assign/s':>10}")
+        for mode in ('greedy', 'batch'):
+            with ExitStack() as stack, transaction.atomic():
+                stub_external_services(stack, [])
+                # Same seed per mode so both dispatch the identical surge
+                requests = seed_city(options['providers'], options['requests'], city=options['city'], seed=11)
+
+                start = time.perf_counter()
+                if mode == 'greedy':
+                    for service_request in requests:
+                        trigger_dispatch(service_request)
+                else:
+                    batch_assign(requests)
+                elapsed = time.perf_counter() - start
+
+                quality = assignment_quality(requests)
+                self.stdout.write(
+                    f"{mode:>7} {quality['assigned']:>9} {quality['total_pickup_km']:>10.1f} "
+                    f"{quality['mean_pickup_km']:>9.2f} {quality['assigned'] / elapsed:>10.1f}"
+                )
+                transaction.set_rollback(True)
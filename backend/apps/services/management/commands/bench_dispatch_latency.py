@@ -0,0 +1,128 @@
+"""
+Benchmark dispatch latency with a slow push notifier and routing API.
+
+Compares the old single-transaction dispatch (claim, quote and FCM push all
+inside one atomic block) with the staged pipeline, where only the claim runs
+in a transaction and quoting/notification are handed to a worker after
+commit. Both the request-path latency and the time the transaction stays
+open are reported. The city is seeded with apps.services.simulation and
+rolled back at the end.
+"""
+import random
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import TestCase
+
+from apps.services import dispatch_logic
+from apps.services.dispatch_logic import (
+    PricingService,
+    PushNotificationService,
+    find_nearest_available_provider,
+    generate_automated_quote,
+    provider_position,
+    trigger_dispatch,
+)
+from apps.services.simulation import CITIES, percentile, seed_city
+
+
+def legacy_dispatch(service_request, timings):
+    """The pre-pipeline behaviour: every step inside one transaction."""
+    candidates = find_nearest_available_provider(service_request)
+    if not candidates:
+        return
+    with transaction.atomic():
+        opened = time.perf_counter()
+        best_candidate = candidates[0]
+        PricingService().prefetch_distances(
+            [provider_position(c) for c in candidates],
+            [(service_request.latitude, service_request.longitude)],
+        )
+        service_request.provider = best_candidate.user
+        service_request.status = "DISPATCHED"
+        service_request.save()
+        generate_automated_quote(service_request, best_candidate)
+        PushNotificationService.send_to_user(
+            user=best_candidate.user, title="Valid Service Request", body="", data={}
+        )
+        timings.append((time.perf_counter() - opened) * 1000)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark dispatch p50/p99 with a stubbed slow FCM notifier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Dispatches timed per mode')
+        # Each claim takes a provider off the market, so keep the fleet larger than the backlog
+        parser.add_argument('--providers', type=int, default=300, help='Available providers in the city')
+        parser.add_argument('--city', default='bangalore', choices=sorted(CITIES))
+        parser.add_argument('--notify-ms', type=float, default=200.0, help='Typical FCM latency')
+        parser.add_argument('--routing-ms', type=float, default=150.0, help='Typical Distance Matrix latency')
+        parser.add_argument('--spike-ms', type=float, default=2000.0, help='Tail latency of a slow FCM call')
+        parser.add_argument('--spike-rate', type=float, default=0.03, help='Fraction of FCM calls that spike')
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+
+        def slow_push(*args, **kwargs):
+            spike = rng.random() < options['spike_rate']
+            time.sleep((options['spike_ms'] if spike else options['notify_ms']) / 1000)
+            return True
+
+        def slow_matrix(*args, **kwargs):
+            time.sleep(options['routing_ms'] / 1000)
+            return {}
+
+        self.stdout.write(f"{'mode':>8} {'p50':>10} {'p99':>10} {'txn p99':>10}")
+        with patch.object(PushNotificationService, 'send_to_user', side_effect=slow_push), \
+                patch.object(PricingService, 'prefetch_distances', side_effect=slow_matrix):
+            for mode in ('legacy', 'staged'):
+                with transaction.atomic():
+                    # Same seed per mode so both dispatch the identical city
+                    requests = seed_city(options['providers'], options['requests'], city=options['city'], seed=7)
+                    latencies, txn_times = self._run(mode, requests)
+                    self.stdout.write(
+                        f"{mode:>8} {percentile(latencies, 0.50):>8.1f}ms "
+                        f"{percentile(latencies, 0.99):>8.1f}ms {percentile(txn_times, 0.99):>8.1f}ms"
+                    )
+                    transaction.set_rollback(True)
+
+    def _run(self, mode, requests):
+        latencies, txn_times = [], []
+        queued = []
+        for service_request in requests:
+            if mode == 'legacy':
+                start = time.perf_counter()
+                legacy_dispatch(service_request, txn_times)
+                latencies.append((time.perf_counter() - start) * 1000)
+                continue
+
+            # The outer benchmark transaction never commits, so on_commit
+            # callbacks are captured and run as if the claim had committed.
+            # The worker side (quote + push) is queued, not timed.
+            with patch('apps.services.tasks.finalize_dispatch_task.delay',
+                       side_effect=lambda *args: queued.append(args)), \
+                    patch.object(dispatch_logic, 'transaction', self._timed_transaction(txn_times)):
+                start = time.perf_counter()
+                with TestCase.captureOnCommitCallbacks(execute=True):
+                    trigger_dispatch(service_request)
+                latencies.append((time.perf_counter() - start) * 1000)
+        return latencies, txn_times
+
+    def _timed_transaction(self, txn_times):
+        """Stand-in for dispatch_logic's `transaction` that times atomic blocks."""
+
+        class TimedAtomic:
+            def __enter__(self):
+                self._atomic = transaction.atomic()
+                self._atomic.__enter__()
+                self._opened = time.perf_counter()
+
+            def __exit__(self, *exc):
+                txn_times.append((time.perf_counter() - self._opened) * 1000)
+                return self._atomic.__exit__(*exc)
+
+        return SimpleNamespace(atomic=TimedAtomic, on_commit=transaction.on_commit)
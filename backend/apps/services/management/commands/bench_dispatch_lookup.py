@@ -0,0 +1,75 @@
+"""
+Benchmark provider lookup latency against fleet size.
+
+Seeds a synthetic city (see apps.services.simulation) inside a transaction
+that is rolled back at the end, then compares the geohash cell lookup with a
+full table scan.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.services.dispatch_logic import calculate_distance, nearby_providers
+from apps.services.simulation import CITIES, city_point, percentile, seed_city
+from apps.users.models import ServiceProvider
+
+
+def full_scan(latitude, longitude, radius_km, limit=3):
+    """The pre-index behaviour: Haversine over every available provider."""
+    ranked = []
+    for provider in ServiceProvider.objects.filter(is_verified=True, is_available=True):
+        if provider.latitude and provider.longitude:
+            dist = calculate_distance(latitude, longitude, float(provider.latitude), float(provider.longitude))
+            if dist <= radius_km:
+                provider.distance_km = dist
+                ranked.append(provider)
+    ranked.sort(key=lambda x: x.distance_km)
+    return ranked[:limit]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark nearest-provider lookup latency as the provider fleet grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='1000,5000,20000', help='Comma separated provider counts')
+        parser.add_argument('--lookups', type=int, default=200, help='Lookups timed per size')
+        parser.add_argument('--radius', type=float, default=10.0, help='Search radius in km')
+        parser.add_argument('--city', default='bangalore', choices=sorted(CITIES))
+        parser.add_argument('--skip-full-scan', action='store_true', help='Only time the cell index')
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',')]
+        rng = random.Random(42)
+        hotspots = CITIES[options['city']]
+
+        self.stdout.write(f"{'providers':>10} {'index p50':>11} {'index p99':>11} {'scan p50':>11}")
+        for size in sizes:
+            with transaction.atomic():
+                seed_city(size, 0, city=options['city'])
+                points = [city_point(rng, hotspots) for _ in range(options['lookups'])]
+
+                index_times = self._time(points, lambda lat, lng: nearby_providers(
+                    lat, lng, options['radius'],
+                    queryset=ServiceProvider.objects.filter(is_verified=True, is_available=True),
+                ))
+                scan_p50 = '-'
+                if not options['skip_full_scan']:
+                    # A full scan is slow; a handful of samples is enough to show the trend
+                    scan_times = self._time(points[:10], lambda lat, lng: full_scan(lat, lng, options['radius']))
+                    scan_p50 = f"{percentile(scan_times, 0.50):.2f}ms"
+
+                self.stdout.write(
+                    f"{size:>10} {percentile(index_times, 0.50):>9.2f}ms "
+                    f"{percentile(index_times, 0.99):>9.2f}ms {scan_p50:>11}"
+                )
+                transaction.set_rollback(True)
+
+    def _time(self, points, fn):
+        timings = []
+        for lat, lng in points:
+            start = time.perf_counter()
+            fn(lat, lng)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
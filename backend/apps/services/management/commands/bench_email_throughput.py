@@ -0,0 +1,106 @@
+"""
+Benchmark email rendering and SMTP sending throughput.
+
+Rendering: renders the service request email with templates compiled on
+every call (as the old inline f-strings were rebuilt every send) and with
+the cached templates render_email uses.
+
+Sending: delivers the same emails one connection per message (send_email)
+and in batches over persistent connections (send_email_batch), against
+the local debugging SMTP server from utils.smtp_sink, or an external one
+with --host/--port (e.g. `python -m aiosmtpd -n -l localhost:1025`).
+--latency adds a per-reply delay to the local server, approximating a
+remote SMTP round trip.
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import get_template
+from django.test import override_settings
+
+from apps.services.utils.email_utils import build_email, render_email, send_email, send_email_batch
+from apps.services.utils.smtp_sink import SMTPSink
+
+CONTEXT = {
+    "name": "Asha Rao",
+    "request_id": 1042,
+    "service_type": "Flat Tire Assistance",
+    "status": "Pending Dispatch",
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cached template rendering and batched SMTP sending'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=2000, help='Emails to render per mode')
+        parser.add_argument('--emails', type=int, default=200, help='Emails to send per mode')
+        parser.add_argument('--connections', type=int, default=4, help='SMTP connections for batched sends')
+        parser.add_argument('--latency', type=float, default=0.002, help='Local server reply delay in seconds')
+        parser.add_argument('--host', help='External SMTP server instead of the local one')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        self._bench_rendering(options['renders'])
+        self._bench_sending(options)
+
+    def _bench_rendering(self, count):
+        engine = engines['django']
+        sources = {
+            suffix: get_template(f"emails/service_request_created.{suffix}").template.source
+            for suffix in ('txt', 'html')
+        }
+        # The base layout is compiled from source on each extends, too
+        base = get_template("emails/base.html").template.source
+
+        def compile_each_time():
+            html = sources['html'].replace('{% extends "emails/base.html" %}', '')
+            engine.from_string(sources['txt']).render(CONTEXT)
+            engine.from_string(base).render(CONTEXT)
+            engine.from_string(html).render(CONTEXT)
+
+        self.stdout.write(f"{'render':>14} {'emails/s':>10}")
+        for mode, render in (('compile-each', compile_each_time),
+                             ('cached', lambda: render_email("service_request_created", CONTEXT))):
+            start = time.perf_counter()
+            for _ in range(count):
+                render()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{mode:>14} {count / elapsed:>10.0f}")
+
+    def _bench_sending(self, options):
+        count = options['emails']
+        text, html = render_email("service_request_created", CONTEXT)
+        sink = None if options['host'] else SMTPSink(latency=options['latency']).start()
+        host, port = (sink.host, sink.port) if sink else (options['host'], options['port'])
+        smtp = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend", EMAIL_HOST=host, EMAIL_PORT=port,
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="",
+        )
+        self.stdout.write(f"\n{'send':>14} {'emails/s':>10} {'failed':>7} {'connections':>12}")
+        try:
+            # Per-email INFO logs would dominate the per-message timings
+            logging.disable(logging.INFO)
+            with smtp:
+                for mode in ('per-message', 'batched'):
+                    connections_before = sink.connections if sink else 0
+                    start = time.perf_counter()
+                    if mode == 'per-message':
+                        failed = sum(
+                            not send_email(f"Request #{i}", text, html, [f"user{i}@example.com"])
+                            for i in range(count)
+                        )
+                    else:
+                        emails = [build_email(f"Request #{i}", text, html, [f"user{i}@example.com"])
+                                  for i in range(count)]
+                        failed = sum(error is not None
+                                     for error in send_email_batch(emails, connections=options['connections']))
+                    elapsed = time.perf_counter() - start
+                    opened = sink.connections - connections_before if sink else "-"
+                    self.stdout.write(f"{mode:>14} {count / elapsed:>10.0f} {failed:>7} {opened:>12}")
+        finally:
+            logging.disable(logging.NOTSET)
+            if sink:
+                sink.stop()
@@ -0,0 +1,66 @@
+"""
+Microbenchmark for the shared Haversine kernel.
+
+Compares the per-row loops that dispatch, pricing (via Decimal) and
+spare-part search used to run with the batched NumPy call.
+"""
+import random
+import time
+from decimal import Decimal
+from math import atan2, cos, radians, sin, sqrt
+
+from django.core.management.base import BaseCommand
+
+from apps.common.geo import haversine_many, nearest_within
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    """Copy of the per-call formula the three call sites each carried."""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-row Haversine loops against the vectorised kernel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='10000,100000', help='Comma separated point counts')
+        parser.add_argument('--radius', type=float, default=20.0, help='Radius for the filtered search in km')
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        origin = (12.9716, 77.5946)
+
+        self.stdout.write(
+            f"{'points':>8} {'float loop':>12} {'Decimal loop':>13} {'vectorised':>11} {'bbox+radius':>12}"
+        )
+        for size in [int(s) for s in options['sizes'].split(',')]:
+            lats = [origin[0] + rng.uniform(-2, 2) for _ in range(size)]
+            lons = [origin[1] + rng.uniform(-2, 2) for _ in range(size)]
+            dec_lats = [Decimal(f"{v:.8f}") for v in lats]
+            dec_lons = [Decimal(f"{v:.8f}") for v in lons]
+
+            float_loop = self._time(lambda: [
+                scalar_haversine(origin[0], origin[1], la, lo) for la, lo in zip(lats, lons)
+            ])
+            decimal_loop = self._time(lambda: [
+                Decimal(str(scalar_haversine(*map(float, (origin[0], origin[1], la, lo)))))
+                for la, lo in zip(dec_lats, dec_lons)
+            ])
+            vectorised = self._time(lambda: haversine_many(origin[0], origin[1], lats, lons))
+            filtered = self._time(lambda: nearest_within(origin[0], origin[1], lats, lons, options['radius']))
+
+            self.stdout.write(
+                f"{size:>8} {float_loop:>10.1f}ms {decimal_loop:>11.1f}ms "
+                f"{vectorised:>9.1f}ms {filtered:>10.1f}ms"
+            )
+
+    def _time(self, fn, repeat=3):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
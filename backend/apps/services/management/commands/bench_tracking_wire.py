@@ -0,0 +1,106 @@
+"""
+Benchmark bytes on the wire per tracked minute for each tracking format.
+
+Simulates a provider driving along a highway, publishing one position per
+TRACKING_LOCATION_INTERVAL_SECONDS with GPS-style jitter, plus a few chat
+and status events, and encodes the stream as each format would send it to
+one watching client. Sizes include the WebSocket frame header the server
+adds to every message (server frames are unmasked).
+
+"verbose (before)" is the JSON the consumer sent before sequence numbers
+and the compact formats; "verbose" is the same with the seq field added.
+"""
+import math
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.services.services.tracking_wire import CompactEncoder, MsgpackEncoder, VerboseEncoder
+
+CHAT_DATA = {
+    "id": 48211,
+    "sender": "ravi_towing",
+    "message": "Reached the toll plaza, 10 minutes away",
+    "image": None,
+    "created_at": "2026-10-18T09:41:07.512394+00:00",
+}
+
+
+def frame_header_bytes(payload_size):
+    if payload_size < 126:
+        return 2
+    return 4 if payload_size < 65536 else 10
+
+
+def tracked_minute(speed_kmh, chats, seed=7):
+    """The events of one simulated minute, in order."""
+    rng = random.Random(seed)
+    interval = settings.TRACKING_LOCATION_INTERVAL_SECONDS
+    steps = int(60 / interval)
+    latitude, longitude, heading = 12.9716, 77.5946, math.radians(35)
+    timestamp = 1792316467.0
+    step_m = speed_kmh / 3.6 * interval
+    chat_at = {int(steps * (i + 1) / (chats + 1)) for i in range(chats)}
+
+    events, seq = [], 0
+    for step in range(steps):
+        heading += rng.uniform(-0.05, 0.05)
+        latitude += step_m * math.cos(heading) / 111320
+        longitude += step_m * math.sin(heading) / (111320 * math.cos(math.radians(latitude)))
+        timestamp += interval + rng.uniform(-0.05, 0.05)
+        seq += 1
+        events.append({
+            "type": "location_update",
+            "latitude": latitude + rng.gauss(0, 0.00002),
+            "longitude": longitude + rng.gauss(0, 0.00002),
+            "timestamp": timestamp,
+            "seq": seq,
+        })
+        if step in chat_at:
+            seq += 1
+            events.append({"type": "status_update", "status": "CHAT_MESSAGE",
+                           "message": "New message received", "data": CHAT_DATA, "seq": seq})
+    return events
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bytes per tracked minute for the tracking WebSocket formats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--speed', type=float, default=80, help='Provider speed in km/h')
+        parser.add_argument('--chats', type=int, default=2, help='Chat events per minute')
+
+    def handle(self, *args, **options):
+        events = tracked_minute(options['speed'], options['chats'])
+        formats = (
+            ('verbose (before)', VerboseEncoder, True),
+            ('verbose', VerboseEncoder, False),
+            ('compact', CompactEncoder, False),
+            ('msgpack', MsgpackEncoder, False),
+        )
+
+        self.stdout.write(f"{len(events)} events per minute")
+        self.stdout.write(f"{'format':>16} {'bytes/min':>10} {'location':>9} {'vs before':>10}")
+        baseline = None
+        for name, encoder_class, strip_seq in formats:
+            encoder = encoder_class()
+            total = location_total = locations = 0
+            for event in events:
+                if event["type"] == "location_update":
+                    frame = encoder.location(event)
+                else:
+                    frame = encoder.status(event)
+                if strip_seq:
+                    frame.pop("seq")
+                payload = encoder.encode(frame)
+                size = len(payload if isinstance(payload, bytes) else payload.encode())
+                size += frame_header_bytes(size)
+                total += size
+                if event["type"] == "location_update":
+                    location_total += size
+                    locations += 1
+            baseline = baseline or total
+            self.stdout.write(
+                f"{name:>16} {total:>10} {location_total / locations:>9.1f} {total / baseline:>9.0%}"
+            )
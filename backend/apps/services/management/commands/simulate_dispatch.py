@@ -0,0 +1,62 @@
+"""
+Replay a synthetic city through dispatch and print comparable numbers.
+
+    python manage.py simulate_dispatch --providers 1000 --requests 500 --mode both
+    python manage.py simulate_dispatch --city mumbai --json > before.json
+
+See apps.services.simulation for what is seeded, stubbed and measured.
+Seeded rows are rolled back at the end.
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.services.simulation import CITIES, run_simulation
+
+
+class Command(BaseCommand):
+    help = 'Simulate dispatch at scale and report latency, query counts and assignment quality'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=500, help='Synthetic providers to seed')
+        parser.add_argument('--requests', type=int, default=200, help='Synthetic requests to dispatch')
+        parser.add_argument('--city', choices=sorted(CITIES), default='bangalore')
+        parser.add_argument('--mode', choices=['greedy', 'batch', 'both'], default='both')
+        parser.add_argument('--window', type=int, default=50, help='Requests per batch in batch mode')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, same seed = same city')
+        parser.add_argument('--json', action='store_true', help='Print the raw reports as JSON')
+
+    def handle(self, *args, **options):
+        modes = ['greedy', 'batch'] if options['mode'] == 'both' else [options['mode']]
+        reports = [
+            run_simulation(
+                providers=options['providers'], requests=options['requests'], city=options['city'],
+                mode=mode, window=options['window'], seed=options['seed'],
+            )
+            for mode in modes
+        ]
+
+        if options['json']:
+            self.stdout.write(json.dumps(reports, indent=2))
+            return
+
+        for report in reports:
+            self.stdout.write(
+                f"\n{report['mode']} dispatch, {report['city']}: "
+                f"{report['providers']} providers, {report['requests']} requests, "
+                f"{report['dispatch_throughput']:.1f} dispatched/s"
+            )
+            self.stdout.write(f"{'stage':>9} {'calls':>6} {'per s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+            for name, stage in report['stages'].items():
+                self.stdout.write(
+                    f"{name:>9} {stage['calls']:>6} {stage['per_second']:>8.1f} "
+                    f"{stage['p50_ms']:>7.2f}ms {stage['p95_ms']:>7.2f}ms {stage['p99_ms']:>7.2f}ms "
+                    f"{stage['queries_per_call']:>8.1f}"
+                )
+            quality = report['quality']
+            self.stdout.write(
+                f"assigned {quality['assigned']} ({quality['assigned_share']:.0%}), "
+                f"pickup mean {quality['mean_pickup_km']:.2f}km p95 {quality['p95_pickup_km']:.2f}km "
+                f"total {quality['total_pickup_km']:.1f}km, "
+                f"capability mismatches {quality['capability_mismatches']}"
+            )
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def seed_dispatch_watermark(apps, schema_editor):
+    """Open dispatches count as one attempt, escalating 15 minutes after creation as before."""
+    ServiceRequest = apps.get_model("services", "ServiceRequest")
+    ServiceRequest.objects.filter(status="DISPATCHED").update(
+        dispatched_at=F("created_at"),
+        dispatch_attempts=1,
+        next_escalation_at=F("created_at") + timedelta(minutes=15),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("services", "0019_replacement_vehicle_nullable_fields"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="servicerequest",
+            name="dispatch_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="servicerequest",
+            name="dispatched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="servicerequest",
+            name="next_escalation_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the escalation sweeper next re-dispatches this request; empty once it gives up.",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="servicerequest",
+            index=models.Index(fields=["status", "next_escalation_at"], name="services_se_status_32ac04_idx"),
+        ),
+        migrations.RunPython(seed_dispatch_watermark, migrations.RunPython.noop),
+    ]
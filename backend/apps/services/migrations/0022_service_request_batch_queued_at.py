@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0021_outbox_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicerequest',
+            name='batch_queued_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='When the request joined the batch dispatch queue; empty unless queued.', null=True),
+        ),
+    ]
@@ -1,8 +1,10 @@
 # backend/apps/services/models.py
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
 
 # Get the CustomUser model defined in the users app
@@ -266,18 +268,105 @@ class ServiceRequest(models.Model):
         help_text="Privacy-safe location details for vehicle placement"
     )
 
+    SOURCE_IOT = "IOT"
+
     source = models.CharField(
         max_length=20, default="APP", help_text="Source: APP, IoT Device, or HELPLINE"
     )
     created_at = models.DateTimeField(default=timezone.now)
 
+    # Dispatch watermark driving escalation of requests nobody picks up
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    dispatch_attempts = models.PositiveSmallIntegerField(default=0)
+    next_escalation_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="When the escalation sweeper next re-dispatches this request; empty once it gives up.",
+    )
+    batch_queued_at = models.DateTimeField(
+        null=True, blank=True, db_index=True,
+        help_text="When the request joined the batch dispatch queue; empty unless queued.",
+    )
+
+    # Fields whose transitions drive notifications and provider release
+    TRACKED_FIELDS = ("status", "provider_id")
+
     def __str__(self):
         return f"Request {self.id} - {self.service_type} ({self.status})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_tracked()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_tracked(fields)
+
+    def save(self, *args, **kwargs):
+        # post_save handlers run inside super().save() and still see the
+        # values this instance was loaded with
+        super().save(*args, **kwargs)
+        self._remember_tracked(kwargs.get("update_fields"))
+
+    def _remember_tracked(self, fields=None):
+        """Records the stored value of the tracked fields (all, or those in `fields`)."""
+        if fields is not None:
+            fields = {self._meta.get_field(name).attname for name in fields}
+        stored = self.__dict__.setdefault("_stored_tracked", {})
+        for attname in self.TRACKED_FIELDS:
+            # Deferred fields are absent from __dict__; reading them would query
+            if attname in self.__dict__ and (fields is None or attname in fields):
+                stored[attname] = self.__dict__[attname]
+
+    def tracked_changes(self):
+        """
+        {field: (stored, current)} for the tracked fields that differ from
+        what this instance last loaded or saved. A field whose stored value
+        is unknown (deferred, or an instance built by hand) counts as changed.
+        """
+        stored = self.__dict__.get("_stored_tracked", {})
+        missing = object()
+        changes = {}
+        for attname in self.TRACKED_FIELDS:
+            if attname not in self.__dict__:
+                continue
+            previous = stored.get(attname, missing)
+            if previous is missing or previous != self.__dict__[attname]:
+                changes[attname] = (None if previous is missing else previous, self.__dict__[attname])
+        return changes
+
+    def mark_dispatched(self, provider):
+        """Assigns the provider and schedules the next escalation check (not saved)."""
+        now = timezone.now()
+        self.provider = provider
+        self.status = "DISPATCHED"
+        self.dispatched_at = now
+        self.dispatch_attempts += 1
+        self.schedule_escalation(now)
+
+    def schedule_escalation(self, now=None):
+        """
+        Exponential backoff: the first check comes DISPATCH_ESCALATION_MINUTES
+        after dispatch, each later one twice as late. Gives up (leaving the
+        request to the helpline) after DISPATCH_MAX_ATTEMPTS.
+        """
+        now = now or timezone.now()
+        if self.dispatch_attempts >= getattr(settings, "DISPATCH_MAX_ATTEMPTS", 5):
+            self.next_escalation_at = None
+            return
+        base = getattr(settings, "DISPATCH_ESCALATION_MINUTES", 15)
+        ceiling = getattr(settings, "DISPATCH_ESCALATION_MAX_MINUTES", 240)
+        minutes = min(base * 2 ** max(self.dispatch_attempts - 1, 0), ceiling)
+        self.next_escalation_at = now + timedelta(minutes=minutes)
+
     class Meta:
         verbose_name = "Service Request"
         verbose_name_plural = "Service Requests"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_escalation_at"]),
+        ]
 
 
 class ServiceQuote(models.Model):
@@ -788,3 +877,45 @@ class ChatMessage(models.Model):
         verbose_name = "Chat Message"
         verbose_name_plural = "Chat Messages"
         ordering = ["created_at"]
+
+
+class OutboxMessage(models.Model):
+    """
+    Transactional outbox for notifications sent through third-party
+    gateways (SMTP, SMS). Rows are written in the same transaction as the
+    change they announce and delivered later by the relay_outbox task, so a
+    request never waits on a gateway and a rolled-back change sends nothing.
+    The payload is the fully rendered message.
+    """
+
+    CHANNEL_CHOICES = [
+        ("EMAIL", "Email"),
+        ("SMS", "SMS"),
+    ]
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("SENT", "Sent"),
+        ("DEAD", "Dead-lettered"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    topic = models.CharField(max_length=50, blank=True, help_text="What the message is about, e.g. provider_assigned")
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Due time while pending; a relay that claims a row pushes it one lease ahead
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Outbox Message"
+        verbose_name_plural = "Outbox Messages"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_due"),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} {self.topic or 'message'} #{self.pk} ({self.status})"
@@ -0,0 +1,244 @@
+"""
+Transactional notification outbox.
+
+Code that used to call the SMTP server or the SMS gateway inline now
+renders the message and writes an OutboxMessage row in its own
+transaction. The row commits or rolls back with the change it announces,
+and the request returns without touching a gateway.
+
+The relay_outbox task delivers the rows in batches:
+
+- a batch is claimed by pushing its rows' due time one lease ahead, with
+  SKIP LOCKED where the database supports it. Concurrent relays never
+  share a row, and rows of a relay that died become due again,
+- each channel hands its share of the batch to its transport in one
+  call: email to send_email_batch (EMAIL_CONNECTIONS persistent SMTP
+  connections), SMS to the SMS transport's send_many (bulk calls, capped
+  at SMS_CONCURRENCY). Channels run side by side, so a slow SMTP server
+  does not hold up SMS and neither gateway is flooded,
+- failures are retried with exponential backoff. After OUTBOX_MAX_ATTEMPTS
+  tries, or at once for errors that cannot succeed later (no SMS
+  configured, invalid number), the row is dead-lettered: it stays as
+  status DEAD with its last error, for inspection and requeueing from the
+  admin.
+
+Committing a message also kicks the relay, at most once a second, so
+delivery is near-immediate. The periodic relay run is the safety net.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from smtplib import SMTPRecipientsRefused
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .services.sms import INVALID_NUMBER, NOT_CONFIGURED, get_sms_transport
+from .utils.email_utils import build_email, send_email_batch
+
+logger = logging.getLogger(__name__)
+
+EMAIL = "EMAIL"
+SMS = "SMS"
+
+KICK_KEY = "outbox:relay:kick"
+
+# SMS errors retrying cannot fix
+PERMANENT_SMS_ERRORS = {NOT_CONFIGURED, INVALID_NUMBER}
+
+
+class DeliveryError(Exception):
+    """A message could not be delivered this time; it will be retried."""
+
+
+class PermanentDeliveryError(DeliveryError):
+    """A message can never be delivered; it is dead-lettered at once."""
+
+
+def _kick_relay():
+    # Many messages commit together; one relay run picks them all up
+    if not cache.add(KICK_KEY, 1, timeout=1):
+        return
+    from .tasks import relay_outbox
+
+    try:
+        relay_outbox.delay()
+    except Exception as e:
+        # Broker unavailable: the periodic run still delivers the message
+        logger.warning(f"Could not kick the outbox relay: {e}")
+
+
+def enqueue(channel, payload, topic=""):
+    """Writes a message to the outbox; it is delivered after commit."""
+    message = OutboxMessage.objects.create(channel=channel, topic=topic, payload=payload)
+    transaction.on_commit(_kick_relay)
+    return message
+
+
+def enqueue_email(subject, text_content, html_content, recipient_list, topic=""):
+    """Queues an email; same arguments as email_utils.send_email."""
+    recipients = [address for address in recipient_list if address]
+    if not recipients:
+        return None
+    return enqueue(EMAIL, {
+        "subject": subject, "text": text_content, "html": html_content, "to": recipients,
+    }, topic=topic)
+
+
+def enqueue_sms(phone_number, message, topic=""):
+    """Queues an SMS; same arguments as Fast2SMSService.send_sms."""
+    if not phone_number:
+        return None
+    return enqueue(SMS, {"phone_number": str(phone_number), "message": message}, topic=topic)
+
+
+def email_sender(topic):
+    """A `send` for the email_utils helpers that queues instead of sending."""
+    return partial(enqueue_email, topic=topic)
+
+
+def sms_sender(topic):
+    """A `send` for the Fast2SMSService helpers that queues instead of sending."""
+    return partial(enqueue_sms, topic=topic)
+
+
+def _deliver_email_batch(messages):
+    errors = send_email_batch([
+        build_email(message.payload["subject"], message.payload["text"], message.payload.get("html"),
+                    message.payload["to"])
+        for message in messages
+    ])
+    outcomes = {}
+    for message, error in zip(messages, errors):
+        if error is None:
+            outcomes[message.id] = None
+        elif isinstance(error, SMTPRecipientsRefused):
+            outcomes[message.id] = PermanentDeliveryError(str(error))
+        else:
+            outcomes[message.id] = DeliveryError(f"{type(error).__name__}: {error}")
+    return outcomes
+
+
+def _deliver_sms_batch(messages):
+    results = get_sms_transport().send_many(
+        [(message.payload["phone_number"], message.payload["message"]) for message in messages]
+    )
+    outcomes = {}
+    for message, result in zip(messages, results):
+        if result.success:
+            outcomes[message.id] = None
+        elif result.error in PERMANENT_SMS_ERRORS:
+            outcomes[message.id] = PermanentDeliveryError(result.error)
+        else:
+            outcomes[message.id] = DeliveryError(result.error)
+    return outcomes
+
+
+# Each channel's messages go to its transport in one call, which returns
+# {message id: None or DeliveryError}
+DELIVERY = {
+    EMAIL: _deliver_email_batch,
+    SMS: _deliver_sms_batch,
+}
+
+# Channels that never touch the database, run beside the relay's thread
+OFF_THREAD = {EMAIL}
+
+
+def retry_delay(attempts):
+    """Backoff before the next try of a message that failed `attempts` times."""
+    base = getattr(settings, "OUTBOX_RETRY_BASE_SECONDS", 30)
+    ceiling = getattr(settings, "OUTBOX_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), ceiling))
+
+
+def claim_batch(limit, now=None):
+    """Leases up to `limit` due messages to this relay and returns them."""
+    now = now or timezone.now()
+    lease = timedelta(seconds=getattr(settings, "OUTBOX_LEASE_SECONDS", 300))
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING", next_attempt_at__lte=now)
+            .order_by("next_attempt_at")
+            .values_list("id", flat=True)[:limit]
+        )
+        OutboxMessage.objects.filter(id__in=ids).update(next_attempt_at=now + lease)
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by("id"))
+
+
+def deliver(messages):
+    """
+    Sends messages, all channels at once. Returns {message id: None on
+    success or the DeliveryError}.
+    """
+    by_channel = {}
+    for message in messages:
+        by_channel.setdefault(message.channel, []).append(message)
+
+    def run(channel):
+        send = DELIVERY.get(channel)
+        if send is None:
+            return {m.id: PermanentDeliveryError(f"Unknown channel {channel}") for m in by_channel[channel]}
+        try:
+            return send(by_channel[channel])
+        except Exception as e:
+            return {m.id: DeliveryError(f"{type(e).__name__}: {e}") for m in by_channel[channel]}
+
+    outcomes = {}
+    off_thread = [channel for channel in by_channel if channel in OFF_THREAD]
+    with ThreadPoolExecutor(max_workers=max(1, len(off_thread)), thread_name_prefix="outbox") as pool:
+        futures = [pool.submit(run, channel) for channel in off_thread]
+        for channel in by_channel:
+            if channel not in OFF_THREAD:
+                outcomes.update(run(channel))
+        for future in futures:
+            outcomes.update(future.result())
+    return outcomes
+
+
+def record_outcomes(messages, outcomes, now=None):
+    """Marks delivered messages sent and schedules or dead-letters the rest."""
+    now = now or timezone.now()
+    max_attempts = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 6)
+    sent, failed, dead = [], [], 0
+    for message in messages:
+        error = outcomes.get(message.id)
+        if error is None:
+            sent.append(message.id)
+            continue
+        message.attempts += 1
+        message.last_error = str(error)[:1000]
+        if isinstance(error, PermanentDeliveryError) or message.attempts >= max_attempts:
+            message.status = "DEAD"
+            dead += 1
+            logger.error(f"Dead-lettered outbox message {message.pk} ({message.channel} {message.topic}): {error}")
+        else:
+            message.next_attempt_at = now + retry_delay(message.attempts)
+        failed.append(message)
+
+    OutboxMessage.objects.filter(id__in=sent).update(status="SENT", sent_at=now, attempts=F("attempts") + 1)
+    OutboxMessage.objects.bulk_update(failed, ["attempts", "last_error", "status", "next_attempt_at"])
+    return {"sent": len(sent), "retried": len(failed) - dead, "dead": dead}
+
+
+def relay_batch(batch_size=None):
+    """Claims, delivers and records one batch. Returns the counts."""
+    batch_size = batch_size or getattr(settings, "OUTBOX_BATCH_SIZE", 200)
+    messages = claim_batch(batch_size)
+    if not messages:
+        return {"claimed": 0, "sent": 0, "retried": 0, "dead": 0}
+    summary = record_outcomes(messages, deliver(messages))
+    return {"claimed": len(messages), **summary}
+
+
+def requeue(queryset):
+    """Puts dead-lettered (or any) messages back in line with fresh attempts."""
+    return queryset.exclude(status="SENT").update(
+        status="PENDING", attempts=0, next_attempt_at=timezone.now(), last_error=""
+    )
@@ -0,0 +1,208 @@
+"""
+Batched Google Distance Matrix client with a route cache.
+
+Quoting used to make one blocking origin/destination request per provider.
+This client packs many pairs into as few matrix requests as the API limits
+allow, reuses one pooled HTTP session, and caches every answer on snapped
+coordinates so repeat pairs (same provider parked at the same spot, quote
+retries, re-dispatch) cost no network round trip at all.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+
+# Google Distance Matrix limits per request
+MAX_ORIGINS = 25
+MAX_DESTINATIONS = 25
+MAX_ELEMENTS = 100
+
+# 4 decimal places is ~11m, well inside GPS noise for a parked vehicle
+SNAP_DECIMALS = 4
+
+DEFAULT_CACHE_TTL_SECONDS = 15 * 60
+DEFAULT_CACHE_SIZE = 10000
+
+# (connect, read) timeouts; quoting should fall back quickly, not hang dispatch
+DEFAULT_TIMEOUT = (2, 5)
+
+
+def snap(latitude, longitude):
+    """Rounds a coordinate pair to the cache grid."""
+    return round(float(latitude), SNAP_DECIMALS), round(float(longitude), SNAP_DECIMALS)
+
+
+class RouteCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DistanceMatrixClient:
+    """
+    Resolves driving distance/duration for many origin/destination pairs.
+
+    Results are (distance_km, duration_min) tuples. Pairs the API could not
+    route are returned as None so callers can fall back to Haversine.
+    """
+
+    def __init__(self, api_key, base_url=DISTANCE_MATRIX_URL, timeout=DEFAULT_TIMEOUT,
+                 cache=None, pool_size=10):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cache = cache if cache is not None else RouteCache()
+        self.requests_made = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def route(self, origin, destination):
+        """Returns (distance_km, duration_min) for one pair, or None."""
+        return self.matrix([origin], [destination]).get((snap(*origin), snap(*destination)))
+
+    def matrix(self, origins, destinations):
+        """
+        Returns {(snapped_origin, snapped_destination): (km, min) or None} for
+        every combination. Cached pairs are answered locally; the rest are
+        fetched in as few requests as the API limits allow.
+        """
+        origins = list(dict.fromkeys(snap(*o) for o in origins))
+        destinations = list(dict.fromkeys(snap(*d) for d in destinations))
+
+        results = {}
+        missing_by_destination = OrderedDict()
+        for origin in origins:
+            for destination in destinations:
+                cached = self.cache.get((origin, destination))
+                if cached is not None:
+                    results[(origin, destination)] = cached
+                else:
+                    missing_by_destination.setdefault(destination, []).append(origin)
+
+        if missing_by_destination and self.api_key:
+            # Group destinations that share the same set of missing origins, so
+            # the common case (N providers -> 1 customer) is a single request
+            groups = OrderedDict()
+            for destination, missing_origins in missing_by_destination.items():
+                groups.setdefault(tuple(missing_origins), []).append(destination)
+            for group_origins, group_destinations in groups.items():
+                results.update(self._fetch(list(group_origins), group_destinations))
+
+        for destination, missing_origins in missing_by_destination.items():
+            for origin in missing_origins:
+                results.setdefault((origin, destination), None)
+        return results
+
+    def _fetch(self, origins, destinations):
+        found = {}
+        dest_step = min(MAX_DESTINATIONS, MAX_ELEMENTS)
+        for d in range(0, len(destinations), dest_step):
+            dest_chunk = destinations[d:d + dest_step]
+            origin_step = min(MAX_ORIGINS, MAX_ELEMENTS // len(dest_chunk))
+            for o in range(0, len(origins), origin_step):
+                found.update(self._request(origins[o:o + origin_step], dest_chunk))
+        return found
+
+    def _request(self, origins, destinations):
+        params = {
+            "origins": "|".join(f"{lat},{lng}" for lat, lng in origins),
+            "destinations": "|".join(f"{lat},{lng}" for lat, lng in destinations),
+            "key": self.api_key,
+            "mode": "driving",  # Assumes driving for roadside assistance
+        }
+        self.requests_made += 1
+        try:
+            response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Distance Matrix request failed: {e}")
+            return {}
+
+        if data.get("status") != "OK":
+            logger.warning(f"Distance Matrix returned status {data.get('status')}")
+            return {}
+
+        found = {}
+        for origin, row in zip(origins, data.get("rows", [])):
+            for destination, element in zip(destinations, row.get("elements", [])):
+                if element.get("status") != "OK":
+                    continue
+                # distance in meters, duration in seconds
+                route = (
+                    element["distance"]["value"] / 1000.0,
+                    int(element["duration"]["value"] / 60),
+                )
+                self.cache.set((origin, destination), route)
+                found[(origin, destination)] = route
+        return found
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_distance_matrix_client(api_key=None):
+    """Returns the process-wide client for `api_key` (defaults to settings)."""
+    if api_key is None:
+        api_key = getattr(settings, "GOOGLE_MAPS_API_KEY", "")
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = DistanceMatrixClient(
+                    api_key,
+                    base_url=getattr(settings, "DISTANCE_MATRIX_URL", DISTANCE_MATRIX_URL),
+                    cache=RouteCache(
+                        max_size=getattr(settings, "DISTANCE_MATRIX_CACHE_SIZE", DEFAULT_CACHE_SIZE),
+                        ttl=getattr(settings, "DISTANCE_MATRIX_CACHE_TTL_SECONDS", DEFAULT_CACHE_TTL_SECONDS),
+                    ),
+                )
+                _clients[api_key] = client
+    return client
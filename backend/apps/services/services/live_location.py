@@ -0,0 +1,370 @@
+"""
+Live provider location layer.
+
+Provider apps ping their position every few seconds. Pings land in a Redis
+GEO set (GEOADD/GEOSEARCH) instead of hitting Postgres, and a periodic task
+flushes the latest position of every provider that moved back to the
+database in one bulk UPDATE. Dispatch and request tracking read positions
+from here first, so they always see the freshest fix.
+
+When the default cache is not Redis (tests, local SQLite setups) an
+in-process stand-in with the same command surface is used instead.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from redis.exceptions import ResponseError
+
+from apps.common.geo import haversine_many
+
+logger = logging.getLogger(__name__)
+
+GEO_KEY = "vehicaid:live:providers:geo"
+SEEN_KEY = "vehicaid:live:providers:seen"
+DIRTY_KEY = "vehicaid:live:providers:dirty"
+
+# Positions older than this are ignored by readers
+DEFAULT_FRESHNESS_SECONDS = 300
+
+# Redis GEO sets only index the Web Mercator range; GEOADD rejects the poles
+GEO_MAX_LATITUDE = 85.05112878
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class InMemoryGeoClient:
+    """
+    Thread-safe, fakeredis-compatible stand-in implementing the subset of
+    redis-py used by LiveLocationStore and the tracking stream (GEO, hash,
+    set and sorted set commands, pipelines and locks).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._named_locks = {}
+        self._geo = {}
+        self._hashes = {}
+        self._sets = {}
+        self._zsets = {}
+
+    def _stores(self):
+        return (self._geo, self._hashes, self._sets, self._zsets)
+
+    def pipeline(self, transaction=True):
+        return _InMemoryPipeline(self)
+
+    def lock(self, name, timeout=None):
+        # One process: a plain lock per name, which needs no expiry
+        with self._lock:
+            return self._named_locks.setdefault(name, threading.Lock())
+
+    def geoadd(self, name, values, nx=False, xx=False, ch=False):
+        with self._lock:
+            members = self._geo.setdefault(name, {})
+            added = 0
+            for i in range(0, len(values), 3):
+                lon, lat, member = values[i:i + 3]
+                if not (-180 <= float(lon) <= 180 and -GEO_MAX_LATITUDE <= float(lat) <= GEO_MAX_LATITUDE):
+                    raise ResponseError(f"ERR invalid longitude,latitude pair {float(lon):f},{float(lat):f}")
+                added += str(member) not in members
+                members[str(member)] = (float(lon), float(lat))
+            return added
+
+    def geopos(self, name, *members):
+        with self._lock:
+            positions = self._geo.get(name, {})
+            return [positions.get(str(m)) for m in members]
+
+    def geosearch(self, name, longitude=None, latitude=None, unit="m", radius=None,
+                  sort=None, count=None, withdist=False, **kwargs):
+        with self._lock:
+            items = list(self._geo.get(name, {}).items())
+        if not items:
+            return []
+
+        distances_km = haversine_many(
+            latitude, longitude, [pos[1] for _, pos in items], [pos[0] for _, pos in items]
+        )
+        scale = {"m": 1000.0, "km": 1.0}[unit]
+        radius_km = radius / scale
+
+        results = [
+            (member, dist * scale)
+            for (member, _), dist in zip(items, distances_km) if dist <= radius_km
+        ]
+        if sort == "ASC":
+            results.sort(key=lambda r: r[1])
+        elif sort == "DESC":
+            results.sort(key=lambda r: r[1], reverse=True)
+        if count is not None:
+            results = results[:count]
+        if withdist:
+            return [[member, dist] for member, dist in results]
+        return [member for member, _ in results]
+
+    def zrem(self, name, *members):
+        with self._lock:
+            # GEO sets are sorted sets in Redis, so ZREM covers both
+            target = self._geo.get(name) or self._zsets.get(name, {})
+            return sum(target.pop(str(m), None) is not None for m in members)
+
+    def zadd(self, name, mapping, gt=False):
+        with self._lock:
+            target = self._zsets.setdefault(name, {})
+            added = 0
+            for member, score in mapping.items():
+                current = target.get(str(member))
+                added += current is None
+                if current is None or not gt or float(score) > current:
+                    target[str(member)] = float(score)
+            return added
+
+    def zcount(self, name, min, max):
+        low = float("-inf") if min == "-inf" else float(min)
+        high = float("inf") if max == "+inf" else float(max)
+        with self._lock:
+            return sum(low <= score <= high for score in self._zsets.get(name, {}).values())
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self._zsets.get(name, {}))
+
+    def zrangebyscore(self, name, min, max):
+        low = float("-inf") if min == "-inf" else float(min)
+        high = float("inf") if max == "+inf" else float(max)
+        with self._lock:
+            items = sorted(self._zsets.get(name, {}).items(), key=lambda item: item[1])
+        return [member for member, score in items if low <= score <= high]
+
+    def zremrangebyrank(self, name, start, end):
+        with self._lock:
+            target = self._zsets.get(name, {})
+            ranked = sorted(target, key=target.get)
+            # Redis ranks are inclusive and may count from the end
+            doomed = ranked[start:(end + 1) or None] if end < 0 else ranked[start:end + 1]
+            for member in doomed:
+                del target[member]
+            return len(doomed)
+
+    def expire(self, name, seconds):
+        # In-process state lives as long as the process; keys never expire
+        return any(name in store for store in self._stores())
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self._lock:
+            target = self._hashes.setdefault(name, {})
+            if key is not None:
+                target[str(key)] = str(value)
+            for k, v in (mapping or {}).items():
+                target[str(k)] = str(v)
+
+    def hmget(self, name, keys, *args):
+        with self._lock:
+            target = self._hashes.get(name, {})
+            return [target.get(str(k)) for k in list(keys) + list(args)]
+
+    def hdel(self, name, *keys):
+        with self._lock:
+            target = self._hashes.get(name, {})
+            return sum(target.pop(str(k), None) is not None for k in keys)
+
+    def sadd(self, name, *values):
+        with self._lock:
+            target = self._sets.setdefault(name, set())
+            before = len(target)
+            target.update(str(v) for v in values)
+            return len(target) - before
+
+    def srem(self, name, *values):
+        with self._lock:
+            target = self._sets.get(name, set())
+            before = len(target)
+            target.difference_update(str(v) for v in values)
+            return before - len(target)
+
+    def scard(self, name):
+        with self._lock:
+            return len(self._sets.get(name, set()))
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            target = self._hashes.setdefault(name, {})
+            target[str(key)] = str(int(target.get(str(key), 0)) + amount)
+            return int(target[str(key)])
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def spop(self, name, count=None):
+        with self._lock:
+            target = self._sets.get(name, set())
+            popped = [target.pop() for _ in range(min(count or 1, len(target)))]
+        if count is None:
+            return popped[0] if popped else None
+        return popped
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(
+                any(store.pop(name, None) is not None for store in self._stores())
+                for name in names
+            )
+
+    def rename(self, src, dst):
+        with self._lock:
+            for store in self._stores():
+                store.pop(dst, None)
+            for store in self._stores():
+                if src in store:
+                    store[dst] = store.pop(src)
+                    return True
+        raise KeyError(src)
+
+    def flushall(self):
+        with self._lock:
+            for store in self._stores():
+                store.clear()
+
+
+class _InMemoryPipeline:
+    """Buffers commands and replays them on execute(), like a redis pipeline."""
+
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+class LiveLocationStore:
+    """Reads and writes live provider positions in a Redis GEO set."""
+
+    def __init__(self, client, freshness_seconds=None):
+        self.client = client
+        if freshness_seconds is None:
+            freshness_seconds = getattr(settings, "LIVE_LOCATION_FRESHNESS_SECONDS", DEFAULT_FRESHNESS_SECONDS)
+        self.freshness_seconds = freshness_seconds
+
+    def update(self, provider_id, latitude, longitude, timestamp=None):
+        """Records a ping and marks the provider for the next DB flush."""
+        timestamp = timestamp or time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.geoadd(GEO_KEY, [float(longitude), float(latitude), str(provider_id)])
+        pipe.hset(SEEN_KEY, mapping={str(provider_id): timestamp})
+        pipe.sadd(DIRTY_KEY, str(provider_id))
+        pipe.execute()
+
+    def remove(self, provider_id):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrem(GEO_KEY, str(provider_id))
+        pipe.hdel(SEEN_KEY, str(provider_id))
+        pipe.execute()
+
+    def _fresh(self, seen, now):
+        return seen is not None and now - float(_decode(seen)) <= self.freshness_seconds
+
+    def get(self, provider_id):
+        """Returns (latitude, longitude) or None if unknown or stale."""
+        return self.get_many([provider_id]).get(int(provider_id))
+
+    def get_many(self, provider_ids):
+        """Returns {provider_id: (latitude, longitude)} for fresh positions."""
+        members = [str(pid) for pid in provider_ids]
+        if not members:
+            return {}
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.geopos(GEO_KEY, *members)
+        pipe.hmget(SEEN_KEY, members)
+        positions, seen = pipe.execute()
+
+        now = time.time()
+        found = {}
+        for member, position, last_seen in zip(members, positions, seen):
+            if position and self._fresh(last_seen, now):
+                lon, lat = position
+                found[int(member)] = (float(lat), float(lon))
+        return found
+
+    def search(self, latitude, longitude, radius_km, count=None):
+        """Returns [(provider_id, distance_km)] within the radius, nearest first."""
+        results = self.client.geosearch(
+            GEO_KEY, longitude=float(longitude), latitude=float(latitude),
+            radius=radius_km, unit="km", sort="ASC", count=count, withdist=True,
+        )
+        if not results:
+            return []
+
+        members = [_decode(member) for member, _ in results]
+        seen = self.client.hmget(SEEN_KEY, members)
+        now = time.time()
+        return [
+            (int(member), float(dist))
+            for member, (_, dist), last_seen in zip(members, results, seen)
+            if self._fresh(last_seen, now)
+        ]
+
+    def pop_dirty(self, limit=1000):
+        """
+        Returns {provider_id: (latitude, longitude)} for up to `limit`
+        providers that moved since the last flush, clearing their dirty flag.
+        """
+        members = [_decode(m) for m in (self.client.spop(DIRTY_KEY, limit) or [])]
+        if not members:
+            return {}
+        positions = self.client.geopos(GEO_KEY, *members)
+        return {
+            int(member): (float(pos[1]), float(pos[0]))
+            for member, pos in zip(members, positions) if pos
+        }
+
+
+_client = None
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_client():
+    """
+    Returns the process-wide client for hot, frequently rewritten state:
+    the Redis connection when the cache is Redis, else an in-process
+    stand-in.
+    """
+    global _client
+    if _client is None:
+        with _store_lock:
+            if _client is None:
+                backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+                if backend.startswith("django_redis"):
+                    from django_redis import get_redis_connection
+                    _client = get_redis_connection("default")
+                else:
+                    logger.info("Default cache is not Redis; using in-process state store.")
+                    _client = InMemoryGeoClient()
+    return _client
+
+
+def get_live_location_store():
+    """Returns the process-wide store, backed by Redis when the cache is Redis."""
+    global _store
+    if _store is None:
+        client = get_state_client()
+        with _store_lock:
+            if _store is None:
+                _store = LiveLocationStore(client)
+    return _store
@@ -1,10 +1,12 @@
 import logging
 import os
-import requests
 from django.conf import settings
 from decimal import Decimal
 from datetime import datetime
 
+from apps.common.geo import haversine_km
+from .distance_matrix import get_distance_matrix_client
+
 logger = logging.getLogger(__name__)
 
 class PricingService:
@@ -26,7 +28,6 @@ class PricingService:
             except Exception:
                 # last resort: empty key (distance API calls will fall back to straight-line distance)
                 self.api_key = ""
-        self.base_url = "https://maps.googleapis.com/maps/api/distancematrix/json"
         
         # Budget-friendly base pricing per service type (in INR)
         # Designed for lower-middle to upper-middle class affordability
@@ -142,57 +143,31 @@ class PricingService:
         Calculate distance using Google Maps Distance Matrix API.
         Returns distance in km and duration in minutes.
         """
-        try:
-            params = {
-                "origins": f"{origin_lat},{origin_lng}",
-                "destinations": f"{dest_lat},{dest_lng}",
-                "key": self.api_key,
-                "mode": "driving",
-            }
-            
-            response = requests.get(self.base_url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data["status"] == "OK":
-                element = data["rows"][0]["elements"][0]
-                if element["status"] == "OK":
-                    distance_m = element["distance"]["value"]
-                    duration_s = element["duration"]["value"]
-                    
-                    # Convert to Decimal safely
-                    distance_km = Decimal(str(distance_m / 1000.0))
-                    duration_min = int(duration_s / 60)
-                    
-                    return distance_km, duration_min
-            
-            # Fallback to straight-line distance if API fails
-            return self._calculate_straight_line_distance(
-                origin_lat, origin_lng, dest_lat, dest_lng
-            ), 30
-            
-        except Exception as e:
-            logger.error(f"Error calculating distance: {e}")
-            return Decimal("10.0"), 30
+        route = get_distance_matrix_client(self.api_key).route(
+            (origin_lat, origin_lng), (dest_lat, dest_lng)
+        )
+        if route:
+            distance_km, duration_min = route
+            # Convert to Decimal safely
+            return Decimal(str(distance_km)), duration_min
+
+        # Fallback to straight-line distance if API fails
+        return self._calculate_straight_line_distance(
+            origin_lat, origin_lng, dest_lat, dest_lng
+        ), 30
+
+    def prefetch_distances(self, origins, destinations):
+        """
+        Resolves every origin/destination pair in one batched matrix call so
+        the quotes that follow are served from the route cache.
+        """
+        return get_distance_matrix_client(self.api_key).matrix(origins, destinations)
     
     def _calculate_straight_line_distance(self, lat1, lon1, lat2, lon2):
         """
         Calculate straight-line distance using Haversine formula.
         """
-        from math import radians, sin, cos, sqrt, atan2
-        
-        R = 6371  # Earth's radius in km
-        
-        lat1, lon1, lat2, lon2 = map(float, [lat1, lon1, lat2, lon2])
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        
-        return Decimal(str(R * c))
+        return Decimal(str(haversine_km(lat1, lon1, lat2, lon2)))
     
     def calculate_quote(self, service_type, provider_lat, provider_lng, 
                        customer_lat, customer_lng, vehicle_type="FOUR_WHEELER",
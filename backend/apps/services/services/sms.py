@@ -1,104 +1,325 @@
-import requests
+"""
+SMS transport shared by every sender in the platform.
+
+All SMS leave through one SMSTransport (see get_sms_transport):
+
+- one pooled requests.Session, so connections to Fast2SMS are reused
+  instead of opening a new TLS connection per message,
+- recipients of the same text are sent in one bulkV2 call (Fast2SMS takes
+  comma-separated numbers), up to SMS_NUMBERS_PER_CALL per call,
+- independent calls go out concurrently, capped at SMS_CONCURRENCY,
+- SMS_DAILY_QUOTA (0 = unlimited) is accounted per recipient in the cache
+  before anything is sent; recipients over the quota fail with
+  QUOTA_EXHAUSTED and can be retried the next day,
+- every outcome is written to SMSMessageLog in one bulk insert per send.
+
+SMSService and sms_utils.Fast2SMSService are thin wrappers over the
+transport that keep their historical return formats. With
+SMS_FAKE_GATEWAY set the session talks to FakeSMSGateway instead of
+Fast2SMS; tests install a transport built around one.
+"""
+import json
 import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from requests.adapters import BaseAdapter, HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+FAST2SMS_URL = "https://www.fast2sms.com/dev/bulkV2"
+
+NOT_CONFIGURED = "SMS not configured"
+INVALID_NUMBER = "Invalid phone number"
+QUOTA_EXHAUSTED = "Daily SMS quota exhausted"
+
+QUOTA_KEY = "sms:quota:{day}"
+
+SMSResult = namedtuple("SMSResult", "phone_number success error request_id")
+
+
+def normalize_number(phone_number):
+    """The 10-digit Indian mobile number Fast2SMS expects, or None."""
+    number = str(phone_number or "").replace("+91", "").replace(" ", "").replace("-", "")
+    return number if len(number) == 10 and number.isdigit() else None
+
+
+class FakeSMSGateway(BaseAdapter):
+    """
+    Stands in for the Fast2SMS API on a requests.Session. Records every
+    call, answers like bulkV2, and fails calls containing a number from
+    `fail_numbers`. `latency` simulates a slow gateway and clearing
+    `available` an unreachable one.
+    """
+
+    def __init__(self, fail_numbers=(), latency=0.0):
+        super().__init__()
+        self.fail_numbers = set(fail_numbers)
+        self.latency = latency
+        self.available = True
+        self.calls = []
+        self.peak_concurrency = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        if not self.available:
+            raise requests.exceptions.ConnectionError("SMS gateway unreachable")
+        with self._lock:
+            self._active += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._active)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            payload = json.loads(request.body)
+            numbers = payload["numbers"].split(",")
+            with self._lock:
+                self.calls.append((numbers, payload["message"]))
+            if self.fail_numbers.intersection(numbers):
+                body = {"return": False, "status_code": 411, "message": "Invalid Numbers"}
+            else:
+                body = {"return": True, "request_id": uuid.uuid4().hex, "message": ["SMS sent successfully."]}
+        finally:
+            with self._lock:
+                self._active -= 1
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+    @property
+    def numbers_sent(self):
+        return [number for numbers, _ in self.calls for number in numbers]
+
+
+class SMSTransport:
+    """Pooled, batching, quota-aware Fast2SMS client."""
+
+    def __init__(self, api_key=None, base_url=FAST2SMS_URL, gateway=None):
+        self.api_key = getattr(settings, "FAST2SMS_API_KEY", "") if api_key is None else api_key
+        self.base_url = base_url
+        self.concurrency = getattr(settings, "SMS_CONCURRENCY", 8)
+        self.numbers_per_call = getattr(settings, "SMS_NUMBERS_PER_CALL", 100)
+        self.timeout = getattr(settings, "SMS_TIMEOUT_SECONDS", 10)
+        self.gateway = gateway
+        self.session = requests.Session()
+        self.session.headers.update({"authorization": self.api_key, "Content-Type": "application/json"})
+        self.session.mount(base_url, gateway or HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency))
+
+    @property
+    def configured(self):
+        return bool(self.api_key) or self.gateway is not None
+
+    def send(self, phone_number, message):
+        """Sends one SMS and returns its SMSResult."""
+        return self.send_many([(phone_number, message)])[0]
+
+    def send_many(self, messages):
+        """
+        Sends [(phone_number, message)] and returns one SMSResult per entry,
+        in order. Identical texts share bulk calls.
+        """
+        results = [None] * len(messages)
+        groups = {}
+        for index, (phone_number, message) in enumerate(messages):
+            number = normalize_number(phone_number)
+            if number is None:
+                results[index] = SMSResult(str(phone_number or ""), False, INVALID_NUMBER, None)
+            elif not self.configured:
+                if settings.DEBUG:
+                    logger.info(f"SIMULATION SMS to {number}: {message}")
+                    results[index] = SMSResult(number, True, None, None)
+                else:
+                    results[index] = SMSResult(number, False, NOT_CONFIGURED, None)
+            else:
+                groups.setdefault(message, []).append((index, number))
+
+        if not self.configured and not settings.DEBUG and messages:
+            logger.error("Fast2SMS API key not configured")
+
+        calls = self._plan_calls(groups, results)
+        if len(calls) == 1:
+            outcomes = [self._post(*calls[0][1:])]
+        elif calls:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(calls)),
+                                    thread_name_prefix="sms") as pool:
+                outcomes = list(pool.map(lambda call: self._post(*call[1:]), calls))
+        else:
+            outcomes = []
+
+        refund = 0
+        for (indexes, numbers, _), (success, error, request_id) in zip(calls, outcomes):
+            if not success:
+                refund += len(numbers)
+            for index, number in zip(indexes, numbers):
+                results[index] = SMSResult(number, success, error, request_id)
+        if refund:
+            self._release_quota(refund)
+
+        self._log(messages, results)
+        return results
+
+    def _plan_calls(self, groups, results):
+        """Splits the groups into bulk calls within the day's quota."""
+        calls = []
+        wanted = sum(len(recipients) for recipients in groups.values())
+        granted = self._reserve_quota(wanted) if wanted else 0
+        if granted < wanted:
+            logger.warning(f"Daily SMS quota exhausted: {wanted - granted} of {wanted} SMS not sent")
+        for message, recipients in groups.items():
+            allowed, refused = recipients[:granted], recipients[granted:]
+            granted -= len(allowed)
+            for index, number in refused:
+                results[index] = SMSResult(number, False, QUOTA_EXHAUSTED, None)
+            for start in range(0, len(allowed), self.numbers_per_call):
+                chunk = allowed[start:start + self.numbers_per_call]
+                calls.append(([index for index, _ in chunk], [number for _, number in chunk], message))
+        return calls
+
+    def _post(self, numbers, message):
+        """One bulkV2 call. Returns (success, error, request_id)."""
+        payload = {"route": "q", "message": message, "language": "english", "flash": 0,
+                   "numbers": ",".join(numbers)}
+        try:
+            response = self.session.post(self.base_url, json=payload, timeout=self.timeout)
+            result = response.json()
+        except requests.exceptions.Timeout:
+            logger.error("SMS request timeout")
+            return False, "Request timeout", None
+        except Exception as e:
+            logger.error(f"SMS exception: {e}")
+            return False, str(e), None
+        if result.get("return"):
+            return True, None, result.get("request_id")
+        logger.error(f"SMS failed: {result.get('message')}")
+        return False, str(result.get("message", "Unknown error")), None
+
+    def _reserve_quota(self, count):
+        """Takes up to `count` sends from today's quota; returns how many were granted."""
+        limit = getattr(settings, "SMS_DAILY_QUOTA", 0)
+        if not limit:
+            return count
+        key = QUOTA_KEY.format(day=timezone.localdate().isoformat())
+        cache.add(key, 0, timeout=2 * 24 * 3600)
+        used = cache.incr(key, count)
+        granted = max(0, min(count, limit - (used - count)))
+        if granted < count:
+            cache.decr(key, count - granted)
+        return granted
+
+    def _release_quota(self, count):
+        if getattr(settings, "SMS_DAILY_QUOTA", 0):
+            try:
+                cache.decr(QUOTA_KEY.format(day=timezone.localdate().isoformat()), count)
+            except ValueError:
+                pass
+
+    def quota_used(self):
+        return cache.get(QUOTA_KEY.format(day=timezone.localdate().isoformat()), 0)
+
+    def _log(self, messages, results):
+        from apps.services.models import SMSMessageLog
+
+        try:
+            SMSMessageLog.objects.bulk_create([
+                SMSMessageLog(
+                    to_number=result.phone_number[:20],
+                    message_body=message,
+                    status="Sent" if result.success else "Failed",
+                    gateway_response=result.request_id if result.success else result.error,
+                )
+                for (_, message), result in zip(messages, results)
+            ], batch_size=500)
+        except Exception as e:
+            logger.error(f"Could not log SMS outcomes: {e}")
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_sms_transport():
+    """The process-wide SMS transport."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                gateway = FakeSMSGateway() if getattr(settings, "SMS_FAKE_GATEWAY", False) else None
+                _transport = SMSTransport(gateway=gateway)
+    return _transport
+
+
+def set_sms_transport(transport):
+    """Replaces the process-wide transport (tests, load generators); returns the old one."""
+    global _transport
+    previous, _transport = _transport, transport
+    return previous
+
+
 class SMSService:
     """
     SMS service wrapper for sending notifications via Fast2SMS or similar gateway.
     """
-    
-    def __init__(self):
-        self.api_key = getattr(settings, 'SMS_API_KEY', '')
-        self.sender_id = getattr(settings, 'SMS_SENDER_ID', 'VEHICAID')
-        self.base_url = "https://www.fast2sms.com/dev/bulkV2"
-    
+
     def send_sms(self, phone_number, message):
         """
         Send SMS to a phone number.
         Returns dict with status and response.
         """
-        if not self.api_key:
-            print("SMS_API_KEY not configured")
-            return {"status": "FAILED", "message": "API key not configured"}
-        
-        try:
-            # Clean phone number (remove +91 if present)
-            phone = phone_number.replace("+91", "").replace(" ", "").replace("-", "")
-            
-            payload = {
-                "sender_id": self.sender_id,
-                "message": message,
-                "route": "v3",
-                "numbers": phone,
-            }
-            
-            headers = {
-                "authorization": self.api_key,
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Cache-Control": "no-cache",
-            }
-            
-            response = requests.post(
-                self.base_url,
-                data=payload,
-                headers=headers,
-                timeout=10
-            )
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get("return"):
-                return {
-                    "status": "SENT",
-                    "message": "SMS sent successfully",
-                    "response": data
-                }
-            else:
-                return {
-                    "status": "FAILED",
-                    "message": data.get("message", "Unknown error"),
-                    "response": data
-                }
-                
-        except Exception as e:
-            logger.error(f"Error sending SMS: {e}")
-            return {
-                "status": "FAILED",
-                "message": str(e),
-                "response": None
-            }
+        return self._as_status(get_sms_transport().send(phone_number, message))
+
+    def send_many(self, messages):
+        """Sends [(phone_number, message)] in bulk; one status dict per entry."""
+        return [self._as_status(result) for result in get_sms_transport().send_many(messages)]
+
+    @staticmethod
+    def _as_status(result):
+        if result.success:
+            return {"status": "SENT", "message": "SMS sent successfully", "response": result.request_id}
+        return {"status": "FAILED", "message": result.error, "response": None}
 
     def _resolve_booker_contact(self, user):
         booker_user = getattr(user, "user", user)
         phone_number = getattr(user, "phone_number", None) or getattr(booker_user, "phone_number", None)
         username = getattr(booker_user, "username", "customer")
         return booker_user, phone_number, username
-    
+
     def send_subscription_expiry_alert(self, user, days_remaining):
         """Send alert when subscription is about to expire."""
         booker_user, phone_number, username = self._resolve_booker_contact(user)
         message = f"Hi {username}, your Vehic-Aid {user.plan.name} plan expires in {days_remaining} days. Renew now to continue enjoying premium benefits!"
         return self.send_sms(phone_number, message)
-    
+
     def send_subscription_renewed(self, user):
         """Send confirmation when subscription is renewed."""
         booker_user, phone_number, _ = self._resolve_booker_contact(user)
         message = f"Your Vehic-Aid {user.plan.name} plan has been renewed successfully. Thank you for choosing Vehic-Aid!"
         return self.send_sms(phone_number, message)
-    
+
     def send_service_request_confirmation(self, request):
         """Send confirmation when service request is created."""
         message = f"Your service request #{request.id} for {request.service_type} has been received. A provider will be assigned shortly."
         return self.send_sms(request.booker.phone_number, message)
-    
+
     def send_provider_assigned(self, request, provider):
         """Send notification when provider is assigned."""
         message = f"Provider {provider.user.username} has been assigned to your request #{request.id}. They will arrive shortly."
         return self.send_sms(request.booker.phone_number, message)
-    
+
     def send_service_completed(self, request):
         """Send notification when service is completed."""
         message = f"Your service request #{request.id} has been completed. Thank you for using Vehic-Aid!"
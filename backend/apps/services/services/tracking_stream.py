@@ -0,0 +1,97 @@
+"""
+Sequenced event stream behind the tracking WebSocket.
+
+Every event sent to a request's `service_{id}` group is numbered from a
+per-request counter and kept in a short replay buffer (a sorted set scored
+by sequence number, trimmed to TRACKING_REPLAY_EVENTS and expiring after
+TRACKING_REPLAY_TTL_SECONDS of silence). A client that reconnects with
+`?since=<last seq it saw>` is sent what it missed instead of refetching the
+request. When the buffer no longer reaches back that far, replay() reports
+a gap and the client is told to resync over REST.
+
+Numbering and sending happen under a per-request lock, so events reach the
+group in sequence order even when several processes publish to the same
+request (the provider's connection and the chat signal, for instance).
+Consumers drop any event numbered at or below the last one they sent, so
+an event overtaken by a later one would otherwise be lost.
+"""
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from apps.services.services.live_location import get_state_client
+
+SEQ_FIELD = "seq"
+
+# A publisher that dies holding the lock releases it after this long
+PUBLISH_LOCK_TIMEOUT_SECONDS = 5
+
+
+def group_name(request_id):
+    return f"service_{request_id}"
+
+
+def _keys(request_id):
+    return f"vehicaid:tracking:{request_id}", f"vehicaid:tracking:{request_id}:events"
+
+
+def _publish_lock(request_id):
+    return get_state_client().lock(f"vehicaid:tracking:{request_id}:lock", timeout=PUBLISH_LOCK_TIMEOUT_SECONDS)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def record(request_id, event):
+    """
+    Numbers `event` and adds it to the replay buffer; returns the numbered
+    event. Live events must go through publish() instead, which keeps the
+    numbering and the send in order.
+    """
+    client = get_state_client()
+    meta_key, events_key = _keys(request_id)
+    seq = client.hincrby(meta_key, SEQ_FIELD, 1)
+    event = dict(event, seq=seq)
+    ttl = settings.TRACKING_REPLAY_TTL_SECONDS
+    pipe = client.pipeline(transaction=False)
+    pipe.zadd(events_key, {json.dumps(event, separators=(",", ":")): seq})
+    pipe.zremrangebyrank(events_key, 0, -(settings.TRACKING_REPLAY_EVENTS + 1))
+    pipe.expire(meta_key, ttl)
+    pipe.expire(events_key, ttl)
+    pipe.execute()
+    return event
+
+
+def publish(request_id, event):
+    """Records `event` and sends it to the request's group; returns the numbered event."""
+    with _publish_lock(request_id):
+        event = record(request_id, event)
+        async_to_sync(get_channel_layer().group_send)(group_name(request_id), event)
+    return event
+
+
+def replay(request_id, since=None):
+    """
+    Returns (current seq, events after `since`). The events are None when
+    some of them are no longer buffered, or when the counter restarted
+    after the stream expired.
+    """
+    client = get_state_client()
+    meta_key, events_key = _keys(request_id)
+    pipe = client.pipeline(transaction=False)
+    pipe.hmget(meta_key, [SEQ_FIELD])
+    if since is not None:
+        pipe.zrangebyscore(events_key, since + 1, "+inf")
+    results = pipe.execute()
+    current = int(_decode(results[0][0]) or 0)
+    if since is None or since == current:
+        return current, []
+    if since > current:
+        return current, None
+    events = [json.loads(_decode(member)) for member in results[1]]
+    if not events or events[0]["seq"] != since + 1:
+        return current, None
+    return current, events
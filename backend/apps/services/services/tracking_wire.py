@@ -0,0 +1,124 @@
+"""
+Wire formats of the tracking WebSocket.
+
+The format is negotiated with a WebSocket subprotocol at connect:
+
+- none: the historical verbose JSON frames (the web app),
+- `vehicaid.compact.v1`: short-key JSON text frames,
+- `vehicaid.msgpack.v1`: the same short-key frames as msgpack binary.
+
+Compact frames (every frame carries `s`, the stream sequence number):
+
+    {"t": "s", "s": 7, "st": "CHAT_MESSAGE", "m": "...", "d": {...}}  status or chat event
+    {"t": "L", "s": 8, "p": [lat, lng, ts]}                          absolute position
+    {"t": "l", "s": 9, "p": [dlat, dlng, dts]}                       delta from the last position
+    {"t": "y", "s": 9}  / {"t": "y", "s": 9, "r": 1}                 stream position / resync needed
+
+Coordinates are fixed-point integers in units of 1e-5 degrees (about a
+metre) and timestamps whole seconds. The first position on a connection,
+and the first after a resync, is absolute; the rest are deltas from the
+previous one, which along a road are a few hundred units at most.
+"""
+import json
+
+import msgpack
+
+SUBPROTOCOL_COMPACT = "vehicaid.compact.v1"
+SUBPROTOCOL_MSGPACK = "vehicaid.msgpack.v1"
+
+COORDINATE_SCALE = 100000
+
+
+class VerboseEncoder:
+    """The original JSON frames, plus the sequence number."""
+    subprotocol = None
+    binary = False
+
+    def status(self, event):
+        return {
+            "status": event.get("status"),
+            "message": event.get("message"),
+            "data": event.get("data", {}),
+            "seq": event.get("seq"),
+        }
+
+    def location(self, event):
+        return {
+            "type": "location",
+            "latitude": event["latitude"],
+            "longitude": event["longitude"],
+            "timestamp": event["timestamp"],
+            "seq": event.get("seq"),
+        }
+
+    def sync(self, seq, resync=False):
+        return {"type": "sync", "seq": seq, "resync": resync}
+
+    def encode(self, frame):
+        return json.dumps(frame)
+
+
+class CompactEncoder(VerboseEncoder):
+    """Short keys and delta-encoded fixed-point positions."""
+    subprotocol = SUBPROTOCOL_COMPACT
+
+    def __init__(self):
+        self.last_position = None
+
+    def status(self, event):
+        frame = {"t": "s", "s": event.get("seq"), "st": event.get("status")}
+        if event.get("message"):
+            frame["m"] = event["message"]
+        if event.get("data"):
+            frame["d"] = event["data"]
+        return frame
+
+    def location(self, event):
+        position = (
+            round(event["latitude"] * COORDINATE_SCALE),
+            round(event["longitude"] * COORDINATE_SCALE),
+            round(event["timestamp"]),
+        )
+        last, self.last_position = self.last_position, position
+        if last is None:
+            return {"t": "L", "s": event.get("seq"), "p": list(position)}
+        return {"t": "l", "s": event.get("seq"), "p": [now - before for now, before in zip(position, last)]}
+
+    def sync(self, seq, resync=False):
+        if resync:
+            # The client starts over from REST, so the next position is absolute
+            self.last_position = None
+            return {"t": "y", "s": seq, "r": 1}
+        return {"t": "y", "s": seq}
+
+    def encode(self, frame):
+        return json.dumps(frame, separators=(",", ":"))
+
+
+class MsgpackEncoder(CompactEncoder):
+    """Compact frames as msgpack binary messages."""
+    subprotocol = SUBPROTOCOL_MSGPACK
+    binary = True
+
+    def encode(self, frame):
+        return msgpack.packb(frame)
+
+
+ENCODERS = {encoder.subprotocol: encoder for encoder in (CompactEncoder, MsgpackEncoder)}
+
+
+def negotiate(subprotocols):
+    """The encoder for the first supported subprotocol the client offered."""
+    for subprotocol in subprotocols or ():
+        if subprotocol in ENCODERS:
+            return ENCODERS[subprotocol]()
+    return VerboseEncoder()
+
+
+def decode(text_data=None, bytes_data=None):
+    """A client frame as a dict: JSON text or msgpack binary. None if malformed."""
+    try:
+        frame = msgpack.unpackb(bytes_data) if bytes_data is not None else json.loads(text_data or "")
+    except (ValueError, TypeError):
+        return None
+    return frame if isinstance(frame, dict) else None
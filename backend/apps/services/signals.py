@@ -1,7 +1,7 @@
 """
 Signals for ServiceRequest model to send notifications
 """
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from apps.services.models import ServiceRequest, ChatMessage
 from apps.users.models import Notification, CustomUser
@@ -11,13 +11,33 @@ from apps.services.utils.email_utils import (
     send_service_completed_email
 )
 from apps.services.utils.sms_utils import sms_service
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from apps.services.dispatch_logic import release_provider
+from apps.services import outbox
+from apps.services.services import tracking_stream
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def notify_new_request(service_request):
+    """
+    Creates the booker's and every admin's in-app notification for a new
+    request in one INSERT, so a booking costs the same whatever the size of
+    the admin team.
+    """
+    notifications = [Notification(
+        user=service_request.booker,
+        title="Service Requested",
+        message=f"Your request for {service_request.service_type} has been received and is being processed."
+    )]
+    admin_message = f"New {service_request.service_type} request from {service_request.booker.username}."
+    notifications.extend(
+        Notification(user_id=admin_id, title="New Service Request", message=admin_message)
+        for admin_id in CustomUser.objects.filter(is_superuser=True).values_list('id', flat=True)
+    )
+    return Notification.objects.bulk_create(notifications, batch_size=500)
+
+
 @receiver(post_save, sender=ServiceRequest)
 def service_request_notifications(sender, instance, created, **kwargs):
     """Send notifications when service request is created or updated"""
@@ -27,102 +47,86 @@ def service_request_notifications(sender, instance, created, **kwargs):
         if created:
             logger.info(f"Sending notifications for new request #{instance.id}")
             
-            # Send email
-            send_service_request_email(instance.booker, instance)
+            # Queue email and SMS; the outbox relay delivers them after commit
+            send_service_request_email(instance.booker, instance, send=outbox.email_sender("service_request_created"))
+            sms_service.send_service_request_sms(instance.booker, instance, send=outbox.sms_sender("service_request_created"))
             
-            # Send SMS
-            sms_service.send_service_request_sms(instance.booker, instance)
+            # In-app notifications for the booker and all admins
+            notify_new_request(instance)
             
-            # Create in-app notification for the booker
-            Notification.objects.create(
-                user=instance.booker,
-                title="Service Requested",
-                message=f"Your request for {instance.service_type} has been received and is being processed."
-            )
-            
-            # Create notifications for all Admins
-            admin_users = CustomUser.objects.filter(is_superuser=True)
-            for admin in admin_users:
+        # Service request updated: notify once per transition, judged against
+        # the values this instance was loaded with (no re-read)
+        else:
+            changes = instance.tracked_changes()
+
+            # Provider newly assigned (first dispatch or re-dispatch to someone else)
+            if instance.provider_id and instance.status == 'DISPATCHED' and (
+                'status' in changes or 'provider_id' in changes
+            ):
+                logger.info(f"Sending provider assigned notifications for request #{instance.id}")
+                
+                # Queue email and SMS
+                send_provider_assigned_email(
+                    instance.booker, instance, instance.provider, send=outbox.email_sender("provider_assigned")
+                )
+                sms_service.send_provider_assigned_sms(
+                    instance.booker, instance, instance.provider, send=outbox.sms_sender("provider_assigned")
+                )
+                
+                # Create in-app notification for booker
                 Notification.objects.create(
-                    user=admin,
-                    title="New Service Request",
-                    message=f"New {instance.service_type} request from {instance.booker.username}."
+                    user=instance.booker,
+                    title="Provider Dispatched",
+                    message=f"Provider {instance.provider.username} is en-route to your location."
                 )
             
-        # Service request updated
-        else:
-            # Check if provider was just assigned
-            if instance.provider and instance.status == 'DISPATCHED':
-                # Check if this is a new assignment (not already notified)
-                old_instance = ServiceRequest.objects.filter(id=instance.id).first()
-                if old_instance and not hasattr(instance, '_provider_notified'):
-                    logger.info(f"Sending provider assigned notifications for request #{instance.id}")
-                    
-                    # Send email
-                    send_provider_assigned_email(instance.booker, instance, instance.provider)
-                    
-                    # Send SMS
-                    sms_service.send_provider_assigned_sms(instance.booker, instance, instance.provider)
-                    
-                    # Mark as notified
-                    instance._provider_notified = True
-                    
-                    # Create in-app notification for booker
-                    Notification.objects.create(
-                        user=instance.booker,
-                        title="Provider Dispatched",
-                        message=f"Provider {instance.provider.username} is en-route to your location."
-                    )
-            
-            # Check if service was completed
-            if instance.status == 'COMPLETED':
-                if not hasattr(instance, '_completed_notified'):
-                    logger.info(f"Sending completion notifications for request #{instance.id}")
-                    
-                    # Send email
-                    send_service_completed_email(instance.booker, instance)
-                    
-                    # Send SMS
-                    sms_service.send_service_completed_sms(instance.booker, instance)
-                    
-                    # Mark as notified
-                    instance._completed_notified = True
-                    
-                    # Create in-app notification for booker
-                    Notification.objects.create(
-                        user=instance.booker,
-                        title="Service Completed",
-                        message=f"Your {instance.service_type} service is complete. Please rate the provider."
-                    )
+            # Service just completed
+            if instance.status == 'COMPLETED' and 'status' in changes:
+                logger.info(f"Sending completion notifications for request #{instance.id}")
+                
+                # Queue email and SMS
+                send_service_completed_email(instance.booker, instance, send=outbox.email_sender("service_completed"))
+                sms_service.send_service_completed_sms(instance.booker, instance, send=outbox.sms_sender("service_completed"))
+                
+                # Create in-app notification for booker
+                Notification.objects.create(
+                    user=instance.booker,
+                    title="Service Completed",
+                    message=f"Your {instance.service_type} service is complete. Please rate the provider."
+                )
                     
     except Exception as e:
         logger.error(f"Notification error for request #{instance.id}: {str(e)}")
         # Don't raise exception - notifications shouldn't break the flow
 
+@receiver(post_save, sender=ServiceRequest)
+def release_provider_on_close(sender, instance, created, **kwargs):
+    """Frees the assigned provider for dispatch once their job is closed"""
+    if instance.provider_id and instance.status in ('COMPLETED', 'CANCELLED') and (
+        created or 'status' in instance.tracked_changes()
+    ):
+        release_provider(instance.provider_id)
+
+
 @receiver(post_save, sender=ChatMessage)
 def chat_message_notifications(sender, instance, created, **kwargs):
     """Send real-time updates when a new chat message is created"""
     if created:
         try:
-            channel_layer = get_channel_layer()
-            room_group_name = f"service_{instance.request.id}"
-            
-            async_to_sync(channel_layer.group_send)(
-                room_group_name,
-                {
-                    "type": "status_update",  # Using existing type from tracking consumer
-                    "status": "CHAT_MESSAGE",
-                    "message": "New message received",
-                    "data": {
-                        "id": instance.id,
-                        "sender": instance.sender.username,
-                        "message": instance.message,
-                        "image": instance.image.url if instance.image else None,
-                        "created_at": instance.created_at.isoformat(),
-                    }
+            # Numbered and buffered so reconnecting clients can catch up
+            tracking_stream.publish(instance.request_id, {
+                "type": "status_update",  # Using existing type from tracking consumer
+                "status": "CHAT_MESSAGE",
+                "message": "New message received",
+                "data": {
+                    "id": instance.id,
+                    "sender": instance.sender.username,
+                    "message": instance.message,
+                    "image": instance.image.url if instance.image else None,
+                    "created_at": instance.created_at.isoformat(),
                 }
-            )
-            
+            })
+
             # Create in-app notification for the recipient (the one who didn't send the message)
             recipient = instance.request.provider if instance.sender == instance.request.booker else instance.request.booker
             if recipient:
@@ -1,9 +1,28 @@
+import logging
+import uuid
+from collections import defaultdict
+
 from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from apps.services.models import UserSubscription, Vehicle, ServiceRequest
 from apps.services.services.sms import SMSService
-from apps.services.dispatch_logic import trigger_dispatch
+from apps.services.dispatch_logic import escalation_radius_km, finalize_dispatch
+from apps.services.batch_dispatch import batch_assign, dispatch_pending_batch
+from apps.services.services.live_location import get_live_location_store
+from apps.users.models import ServiceProvider
+from apps.common.geo import encode_geohash
 from datetime import timedelta
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+ESCALATION_SWEEP_LOCK = "escalation:sweep:lock"
+
+# How long a swept request is hidden from later sweeps while its chunk runs
+ESCALATION_LEASE_SECONDS = 5 * 60
+
 
 @shared_task
 def check_subscription_expiry():
@@ -60,49 +79,195 @@ def auto_renew_subscriptions():
 def send_compliance_reminders():
     """
     Periodic task to remind users about Insurance and PUC expiration.
-    Critical for the Indian market compliance.
+    Critical for the Indian market compliance. Reminders are collected
+    first and handed to the SMS transport in one bulk send.
     """
-    sms_service = SMSService()
     reminder_days = [7, 3, 1]  # Remind 7, 3, and 1 day before
-    count = 0
     now_date = timezone.now().date()
+    reminders = []
     
     for days in reminder_days:
         target_date = now_date + timedelta(days=days)
         
         # Check Insurance
-        vehicles_ins = Vehicle.objects.filter(insurance_expiry=target_date)
+        vehicles_ins = Vehicle.objects.filter(insurance_expiry=target_date).select_related('owner')
         for vehicle in vehicles_ins:
             msg = f"Reminder: Insurance for your vehicle {vehicle.license_plate} expires in {days} days. Renew now via Vehic-Aid."
-            sms_service.send_sms(vehicle.owner.phone_number, msg)
-            count += 1
+            reminders.append((vehicle.owner.phone_number, msg))
             
         # Check PUC
-        vehicles_puc = Vehicle.objects.filter(puc_expiry=target_date)
+        vehicles_puc = Vehicle.objects.filter(puc_expiry=target_date).select_related('owner')
         for vehicle in vehicles_puc:
             msg = f"Reminder: PUC (Pollution Check) for {vehicle.license_plate} expires in {days} days. Stay compliant!"
-            sms_service.send_sms(vehicle.owner.phone_number, msg)
-            count += 1
-            
-    return f"Sent {count} compliance reminders."
+            reminders.append((vehicle.owner.phone_number, msg))
+    
+    results = SMSService().send_many(reminders)
+    sent = sum(1 for result in results if result["status"] == "SENT")
+    return f"Sent {sent} of {len(reminders)} compliance reminders."
 
 @shared_task
 def auto_escalate_stuck_requests():
     """
-    Automates the escalation of service requests that are stuck in 'DISPATCHED' 
-    status for more than 15 minutes without progress.
+    Sweeps service requests stuck in 'DISPATCHED' whose escalation is due
+    (see ServiceRequest.next_escalation_at) and fans them out to workers in
+    bounded chunks. Only due rows are read, via the (status,
+    next_escalation_at) index, and each row is leased before fan-out so
+    overlapping or retried runs never escalate it twice.
+    """
+    if not cache.add(ESCALATION_SWEEP_LOCK, "1", timeout=ESCALATION_LEASE_SECONDS):
+        return "Escalation sweep already running."
+
+    try:
+        now = timezone.now()
+        limit = getattr(settings, "ESCALATION_SWEEP_LIMIT", 2000)
+        due_ids = list(
+            ServiceRequest.objects.filter(status='DISPATCHED', next_escalation_at__lte=now)
+            .order_by('next_escalation_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not due_ids:
+            return "Escalated 0 stuck requests."
+
+        # Lease: move the watermark forward so later sweeps skip these rows
+        # while their chunk is queued; a lost chunk is picked up again afterwards
+        ServiceRequest.objects.filter(pk__in=due_ids).update(
+            next_escalation_at=now + timedelta(seconds=ESCALATION_LEASE_SECONDS)
+        )
+
+        sweep_id = uuid.uuid4().hex
+        chunk_size = getattr(settings, "ESCALATION_CHUNK_SIZE", 100)
+        chunks = [due_ids[i:i + chunk_size] for i in range(0, len(due_ids), chunk_size)]
+        for index, chunk in enumerate(chunks):
+            escalate_stuck_chunk.delay(chunk, f"{sweep_id}:{index}")
+    finally:
+        cache.delete(ESCALATION_SWEEP_LOCK)
+
+    return f"Queued {len(due_ids)} stuck requests in {len(chunks)} chunks."
+
+
+@shared_task
+def escalate_stuck_chunk(request_ids, idempotency_key):
+    """
+    Re-dispatches one chunk of stuck requests. Requests are re-matched
+    jointly, grouped by attempt count so each group searches a radius that
+    widens with every attempt. Requests that stay unassigned count the
+    attempt and back off exponentially until DISPATCH_MAX_ATTEMPTS.
     """
-    timeout = timezone.now() - timedelta(minutes=15)
-    stuck_requests = ServiceRequest.objects.filter(
-        status='DISPATCHED',
-        created_at__lt=timeout
+    # A redelivered chunk must not escalate its requests a second time
+    if not cache.add(f"escalation:chunk:{idempotency_key}", "1", timeout=24 * 60 * 60):
+        return "Chunk already processed."
+
+    stuck = list(
+        ServiceRequest.objects.filter(pk__in=request_ids, status='DISPATCHED').select_related("provider")
     )
-    
-    count = 0
-    for req in stuck_requests:
-        # Re-trigger dispatch but maybe with higher priority or different logic
-        # For now, we just re-run standard dispatch which might pick a different provider
-        trigger_dispatch(req)
-        count += 1
-        
-    return f"Escalated {count} stuck requests."
+    attempts_before = {r.pk: r.dispatch_attempts for r in stuck}
+
+    by_attempts = defaultdict(list)
+    for service_request in stuck:
+        by_attempts[service_request.dispatch_attempts].append(service_request)
+
+    # Their current providers are on the job, so a different provider is chosen
+    reassigned = 0
+    for attempts, group in by_attempts.items():
+        reassigned += batch_assign(group, radius_km=escalation_radius_km(attempts))["assigned"]
+
+    # assign_provider already rescheduled the reassigned ones
+    not_moved = [r for r in stuck if r.dispatch_attempts == attempts_before[r.pk]]
+    now = timezone.now()
+    for service_request in not_moved:
+        service_request.dispatch_attempts += 1
+        service_request.schedule_escalation(now)
+        if service_request.next_escalation_at is None:
+            logger.warning(
+                f"Request {service_request.id} still unserved after "
+                f"{service_request.dispatch_attempts} dispatch attempts; leaving it to the helpline."
+            )
+    ServiceRequest.objects.bulk_update(not_moved, ["dispatch_attempts", "next_escalation_at"])
+
+    return f"Escalated {reassigned} of {len(stuck)} stuck requests."
+
+
+@shared_task
+def flush_provider_locations(batch_size=1000):
+    """
+    Persists the latest live position of every provider that moved since the
+    last run. Many pings per provider collapse into one row update, and the
+    whole batch is written with a single bulk UPDATE.
+    """
+    store = get_live_location_store()
+    positions = store.pop_dirty(limit=batch_size)
+    if not positions:
+        return "Flushed 0 provider locations."
+
+    providers = []
+    for provider_id, (lat, lng) in positions.items():
+        # bulk_update skips save(), so the geohash cell is refreshed here
+        providers.append(ServiceProvider(
+            user_id=provider_id,
+            latitude=Decimal(f"{lat:.8f}"),
+            longitude=Decimal(f"{lng:.8f}"),
+            geo_cell=encode_geohash(lat, lng),
+        ))
+    ServiceProvider.objects.bulk_update(providers, ["latitude", "longitude", "geo_cell"])
+
+    return f"Flushed {len(providers)} provider locations."
+
+
+@shared_task
+def finalize_dispatch_task(request_id, provider_id, candidate_ids=None):
+    """
+    Quotes and notifies for a committed dispatch claim. Runs outside the
+    request transaction so slow Google/FCM calls never hold row locks.
+    """
+    result = finalize_dispatch(request_id, provider_id, candidate_ids)
+    if "total_amount" in result:
+        result["total_amount"] = str(result["total_amount"])
+    return result
+
+
+@shared_task
+def batch_dispatch_pending():
+    """
+    Matches every request waiting in PENDING_DISPATCH to providers in one
+    optimised assignment (see apps.services.batch_dispatch).
+    """
+    stats = dispatch_pending_batch()
+    if stats.get("status") == "DISABLED":
+        return "Batch dispatch mode is off."
+    if stats.get("status") == "LOCKED":
+        return "Batch dispatch already running."
+    return f"Assigned {stats['assigned']} of {stats['requests']} pending requests."
+
+
+@shared_task
+def relay_outbox(max_batches=10):
+    """
+    Delivers pending outbox messages (email, SMS) in batches. Kicked when
+    messages commit and run periodically to pick up retries and leftovers.
+    """
+    from apps.services.outbox import relay_batch
+
+    totals = defaultdict(int)
+    batch_size = getattr(settings, "OUTBOX_BATCH_SIZE", 200)
+    for _ in range(max_batches):
+        summary = relay_batch(batch_size)
+        for key, value in summary.items():
+            totals[key] += value
+        if summary["claimed"] < batch_size:
+            break
+    if totals["claimed"]:
+        logger.info(
+            f"Outbox relay: {totals['sent']} sent, {totals['retried']} to retry, {totals['dead']} dead-lettered."
+        )
+    return dict(totals)
+
+
+@shared_task
+def prune_outbox():
+    """Deletes delivered outbox messages past OUTBOX_RETENTION_DAYS; dead letters stay."""
+    from apps.services.models import OutboxMessage
+
+    cutoff = timezone.now() - timedelta(days=getattr(settings, "OUTBOX_RETENTION_DAYS", 7))
+    deleted, _ = OutboxMessage.objects.filter(status="SENT", sent_at__lt=cutoff).delete()
+    logger.info(f"Pruned {deleted} delivered outbox messages.")
+    return f"Pruned {deleted} outbox messages."
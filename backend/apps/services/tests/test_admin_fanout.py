@@ -0,0 +1,46 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.services.models import ServiceRequest
+from apps.services.signals import notify_new_request
+from apps.users.models import CustomUser, Notification
+
+
+@pytest.mark.django_db
+class TestAdminFanOut:
+
+    def make_admins(self, count, offset=0):
+        for i in range(offset, offset + count):
+            CustomUser.objects.create_user(username=f"fanout_admin{i}", email=f"fanout_admin{i}@example.com",
+                                           password="pass", is_superuser=True)
+
+    def test_new_request_notifies_booker_and_admins(self):
+        self.make_admins(3)
+        booker = CustomUser.objects.create_user(username="fanout_b1", email="fanout_b1@example.com", password="pass")
+        with patch("apps.services.outbox._kick_relay"):
+            ServiceRequest.objects.create(
+                booker=booker, service_type="TOWING", latitude=Decimal("12.9716"), longitude=Decimal("77.5946")
+            )
+
+        assert list(Notification.objects.filter(user=booker).values_list("title", flat=True)) == ["Service Requested"]
+        admin_notes = Notification.objects.filter(user__is_superuser=True)
+        assert admin_notes.count() == 3
+        assert {n.message for n in admin_notes} == {"New TOWING request from fanout_b1."}
+
+    def test_writes_do_not_grow_with_admin_team(self):
+        booker = CustomUser.objects.create_user(username="fanout_b2", email="fanout_b2@example.com", password="pass")
+        service_request = ServiceRequest(booker=booker, service_type="TOWING")
+
+        self.make_admins(2)
+        with CaptureQueriesContext(connection) as small:
+            notify_new_request(service_request)
+        self.make_admins(20, offset=2)
+        with CaptureQueriesContext(connection) as large:
+            notify_new_request(service_request)
+
+        assert len(small) == len(large) == 2
+        assert Notification.objects.filter(title="New Service Request").count() == 2 + 22
@@ -0,0 +1,148 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+from django.utils import timezone
+
+from apps.services.batch_dispatch import (
+    INFEASIBLE,
+    batch_assign,
+    build_cost_matrix,
+    dispatch_pending_batch,
+    solve_assignment,
+)
+from apps.services.dispatch_logic import claim_request, trigger_dispatch
+from apps.services.models import ServiceRequest
+from apps.users.capabilities import capability_codes
+from apps.users.models import CustomUser, ServiceProvider
+
+
+def fake_provider(lat, lng, rating=0, service_types=None):
+    return SimpleNamespace(
+        position=(lat, lng), average_rating=Decimal(rating), capability_codes=capability_codes(service_types)
+    )
+
+
+def fake_request(lat, lng, service_type="TOWING", priority="MEDIUM"):
+    return SimpleNamespace(latitude=lat, longitude=lng, service_type=service_type, priority=priority)
+
+
+class TestAssignmentSolver:
+
+    def test_beats_greedy_total_distance(self):
+        # Greedy gives request 0 the provider request 1 needs, stranding request 1
+        cost = np.array([[1.0, 2.0], [1.5, 10.0]])
+        assert sorted(solve_assignment(cost)) == [(0, 1), (1, 0)]
+
+    def test_infeasible_pairs_are_never_assigned(self):
+        cost = np.array([[INFEASIBLE, INFEASIBLE], [3.0, 4.0]])
+        assert solve_assignment(cost) == [(1, 0)]
+
+    def test_cost_matrix_marks_incompatible_and_out_of_range(self):
+        providers = [
+            fake_provider(12.9720, 77.5950, service_types=["Towing"]),
+            fake_provider(12.9720, 77.5950, service_types=["Battery jump"]),
+            fake_provider(28.6139, 77.2090),
+        ]
+        cost, _ = build_cost_matrix([fake_request(12.9716, 77.5946)], providers, radius_km=20)
+        assert cost[0, 0] < INFEASIBLE
+        assert cost[0, 1] == INFEASIBLE
+        assert cost[0, 2] == INFEASIBLE
+
+
+@pytest.mark.django_db
+class TestBatchAssign:
+
+
+    def test_assigns_distinct_providers(self, provider_factory):
+        for i in range(3):
+            provider_factory(f"batch_p{i}", Decimal("12.9716") + Decimal(i) / 100, Decimal("77.5946"))
+        booker = CustomUser.objects.create_user(username="batch_b", email="batch_b@example.com", password="pass")
+        requests = [
+            ServiceRequest.objects.create(
+                booker=booker, service_type="TOWING",
+                latitude=Decimal("12.9716") + Decimal(i) / 100, longitude=Decimal("77.5946"),
+            )
+            for i in range(4)
+        ]
+
+        with patch("apps.services.dispatch_logic._enqueue_finalize_dispatch"):
+            stats = batch_assign(requests)
+
+        assert stats["assigned"] == 3
+        dispatched = ServiceRequest.objects.filter(status="DISPATCHED")
+        assert dispatched.count() == 3
+        assert len(set(dispatched.values_list("provider_id", flat=True))) == 3
+        assert ServiceProvider.objects.filter(is_on_job=True).count() == 3
+
+    def _request(self, booker, **fields):
+        return ServiceRequest.objects.create(
+            booker=booker, service_type="TOWING", latitude=Decimal("12.9716"), longitude=Decimal("77.5946"), **fields
+        )
+
+    def test_batch_mode_queues_requests(self, settings):
+        settings.DISPATCH_BATCH_MODE = True
+        booker = CustomUser.objects.create_user(username="batch_q", email="batch_q@example.com", password="pass")
+        request = self._request(booker)
+        assert trigger_dispatch(request)["status"] == "QUEUED"
+        request.refresh_from_db()
+        assert request.batch_queued_at is not None
+
+    def test_windows_do_nothing_outside_batch_mode(self, settings, provider_factory):
+        settings.DISPATCH_BATCH_MODE = False
+        provider_factory("batch_off_p", Decimal("12.9716"), Decimal("77.5946"))
+        booker = CustomUser.objects.create_user(username="batch_off", email="batch_off@example.com", password="pass")
+        self._request(booker, batch_queued_at=timezone.now() - timedelta(minutes=1))
+
+        assert dispatch_pending_batch() == {"status": "DISABLED"}
+        assert not ServiceRequest.objects.filter(status="DISPATCHED").exists()
+
+    def test_windows_take_only_queued_requests_past_the_window(self, settings, provider_factory):
+        settings.DISPATCH_BATCH_MODE = True
+        settings.DISPATCH_BATCH_WINDOW_SECONDS = 5
+        for i in range(3):
+            provider_factory(f"batch_w_p{i}", Decimal("12.9716"), Decimal("77.5946"))
+        booker = CustomUser.objects.create_user(username="batch_w", email="batch_w@example.com", password="pass")
+        due = self._request(booker, batch_queued_at=timezone.now() - timedelta(seconds=10))
+        fresh = self._request(booker, batch_queued_at=timezone.now())
+        # On the job board only: never queued for batching
+        manual = self._request(booker)
+
+        with patch("apps.services.dispatch_logic._enqueue_finalize_dispatch"):
+            stats = dispatch_pending_batch()
+
+        assert (stats["requests"], stats["assigned"]) == (1, 1)
+        assert list(ServiceRequest.objects.filter(status="DISPATCHED").values_list("pk", flat=True)) == [due.pk]
+        fresh.refresh_from_db()
+        manual.refresh_from_db()
+        assert (fresh.status, manual.status) == ("PENDING_DISPATCH", "PENDING_DISPATCH")
+        assert ServiceProvider.objects.filter(is_on_job=True).count() == 1
+
+    def test_requests_taken_elsewhere_are_skipped(self, settings, provider_factory):
+        settings.DISPATCH_BATCH_MODE = True
+        provider = provider_factory("batch_s_p", Decimal("12.9716"), Decimal("77.5946"))
+        booker = CustomUser.objects.create_user(username="batch_s", email="batch_s@example.com", password="pass")
+        request = self._request(booker, batch_queued_at=timezone.now() - timedelta(minutes=1))
+
+        # Another window (or the job board) claims it first
+        assert claim_request(request.pk)
+        assert not claim_request(request.pk)
+        # Even with a stale instance, the locked re-check refuses an assigned job
+        ServiceRequest.objects.filter(pk=request.pk).update(status="DISPATCHED", provider=booker)
+        with patch("apps.services.dispatch_logic._enqueue_finalize_dispatch"):
+            assert batch_assign([request])["assigned"] == 0
+        provider.refresh_from_db()
+        assert provider.is_on_job is False
+
+    def test_unmatched_requests_go_back_in_the_queue(self, settings):
+        settings.DISPATCH_BATCH_MODE = True
+        booker = CustomUser.objects.create_user(username="batch_u", email="batch_u@example.com", password="pass")
+        request = self._request(booker, batch_queued_at=timezone.now() - timedelta(minutes=1))
+
+        assert dispatch_pending_batch()["assigned"] == 0
+        request.refresh_from_db()
+        assert request.status == "PENDING_DISPATCH"
+        assert request.batch_queued_at is not None
@@ -0,0 +1,82 @@
+import pytest
+import threading
+from collections import Counter
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.db import connection
+
+from apps.services.dispatch_logic import claim_provider, trigger_dispatch
+from apps.services.models import ServiceRequest
+from apps.users.models import CustomUser, ServiceProvider
+
+
+def make_requests(count):
+    booker = CustomUser.objects.create_user(username="claim_booker", email="claim_booker@example.com", password="pass")
+    return [
+        ServiceRequest.objects.create(
+            booker=booker, service_type="TOWING", latitude=Decimal("12.9716"), longitude=Decimal("77.5946")
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProviderClaims:
+
+    def test_claim_is_compare_and_set(self, provider_factory):
+        provider = provider_factory("claim_p0", Decimal("12.9720"), Decimal("77.5950"))
+        assert claim_provider(provider.pk) is True
+        assert claim_provider(provider.pk) is False
+
+    def test_closing_job_releases_provider(self, provider_factory):
+        provider_factory("claim_p1", Decimal("12.9720"), Decimal("77.5950"))
+        service_request = make_requests(1)[0]
+
+        with patch("apps.services.dispatch_logic._enqueue_finalize_dispatch"):
+            result = trigger_dispatch(service_request)
+        provider = ServiceProvider.objects.get(pk=result["provider_id"])
+        assert provider.is_on_job
+
+        service_request.status = "CANCELLED"
+        service_request.save()
+        provider.refresh_from_db()
+        assert not provider.is_on_job
+
+    def test_concurrent_dispatches_never_share_a_provider(self, provider_factory):
+        providers = 12
+        for i in range(providers):
+            provider_factory(f"claim_p{i}", Decimal("12.9716") + Decimal(i) / 1000, Decimal("77.5946"))
+        requests = make_requests(providers + 4)
+
+        barrier = threading.Barrier(len(requests))
+        results = []
+        errors = []
+
+        def dispatch(service_request):
+            try:
+                barrier.wait()
+                results.append(trigger_dispatch(service_request))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with patch("apps.services.dispatch_logic._enqueue_finalize_dispatch"):
+            threads = [threading.Thread(target=dispatch, args=(r,)) for r in requests]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert errors == []
+        assigned = Counter(r["provider_id"] for r in results if r["status"] == "DISPATCHED")
+        assert len(assigned) == providers
+        assert max(assigned.values()) == 1
+        assert sum(r["status"] == "NO_PROVIDER" for r in results) == len(requests) - providers
+
+        # The database agrees: no provider holds two open requests
+        open_jobs = Counter(
+            ServiceRequest.objects.filter(status="DISPATCHED").values_list("provider_id", flat=True)
+        )
+        assert max(open_jobs.values()) == 1
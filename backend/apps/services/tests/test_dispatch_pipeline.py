@@ -0,0 +1,77 @@
+import pytest
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.db import connection
+
+from apps.services.dispatch_logic import PricingService, finalize_dispatch, generate_automated_quote, trigger_dispatch
+from apps.services.models import ServiceQuote, ServiceRequest
+from apps.users.models import CustomUser
+
+
+def make_request(username):
+    booker = CustomUser.objects.create_user(username=username, email=f"{username}@example.com", password="pass")
+    return ServiceRequest.objects.create(
+        booker=booker, service_type="TOWING", latitude=Decimal("12.9716"), longitude=Decimal("77.5946")
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+class TestStagedDispatch:
+
+    def test_quote_and_push_run_after_commit(self, provider_factory):
+        provider = provider_factory("stage_p1", Decimal("12.9720"), Decimal("77.5950"))
+        service_request = make_request("stage_b1")
+        in_transaction = []
+
+        def fake_push(**kwargs):
+            in_transaction.append(connection.in_atomic_block)
+            return True
+
+        with patch("apps.services.tasks.finalize_dispatch_task.delay",
+                   side_effect=lambda *args: finalize_dispatch(*args)), \
+                patch("apps.services.dispatch_logic.PushNotificationService.send_to_user",
+                      side_effect=fake_push):
+            result = trigger_dispatch(service_request)
+
+        assert result == {"status": "DISPATCHED", "provider_id": provider.pk}
+        assert in_transaction == [False]
+        assert ServiceQuote.objects.filter(request=service_request).count() == 1
+
+    def test_broker_failure_finishes_inline(self, provider_factory):
+        provider_factory("stage_p2", Decimal("12.9720"), Decimal("77.5950"))
+        service_request = make_request("stage_b2")
+
+        with patch("apps.services.tasks.finalize_dispatch_task.delay", side_effect=ConnectionError), \
+                patch("apps.services.dispatch_logic.PushNotificationService.send_to_user") as push:
+            trigger_dispatch(service_request)
+
+        assert push.call_count == 1
+        assert ServiceQuote.objects.filter(request=service_request).exists()
+
+    def test_finalize_skips_reassigned_request(self, provider_factory):
+        provider = provider_factory("stage_p3", Decimal("12.9720"), Decimal("77.5950"))
+        service_request = make_request("stage_b3")
+        service_request.status = "CANCELLED"
+        service_request.save()
+
+        with patch("apps.services.dispatch_logic.PushNotificationService.send_to_user") as push:
+            result = finalize_dispatch(service_request.id, provider.pk)
+
+        assert result["status"] == "STALE"
+        push.assert_not_called()
+        assert not ServiceQuote.objects.filter(request=service_request).exists()
+
+    def test_quote_without_a_provider_position_prices_from_the_request(self, provider_factory):
+        provider = provider_factory("stage_p4")
+        provider.latitude = provider.longitude = None
+        provider.save()
+        service_request = make_request("stage_b4")
+        service_request.provider = provider.user
+        service_request.save()
+
+        with patch.object(PricingService, "calculate_quote", wraps=PricingService().calculate_quote) as quote:
+            generate_automated_quote(service_request, provider)
+
+        assert quote.call_args.kwargs["provider_lat"] == service_request.latitude
+        assert ServiceQuote.objects.filter(request=service_request).exists()
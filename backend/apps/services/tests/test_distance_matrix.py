@@ -0,0 +1,128 @@
+import json
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from apps.common.geo import haversine_km
+from apps.services.services.distance_matrix import (
+    MAX_ELEMENTS,
+    DistanceMatrixClient,
+    RouteCache,
+    snap,
+)
+
+
+class FakeDistanceMatrixHandler(BaseHTTPRequestHandler):
+    """Answers like the Distance Matrix API: road distance is 1.3x Haversine at 30 km/h."""
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        origins = [tuple(map(float, p.split(","))) for p in query["origins"][0].split("|")]
+        destinations = [tuple(map(float, p.split(","))) for p in query["destinations"][0].split("|")]
+        self.server.calls.append((len(origins), len(destinations)))
+
+        rows = []
+        for origin in origins:
+            elements = []
+            for destination in destinations:
+                meters = haversine_km(*origin, *destination) * 1300
+                elements.append({
+                    "status": "OK",
+                    "distance": {"value": int(meters)},
+                    "duration": {"value": int(meters / 30000 * 3600)},
+                })
+            rows.append({"elements": elements})
+
+        body = json.dumps({"status": "OK", "rows": rows}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDistanceMatrixHandler)
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def matrix_client(fake_server):
+    host, port = fake_server.server_address
+    return DistanceMatrixClient("test-key", base_url=f"http://{host}:{port}/json")
+
+
+CUSTOMER = (12.9716, 77.5946)
+
+
+class TestDistanceMatrixClient:
+
+    def test_candidates_cost_one_round_trip(self, matrix_client, fake_server):
+        providers = [(12.97 + i * 0.01, 77.59 + i * 0.01) for i in range(5)]
+
+        routes = matrix_client.matrix(providers, [CUSTOMER])
+        assert fake_server.calls == [(5, 1)]
+        assert len(routes) == 5
+        assert all(route is not None for route in routes.values())
+
+        # Repeat pairs are served from the cache
+        km, minutes = matrix_client.route(providers[2], CUSTOMER)
+        assert fake_server.calls == [(5, 1)]
+        assert km == pytest.approx(haversine_km(*providers[2], *CUSTOMER) * 1.3, rel=1e-2)
+
+    def test_batches_respect_element_limit(self, matrix_client, fake_server):
+        origins = [(12.0 + i * 0.01, 77.0) for i in range(30)]
+        destinations = [(13.0 + i * 0.01, 78.0) for i in range(10)]
+
+        routes = matrix_client.matrix(origins, destinations)
+        assert len(routes) == 300
+        assert all(o * d <= MAX_ELEMENTS for o, d in fake_server.calls)
+        assert sum(o * d for o, d in fake_server.calls) == 300
+
+    def test_nearby_points_share_a_cache_entry(self, matrix_client, fake_server):
+        matrix_client.route((12.97161, 77.59461), CUSTOMER)
+        matrix_client.route((12.97162, 77.59459), CUSTOMER)
+        assert len(fake_server.calls) == 1
+
+    def test_unreachable_server_returns_none(self):
+        client = DistanceMatrixClient("test-key", base_url="http://127.0.0.1:9/json", timeout=(0.5, 0.5))
+        assert client.route((12.97, 77.59), CUSTOMER) is None
+        assert len(client.cache) == 0
+
+    def test_no_api_key_skips_network(self):
+        client = DistanceMatrixClient("", base_url="http://127.0.0.1:9/json")
+        assert client.route((12.97, 77.59), CUSTOMER) is None
+        assert client.requests_made == 0
+
+
+class TestRouteCache:
+
+    def test_lru_eviction(self):
+        cache = RouteCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+
+    def test_entries_expire(self):
+        cache = RouteCache(max_size=2, ttl=-1)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+
+def test_snap_rounds_to_grid():
+    assert snap(Decimal("12.971649"), 77.594651) == (12.9716, 77.5947)
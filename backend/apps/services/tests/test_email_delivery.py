@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+import pytest
+from django.core import mail
+from django.test import override_settings
+
+from apps.services import outbox
+from apps.services.models import OutboxMessage, ServiceRequest
+from apps.services.utils.email_utils import (
+    build_email, send_email_batch, send_provider_assigned_email, send_service_request_email,
+)
+from apps.services.utils.smtp_sink import SMTPSink
+from apps.users.models import CustomUser
+
+
+@pytest.fixture
+def smtp_sink():
+    with SMTPSink(refuse={"bounce@example.com"}) as sink:
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                               EMAIL_HOST=sink.host, EMAIL_PORT=sink.port, EMAIL_USE_TLS=False,
+                               EMAIL_USE_SSL=False, EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD=""):
+            yield sink
+
+
+@pytest.mark.django_db
+class TestEmailTemplates:
+
+    def test_request_email_renders_both_parts(self):
+        booker = CustomUser.objects.create_user(username="mail_b1", email="mail_b1@example.com", password="pass",
+                                                first_name="Asha", last_name="<Rao>")
+        service_request = ServiceRequest.objects.create(
+            booker=booker, service_type="FLAT_TIRE", latitude=Decimal("12.9716"), longitude=Decimal("77.5946")
+        )
+        sent = []
+        send_service_request_email(booker, service_request, send=lambda *args: sent.append(args))
+
+        subject, text, html, to = sent[0]
+        assert subject == f"Service Request #{service_request.id} - Confirmation"
+        assert to == ["mail_b1@example.com"]
+        assert "Dear Asha <Rao>," in text
+        assert "Service Type: Flat Tire Assistance" in text
+        # HTML escapes user input; the layout comes from the base template
+        assert "Dear Asha &lt;Rao&gt;," in html
+        assert "Your Trusted Roadside Assistance Partner" in html
+
+    def test_provider_email_names_provider(self):
+        booker = CustomUser.objects.create_user(username="mail_b2", email="mail_b2@example.com", password="pass")
+        provider = CustomUser.objects.create_user(username="mail_p2", email="mail_p2@example.com", password="pass",
+                                                  first_name="Ravi", last_name="Kumar")
+        service_request = ServiceRequest(id=42, booker=booker, service_type="TOWING")
+        sent = []
+        send_provider_assigned_email(booker, service_request, provider, send=lambda *args: sent.append(args))
+        assert "Provider: Ravi Kumar" in sent[0][1]
+        assert f"Provider ID: {provider.pk}" in sent[0][1]
+
+
+@pytest.mark.django_db
+class TestBatchedSMTP:
+
+    def test_batch_reuses_a_few_connections(self, smtp_sink):
+        emails = [build_email(f"Hi {i}", "Text", "<p>Html</p>", [f"user{i}@example.com"]) for i in range(10)]
+        errors = send_email_batch(emails, connections=2)
+        assert errors == [None] * 10
+        assert len(smtp_sink.messages) == 10
+        assert smtp_sink.connections == 2
+
+    def test_failed_message_does_not_sink_the_rest(self, smtp_sink):
+        emails = [build_email("Hi", "Text", "", [address])
+                  for address in ("a@example.com", "bounce@example.com", "c@example.com")]
+        errors = send_email_batch(emails, connections=1)
+        assert errors[0] is None and errors[2] is None
+        assert errors[1] is not None
+        assert len(smtp_sink.messages) == 2
+
+    def test_outbox_relays_over_smtp(self, smtp_sink):
+        for i in range(5):
+            outbox.enqueue_email(f"Hi {i}", "Text", "<p>Html</p>", [f"user{i}@example.com"])
+        outbox.enqueue_email("Bounce", "Text", "", ["bounce@example.com"])
+
+        with override_settings(EMAIL_CONNECTIONS=2):
+            summary = outbox.relay_batch()
+
+        assert (summary["sent"], summary["dead"]) == (5, 1)
+        assert len(smtp_sink.messages) == 5
+        assert OutboxMessage.objects.get(status="DEAD").payload["to"] == ["bounce@example.com"]
+        assert len(mail.outbox) == 0
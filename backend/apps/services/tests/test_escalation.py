@@ -0,0 +1,110 @@
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.utils import timezone
+
+from apps.services.dispatch_logic import escalation_radius_km, trigger_dispatch
+from apps.services.models import ServiceRequest
+from apps.services.tasks import auto_escalate_stuck_requests, escalate_stuck_chunk
+from apps.users.models import CustomUser
+
+
+def make_request(booker, **kwargs):
+    return ServiceRequest.objects.create(
+        booker=booker, service_type="TOWING", latitude=Decimal("12.9716"), longitude=Decimal("77.5946"), **kwargs
+    )
+
+
+@pytest.fixture
+def booker(db):
+    return CustomUser.objects.create_user(username="esc_booker", email="esc_booker@example.com", password="pass")
+
+
+@pytest.fixture(autouse=True)
+def no_finalize():
+    with patch("apps.services.dispatch_logic._enqueue_finalize_dispatch"):
+        yield
+
+
+@pytest.mark.django_db
+class TestEscalationSweeper:
+
+    def test_dispatch_sets_watermark(self, booker, provider_factory):
+        provider_factory("esc_p0")
+        service_request = make_request(booker)
+        trigger_dispatch(service_request)
+
+        service_request.refresh_from_db()
+        assert service_request.dispatch_attempts == 1
+        assert service_request.next_escalation_at - service_request.dispatched_at == timedelta(minutes=15)
+
+    def test_sweep_queues_only_due_rows_once(self, booker, provider_factory):
+        provider = provider_factory("esc_p1")
+        now = timezone.now()
+        due = make_request(booker, provider=provider.user, status="DISPATCHED", next_escalation_at=now - timedelta(minutes=1))
+        # Created long ago but dispatched recently: not due yet
+        make_request(booker, provider=provider.user, status="DISPATCHED",
+                     created_at=now - timedelta(hours=2), next_escalation_at=now + timedelta(minutes=10))
+
+        with patch("apps.services.tasks.escalate_stuck_chunk.delay") as delay:
+            auto_escalate_stuck_requests()
+            auto_escalate_stuck_requests()
+
+        assert delay.call_count == 1
+        assert delay.call_args.args[0] == [due.pk]
+
+    def test_sweep_fans_out_bounded_chunks(self, booker, settings, provider_factory):
+        settings.ESCALATION_CHUNK_SIZE = 2
+        provider = provider_factory("esc_p2")
+        past = timezone.now() - timedelta(minutes=1)
+        for _ in range(5):
+            make_request(booker, provider=provider.user, status="DISPATCHED", next_escalation_at=past)
+
+        with patch("apps.services.tasks.escalate_stuck_chunk.delay") as delay:
+            auto_escalate_stuck_requests()
+
+        assert [len(call.args[0]) for call in delay.call_args_list] == [2, 2, 1]
+        assert len({call.args[1] for call in delay.call_args_list}) == 3
+
+    def test_chunk_moves_request_to_another_provider(self, booker, provider_factory):
+        stuck_provider = provider_factory("esc_stuck")
+        stuck_provider.is_on_job = True
+        stuck_provider.save()
+        fresh = provider_factory("esc_fresh", lat="12.9900")
+        service_request = make_request(
+            booker, provider=stuck_provider.user, status="DISPATCHED", dispatch_attempts=1,
+            next_escalation_at=timezone.now(),
+        )
+
+        escalate_stuck_chunk([service_request.pk], "test-move:0")
+        assert escalate_stuck_chunk([service_request.pk], "test-move:0") == "Chunk already processed."
+
+        service_request.refresh_from_db()
+        stuck_provider.refresh_from_db()
+        assert service_request.provider_id == fresh.pk
+        assert service_request.dispatch_attempts == 2
+        assert not stuck_provider.is_on_job
+
+    def test_unserved_requests_back_off_then_give_up(self, booker, settings):
+        settings.DISPATCH_MAX_ATTEMPTS = 3
+        service_request = make_request(booker, status="DISPATCHED", dispatch_attempts=1, next_escalation_at=timezone.now())
+
+        escalate_stuck_chunk([service_request.pk], "test-backoff:0")
+        service_request.refresh_from_db()
+        assert service_request.dispatch_attempts == 2
+        delay = service_request.next_escalation_at - timezone.now()
+        assert timedelta(minutes=29) < delay <= timedelta(minutes=30)
+
+        escalate_stuck_chunk([service_request.pk], "test-backoff:1")
+        service_request.refresh_from_db()
+        assert service_request.dispatch_attempts == 3
+        assert service_request.next_escalation_at is None
+
+    def test_radius_widens_per_attempt(self, settings):
+        settings.DISPATCH_SEARCH_RADIUS_KM = 20
+        settings.DISPATCH_MAX_SEARCH_RADIUS_KM = 60
+        assert escalation_radius_km(1) == 30
+        assert escalation_radius_km(2) == 45
+        assert escalation_radius_km(5) == 60
@@ -0,0 +1,50 @@
+import pytest
+from decimal import Decimal
+from types import SimpleNamespace
+
+from apps.common.geo import covering_cells, encode_geohash
+from apps.services.dispatch_logic import find_nearest_available_provider, nearby_providers
+
+
+class TestGeohash:
+
+    def test_encode_known_value(self):
+        assert encode_geohash(42.605, -5.603, precision=5) == "ezs42"
+
+    def test_covering_cells_contain_origin(self):
+        cells = covering_cells(12.9716, 77.5946, 10)
+        origin = encode_geohash(12.9716, 77.5946)
+        assert any(origin.startswith(cell) for cell in cells)
+        assert len(cells) <= 16
+
+
+@pytest.mark.django_db
+class TestProviderGridIndex:
+
+    def test_geo_cell_follows_location(self, provider_factory):
+        provider = provider_factory("grid_p1", Decimal("12.9716"), Decimal("77.5946"))
+        assert provider.geo_cell == encode_geohash(12.9716, 77.5946)
+
+        provider.latitude = Decimal("28.6139")
+        provider.longitude = Decimal("77.2090")
+        provider.save(update_fields=["latitude", "longitude"])
+        provider.refresh_from_db()
+        assert provider.geo_cell == encode_geohash(28.6139, 77.2090)
+
+    def test_nearby_providers_sorted_and_bounded(self, provider_factory):
+        provider_factory("grid_near", Decimal("12.9720"), Decimal("77.5950"))
+        provider_factory("grid_mid", Decimal("12.9900"), Decimal("77.6100"))
+        provider_factory("grid_far", Decimal("28.6139"), Decimal("77.2090"))  # Delhi
+
+        found = nearby_providers(12.9716, 77.5946, radius_km=10, limit=5)
+        usernames = [p.user.username for p in found]
+        assert usernames == ["grid_near", "grid_mid"]
+        assert found[0].distance_km < found[1].distance_km
+
+    def test_dispatch_skips_unavailable_providers(self, provider_factory):
+        provider_factory("grid_offline", Decimal("12.9717"), Decimal("77.5947"), is_available=False)
+        online = provider_factory("grid_online", Decimal("12.9800"), Decimal("77.6000"))
+
+        request = SimpleNamespace(latitude=Decimal("12.9716"), longitude=Decimal("77.5946"), service_type="TOWING")
+        candidates = find_nearest_available_provider(request)
+        assert [p.pk for p in candidates] == [online.pk]
@@ -0,0 +1,68 @@
+import pytest
+from decimal import Decimal
+
+import numpy as np
+
+from apps.common.geo import bounding_box, haversine_km, haversine_many, nearest_within
+from apps.services.dispatch_logic import calculate_distance
+from apps.services.services.pricing import PricingService
+
+
+BANGALORE = (12.9716, 77.5946)
+DELHI = (28.6139, 77.2090)
+
+
+class TestGeoKernel:
+
+    def test_scalar_distance(self):
+        # Bangalore -> Delhi is roughly 1740 km as the crow flies
+        assert haversine_km(*BANGALORE, *DELHI) == pytest.approx(1740, rel=0.01)
+        assert haversine_km(*BANGALORE, *BANGALORE) == 0
+
+    def test_batched_matches_scalar(self):
+        lats = [12.9, 13.1, 28.6139, 19.0760]
+        lons = [77.5, 77.7, 77.2090, 72.8777]
+        batched = haversine_many(*BANGALORE, lats, lons)
+        expected = [haversine_km(*BANGALORE, la, lo) for la, lo in zip(lats, lons)]
+        assert np.allclose(batched, expected)
+
+    def test_batched_accepts_decimals(self):
+        result = haversine_many(Decimal("12.9716"), Decimal("77.5946"), [Decimal("12.9716")], [Decimal("77.6046")])
+        assert result[0] == pytest.approx(1.08, abs=0.01)
+
+    def test_bounding_box_encloses_radius(self):
+        lat_min, lat_max, lon_min, lon_max = bounding_box(*BANGALORE, 10)
+        assert haversine_km(lat_min, BANGALORE[1], *BANGALORE) == pytest.approx(10, rel=0.01)
+        assert lon_min < BANGALORE[1] < lon_max
+
+    def test_nearest_within_filters_and_sorts(self):
+        lats = [12.99, 28.6139, 12.975]
+        lons = [77.61, 77.2090, 77.595]
+        indices, distances = nearest_within(*BANGALORE, lats, lons, radius_km=20)
+        assert list(indices) == [2, 0]
+        assert distances[0] < distances[1]
+
+        indices, _ = nearest_within(*BANGALORE, lats, lons, radius_km=20, limit=1)
+        assert list(indices) == [2]
+
+    def test_call_sites_share_kernel(self):
+        assert calculate_distance(*BANGALORE, *DELHI) == haversine_km(*BANGALORE, *DELHI)
+        straight = PricingService()._calculate_straight_line_distance(*BANGALORE, *DELHI)
+        assert isinstance(straight, Decimal)
+        assert float(straight) == pytest.approx(haversine_km(*BANGALORE, *DELHI))
+
+
+@pytest.mark.django_db
+def test_nearby_stores_uses_radius(client):
+    from apps.services.models import SparePartStore
+    from apps.users.models import CustomUser
+
+    user = CustomUser.objects.create_user(username="geo_store_user", email="store@example.com", password="pass")
+    client.force_authenticate(user=user)
+    SparePartStore.objects.create(name="Near", location_name="MG Road", latitude=Decimal("12.9784"), longitude=Decimal("77.6408"))
+    SparePartStore.objects.create(name="Nearest", location_name="MG Road", latitude=Decimal("12.9716"), longitude=Decimal("77.5950"))
+    SparePartStore.objects.create(name="Far", location_name="Delhi", latitude=Decimal("28.6139"), longitude=Decimal("77.2090"))
+
+    response = client.get("/api/v1/services/spare-parts/nearby/", {"lat": BANGALORE[0], "lng": BANGALORE[1]})
+    assert response.status_code == 200
+    assert [store["name"] for store in response.data] == ["Nearest", "Near"]
@@ -0,0 +1,109 @@
+import pytest
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from redis.exceptions import ResponseError
+
+from apps.common.geo import encode_geohash
+from apps.services.dispatch_logic import find_nearest_available_provider
+from apps.services.services.live_location import (
+    InMemoryGeoClient,
+    LiveLocationStore,
+    get_live_location_store,
+)
+from apps.services.tasks import flush_provider_locations
+
+
+@pytest.fixture
+def live_store():
+    store = get_live_location_store()
+    store.client.flushall()
+    yield store
+    store.client.flushall()
+
+
+class TestLiveLocationStore:
+
+    def test_search_returns_nearest_first(self):
+        store = LiveLocationStore(InMemoryGeoClient())
+        store.update(1, 12.9800, 77.6000)
+        store.update(2, 12.9720, 77.5950)
+        store.update(3, 28.6139, 77.2090)
+
+        found = store.search(12.9716, 77.5946, radius_km=10)
+        assert [pid for pid, _ in found] == [2, 1]
+        assert found[0][1] < found[1][1]
+
+    def test_stale_positions_are_ignored(self):
+        store = LiveLocationStore(InMemoryGeoClient(), freshness_seconds=60)
+        store.update(1, 12.9720, 77.5950, timestamp=time.time() - 120)
+
+        assert store.get(1) is None
+        assert store.search(12.9716, 77.5946, radius_km=10) == []
+
+    def test_positions_outside_the_geo_range_are_refused_like_redis(self):
+        store = LiveLocationStore(InMemoryGeoClient())
+        with pytest.raises(ResponseError):
+            store.update(1, 86.0, 77.6)
+        store.update(2, 85.05, 77.6)
+        assert store.get(2) == pytest.approx((85.05, 77.6))
+
+    def test_pop_dirty_collapses_repeated_pings(self):
+        store = LiveLocationStore(InMemoryGeoClient())
+        for step in range(5):
+            store.update(7, 12.97 + step * 0.001, 77.59)
+
+        dirty = store.pop_dirty()
+        assert list(dirty) == [7]
+        assert dirty[7][0] == pytest.approx(12.974)
+        assert store.pop_dirty() == {}
+
+
+@pytest.mark.django_db
+class TestLiveLocationFlow:
+
+    def test_ping_is_buffered_then_flushed(self, client, live_store, provider_factory):
+        provider = provider_factory("live_p1", Decimal("12.9716"), Decimal("77.5946"))
+        client.force_authenticate(user=provider.user)
+
+        response = client.post(
+            "/api/v1/services/provider/location-update/",
+            {"latitude": 12.9900, "longitude": 77.6100},
+            format="json",
+        )
+        assert response.status_code == 200
+
+        provider.refresh_from_db()
+        assert provider.latitude == Decimal("12.9716")
+        assert live_store.get(provider.pk) == pytest.approx((12.99, 77.61), abs=1e-5)
+
+        flush_provider_locations()
+        provider.refresh_from_db()
+        assert float(provider.latitude) == pytest.approx(12.99, abs=1e-5)
+        assert provider.geo_cell == encode_geohash(float(provider.latitude), float(provider.longitude))
+
+    @pytest.mark.parametrize("url", [
+        "/api/v1/services/provider/location-update/",
+        "/api/v1/users/provider/update-location/",
+    ])
+    # Redis GEO sets stop at +-85.05112878 degrees, well short of the poles
+    @pytest.mark.parametrize("latitude, longitude", [
+        (95, 77.6), (-90.5, 77.6), (86, 77.6), (-86, 77.6), (12.99, 180.5), (12.99, -181),
+    ])
+    def test_out_of_range_positions_are_rejected(self, client, live_store, provider_factory, url, latitude, longitude):
+        provider = provider_factory("live_range")
+        client.force_authenticate(user=provider.user)
+
+        response = client.post(url, {"latitude": latitude, "longitude": longitude}, format="json")
+        assert response.status_code == 400
+        assert live_store.get(provider.pk) is None
+
+    def test_dispatch_uses_live_position(self, live_store, provider_factory):
+        stale = provider_factory("live_stale", Decimal("12.9720"), Decimal("77.5950"))
+        moving = provider_factory("live_moving", Decimal("13.0827"), Decimal("80.2707"))  # Chennai in the DB
+        live_store.update(moving.pk, 12.9717, 77.5947)  # but pinging from Bangalore
+
+        request = SimpleNamespace(latitude=Decimal("12.9716"), longitude=Decimal("77.5946"), service_type="TOWING")
+        candidates = find_nearest_available_provider(request, radius_km=10)
+        assert [p.pk for p in candidates] == [moving.pk, stale.pk]
@@ -0,0 +1,120 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.core import mail
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from apps.services import outbox
+from apps.services.models import OutboxMessage, ServiceRequest, Vehicle
+from apps.services.tasks import relay_outbox
+from apps.users.models import CustomUser
+
+
+def make_request(username, phone_number="9876543210"):
+    booker = CustomUser.objects.create_user(
+        username=username, email=f"{username}@example.com", password="pass", phone_number=phone_number
+    )
+    return ServiceRequest.objects.create(
+        booker=booker, service_type="TOWING", latitude=Decimal("12.9716"), longitude=Decimal("77.5946")
+    )
+
+
+@pytest.mark.django_db
+class TestOutbox:
+
+    def test_request_save_queues_instead_of_sending(self, django_capture_on_commit_callbacks, fake_sms):
+        with patch("apps.services.outbox._kick_relay") as kick, \
+                django_capture_on_commit_callbacks(execute=True):
+            service_request = make_request("outbox_b1")
+
+        assert len(mail.outbox) == 0
+        assert fake_sms.calls == []
+        queued = OutboxMessage.objects.filter(topic="service_request_created")
+        assert sorted(queued.values_list("channel", flat=True)) == ["EMAIL", "SMS"]
+        sms = queued.get(channel="SMS")
+        assert sms.payload["phone_number"] == "9876543210"
+        assert f"#{service_request.id}" in sms.payload["message"]
+        assert kick.called
+
+    def test_rolled_back_save_queues_nothing(self):
+        with patch("apps.services.outbox._kick_relay") as kick:
+            with pytest.raises(RuntimeError), transaction.atomic():
+                make_request("outbox_b2")
+                raise RuntimeError
+        assert not OutboxMessage.objects.exists()
+        kick.assert_not_called()
+
+    def test_relay_delivers_pending_messages(self, fake_sms):
+        outbox.enqueue_email("Hello", "Text body", "<p>Html body</p>", ["a@example.com", ""], topic="t")
+        outbox.enqueue_sms("9876543210", "Hi", topic="t")
+        outbox.enqueue_sms("9876543211", "Hi", topic="t")
+
+        totals = relay_outbox()
+
+        assert totals["sent"] == 3
+        assert [m.to for m in mail.outbox] == [["a@example.com"]]
+        assert mail.outbox[0].alternatives[0][0] == "<p>Html body</p>"
+        # Both SMS share one bulk call
+        assert fake_sms.calls == [(["9876543210", "9876543211"], "Hi")]
+        assert set(OutboxMessage.objects.values_list("status", "attempts")) == {("SENT", 1)}
+
+    def test_failures_back_off_then_dead_letter(self, fake_sms):
+        message = outbox.enqueue_sms("9876543210", "Hi")
+        fake_sms.available = False
+
+        with override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BASE_SECONDS=30):
+            assert outbox.relay_batch()["retried"] == 1
+            message.refresh_from_db()
+            assert (message.status, message.attempts) == ("PENDING", 1)
+            assert "unreachable" in message.last_error
+            assert message.next_attempt_at > timezone.now() + timedelta(seconds=25)
+
+            # Not due yet
+            assert outbox.relay_batch()["claimed"] == 0
+
+            OutboxMessage.objects.update(next_attempt_at=timezone.now())
+            assert outbox.relay_batch()["dead"] == 1
+        message.refresh_from_db()
+        assert (message.status, message.attempts) == ("DEAD", 2)
+
+    def test_permanent_error_dead_letters_at_once(self, fake_sms):
+        message = outbox.enqueue_sms("12345", "Hi")
+        assert outbox.relay_batch()["dead"] == 1
+        assert fake_sms.calls == []
+        message.refresh_from_db()
+        assert (message.status, message.attempts) == ("DEAD", 1)
+
+        assert outbox.requeue(OutboxMessage.objects.filter(pk=message.pk)) == 1
+        message.refresh_from_db()
+        assert (message.status, message.attempts, message.last_error) == ("PENDING", 0, "")
+
+    def test_claimed_messages_are_leased(self):
+        outbox.enqueue_sms("9876543210", "Hi")
+        assert len(outbox.claim_batch(10)) == 1
+        # A second relay does not pick up the same row while the lease holds
+        assert outbox.claim_batch(10) == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_request_endpoint_commits_the_request_and_its_outbox_rows_together(client):
+    booker = CustomUser.objects.create_user(
+        username="outbox_api", email="outbox_api@example.com", password="pass", phone_number="9876543219"
+    )
+    vehicle = Vehicle.objects.create(owner=booker, license_plate="KA01OB0001", make="Maruti", model="Swift",
+                                     fuel_type="PETROL")
+    client.force_authenticate(user=booker)
+
+    with patch("apps.services.outbox._kick_relay"), \
+            patch("apps.services.views.trigger_dispatch", side_effect=RuntimeError("dispatch crashed")):
+        response = client.post("/api/v1/services/request/", {
+            "vehicle_id": vehicle.pk, "service_type": "TOWING", "latitude": "12.9716", "longitude": "77.5946",
+        }, format="json")
+
+    assert response.status_code == 500
+
+    assert not ServiceRequest.objects.exists()
+    assert not OutboxMessage.objects.exists()
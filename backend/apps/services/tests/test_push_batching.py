@@ -0,0 +1,70 @@
+import pytest
+from django.urls import reverse
+
+from apps.common.notifications import PushBatch, PushNotificationService
+from apps.users.models import CustomUser
+
+
+def make_users(count, prefix="push", token=True):
+    return [
+        CustomUser.objects.create_user(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password="pass",
+                                       fcm_device_token=f"{prefix}-token-{i}" if token else None)
+        for i in range(count)
+    ]
+
+
+@pytest.mark.django_db
+class TestPushBatching:
+
+    def test_fan_out_is_one_multicast_call(self, fake_fcm):
+        users = make_users(3)
+        results = PushNotificationService.send_to_users(users, "New job", "Towing nearby", {"request_id": 7})
+
+        assert results == {user.id: True for user in users}
+        assert fake_fcm.calls == [("multicast", 3)]
+        assert {push["data"]["request_id"] for push in fake_fcm.delivered} == {"7"}
+
+    def test_distinct_messages_share_send_each_calls(self, fake_fcm, settings):
+        settings.FCM_BATCH_SIZE = 2
+        users = make_users(3)
+        batch = PushBatch()
+        for user in users:
+            batch.add(user, "Update", f"Hello {user.username}")
+        batch.add(make_users(1, prefix="notoken", token=False)[0], "Update", "Hi")
+
+        assert set(batch.flush().values()) == {True}
+        assert fake_fcm.calls == [("send_each", 2), ("send_each", 1)]
+
+    def test_dead_tokens_are_pruned_in_bulk(self, fake_fcm):
+        users = make_users(4)
+        fake_fcm.invalid_tokens = {users[1].fcm_device_token, users[3].fcm_device_token}
+
+        results = PushNotificationService.send_to_users(users, "Ping", "Ping")
+
+        assert [results[user.id] for user in users] == [True, False, True, False]
+        assert list(CustomUser.objects.filter(fcm_device_token__isnull=True).order_by("id")) == [users[1], users[3]]
+        stats = PushNotificationService.stats()
+        assert (stats["sent"], stats["failed"], stats["pruned"]) == (2, 2, 2)
+        assert stats["delivery_rate"] == 0.5
+
+    def test_batch_block_defers_single_sends(self, fake_fcm):
+        users = make_users(3)
+        with PushNotificationService.batch():
+            for user in users:
+                assert PushNotificationService.send_to_user(user, "Job", "Job for you") is True
+            assert fake_fcm.calls == []
+        assert fake_fcm.calls == [("multicast", 3)]
+
+        # Outside a block a send goes out at once and reports delivery
+        fake_fcm.invalid_tokens = {users[0].fcm_device_token}
+        assert PushNotificationService.send_to_user(users[0], "Job", "Job for you") is False
+
+    def test_push_stats_endpoint(self, fake_fcm, client):
+        PushNotificationService.send_to_users(make_users(2), "Ping", "Ping")
+        admin = CustomUser.objects.create_user(username="push_admin", email="push_admin@example.com",
+                                               password="pass", is_staff=True)
+        client.force_authenticate(user=admin)
+        response = client.get(reverse("admin-push-stats"))
+        assert response.status_code == 200
+        assert response.data["sent"] == 2
+        assert response.data["calls"] == 1
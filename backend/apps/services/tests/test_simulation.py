@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+from apps.services.models import ServiceRequest
+from apps.services.simulation import CITIES, city_point, percentile, run_simulation
+from apps.users.models import ServiceProvider
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 51
+    assert percentile(values, 0.99) == 100
+    assert percentile([], 0.95) == 0.0
+
+
+def test_city_points_stay_in_the_metro_area():
+    rng = random.Random(3)
+    lat, lng, _ = CITIES["bangalore"][0]
+    points = [city_point(rng, CITIES["bangalore"]) for _ in range(500)]
+    assert all(abs(p[0] - lat) < 1 and abs(p[1] - lng) < 1 for p in points)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mode", ["greedy", "batch"])
+def test_simulation_reports_and_rolls_back(mode):
+    report = run_simulation(providers=40, requests=15, mode=mode, window=5)
+
+    assert set(report["stages"]) == {"lookup", "dispatch", "finalize"}
+    assert report["stages"]["lookup"]["calls"] == 15
+    assert report["stages"]["finalize"]["calls"] == report["quality"]["assigned"]
+    assert report["stages"]["dispatch"]["queries_per_call"] > 0
+    assert report["quality"]["assigned"] > 0
+    assert report["quality"]["capability_mismatches"] == 0
+
+    assert not ServiceRequest.objects.exists()
+    assert not ServiceProvider.objects.exists()
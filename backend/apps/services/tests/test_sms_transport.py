@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.services.models import SMSMessageLog, Vehicle
+from apps.services.services.sms import (
+    INVALID_NUMBER, QUOTA_EXHAUSTED, FakeSMSGateway, SMSService, SMSTransport,
+)
+from apps.services.tasks import send_compliance_reminders
+from apps.services.utils.sms_utils import sms_service
+from apps.users.models import CustomUser
+
+
+def numbers(count, start=9000000000):
+    return [str(start + i) for i in range(count)]
+
+
+@pytest.mark.django_db
+class TestSMSTransport:
+
+    def test_same_text_is_sent_in_bulk_calls(self, fake_sms):
+        messages = [(number, "Storm alert") for number in numbers(250)] + [("9876543210", "Other")]
+        with override_settings(SMS_NUMBERS_PER_CALL=100):
+            transport = SMSTransport(api_key="k", gateway=fake_sms)
+        with CaptureQueriesContext(connection) as captured:
+            results = transport.send_many(messages)
+
+        assert all(result.success for result in results)
+        assert sorted(len(call_numbers) for call_numbers, _ in fake_sms.calls) == [1, 50, 100, 100]
+        assert sorted(fake_sms.numbers_sent) == sorted(number for number, _ in messages)
+        # Outcomes are logged in bulk (SQLite splits 251 rows over two statements)
+        assert len([q for q in captured if q["sql"].startswith("INSERT")]) <= 2
+        assert SMSMessageLog.objects.filter(status="Sent").count() == 251
+
+    def test_concurrency_is_capped(self):
+        gateway = FakeSMSGateway(latency=0.02)
+        with override_settings(SMS_CONCURRENCY=3):
+            transport = SMSTransport(api_key="k", gateway=gateway)
+        transport.send_many([("9876543210", f"Message {i}") for i in range(9)])
+        assert len(gateway.calls) == 9
+        assert gateway.peak_concurrency == 3
+
+    def test_failures_are_per_call(self, fake_sms):
+        fake_sms.fail_numbers = {"9000000001"}
+        results = sms_service.send_bulk([
+            ("9000000000", "A"), ("+91 90000-00001", "B"), ("12345", "A"), ("9000000002", "A"),
+        ])
+        assert [result["success"] for result in results] == [True, False, False, True]
+        assert results[2]["error"] == INVALID_NUMBER
+        assert sorted(fake_sms.calls) == [(["9000000000", "9000000002"], "A"), (["9000000001"], "B")]
+
+    @override_settings(SMS_DAILY_QUOTA=5)
+    def test_daily_quota(self, fake_sms):
+        cache.clear()
+        transport = SMSTransport(api_key="k", gateway=fake_sms)
+        first = transport.send_many([(number, "Hi") for number in numbers(4)])
+        assert all(result.success for result in first)
+
+        # A failed call gives its quota back
+        fake_sms.available = False
+        assert not transport.send("9000000010", "Hi").success
+        assert transport.quota_used() == 4
+
+        fake_sms.available = True
+        second = transport.send_many([(number, "Hi") for number in numbers(3, start=9000000020)])
+        assert [result.error for result in second] == [None, QUOTA_EXHAUSTED, QUOTA_EXHAUSTED]
+        assert transport.quota_used() == 5
+
+    def test_service_wrappers_share_the_transport(self, fake_sms):
+        assert SMSService().send_sms("9876543210", "Hello")["status"] == "SENT"
+        assert sms_service.send_sms("9876543211", "x" * 200)["success"] is True
+        assert fake_sms.calls == [(["9876543210"], "Hello"), (["9876543211"], "x" * 160)]
+
+    def test_compliance_reminders_go_out_in_one_batch(self, fake_sms):
+        in_three_days = timezone.now().date() + timedelta(days=3)
+        for i in range(5):
+            owner = CustomUser.objects.create_user(username=f"comp_owner{i}", email=f"comp_owner{i}@example.com",
+                                                   password="pass", phone_number=str(9100000000 + i))
+            Vehicle.objects.create(owner=owner, license_plate=f"KA01AB{i:04d}", make="Maruti", model="Swift",
+                                   fuel_type="PETROL", insurance_expiry=in_three_days, puc_expiry=in_three_days)
+
+        assert send_compliance_reminders() == "Sent 10 of 10 compliance reminders."
+        assert len(fake_sms.calls) == 10
+        assert SMSMessageLog.objects.count() == 10
@@ -0,0 +1,86 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.services.models import OutboxMessage, ServiceRequest
+from apps.users.models import CustomUser
+
+
+@pytest.fixture(autouse=True)
+def no_relay():
+    with patch("apps.services.outbox._kick_relay"):
+        yield
+
+
+def make_user(username, **extra):
+    return CustomUser.objects.create_user(username=username, email=f"{username}@example.com", password="pass",
+                                          **extra)
+
+
+def queued(topic):
+    return OutboxMessage.objects.filter(topic=topic, channel="EMAIL").count()
+
+
+@pytest.mark.django_db
+class TestStatusTransitions:
+
+    def make_request(self, username="trans_b"):
+        return ServiceRequest.objects.create(
+            booker=make_user(username, phone_number="9876543210"), service_type="TOWING",
+            latitude=Decimal("12.9716"), longitude=Decimal("77.5946"),
+        )
+
+    def test_tracked_changes(self):
+        service_request = self.make_request()
+        assert service_request.tracked_changes() == {}
+
+        provider = make_user("trans_p0", is_service_provider=True)
+        service_request.status = "DISPATCHED"
+        service_request.provider = provider
+        assert service_request.tracked_changes() == {
+            "status": ("PENDING_DISPATCH", "DISPATCHED"), "provider_id": (None, provider.pk)
+        }
+        service_request.save(update_fields=["status"])
+        assert set(service_request.tracked_changes()) == {"provider_id"}
+
+        loaded = ServiceRequest.objects.get(pk=service_request.pk)
+        assert loaded.tracked_changes() == {}
+        # Deferred fields are left alone rather than fetched
+        deferred = ServiceRequest.objects.only("id").get(pk=service_request.pk)
+        with CaptureQueriesContext(connection) as captured:
+            assert deferred.tracked_changes() == {}
+        assert len(captured) == 0
+
+    def test_dispatch_notifies_once_without_rereading(self):
+        service_request = self.make_request()
+        provider = make_user("trans_p1", is_service_provider=True, first_name="Ravi")
+
+        service_request = ServiceRequest.objects.get(pk=service_request.pk)
+        service_request.mark_dispatched(provider)
+        with CaptureQueriesContext(connection) as captured:
+            service_request.save()
+        assert not [q for q in captured if q["sql"].startswith("SELECT") and "services_servicerequest" in q["sql"]]
+        assert queued("provider_assigned") == 1
+        assert f"Provider ID: {provider.pk}" in OutboxMessage.objects.get(
+            topic="provider_assigned", channel="EMAIL").payload["text"]
+
+        # Re-saves, from this instance or a fresh load, are not new transitions
+        service_request.save()
+        ServiceRequest.objects.get(pk=service_request.pk).save()
+        assert queued("provider_assigned") == 1
+
+        # Re-dispatch to someone else is
+        service_request.mark_dispatched(make_user("trans_p2", is_service_provider=True))
+        service_request.save()
+        assert queued("provider_assigned") == 2
+
+    def test_completion_notifies_once(self):
+        service_request = self.make_request("trans_b3")
+        service_request.status = "COMPLETED"
+        service_request.save()
+        service_request.save()
+        ServiceRequest.objects.get(pk=service_request.pk).save()
+        assert queued("service_completed") == 1
@@ -0,0 +1,188 @@
+import json
+from decimal import Decimal
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.channels_auth import JWTAuthMiddlewareStack
+from apps.services.consumers import CLOSE_FORBIDDEN, CLOSE_TOO_MANY_FRAMES, CLOSE_UNAUTHENTICATED
+from apps.services.models import ServiceRequest
+from apps.services.routing import websocket_urlpatterns
+from apps.services.services.live_location import get_live_location_store
+from apps.users.models import CustomUser
+
+application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.usefixtures("in_memory_channel_layer"),
+]
+
+
+@pytest.fixture
+def in_memory_channel_layer():
+    with override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}):
+        yield
+
+
+@pytest.fixture
+def tracked_request():
+    booker = CustomUser.objects.create_user(username="track_booker", email="tb@example.com", password="pass")
+    provider = CustomUser.objects.create_user(username="track_provider", email="tp@example.com", password="pass")
+    service_request = ServiceRequest.objects.create(
+        booker=booker, provider=provider, status="DISPATCHED", service_type="TOWING",
+        latitude=Decimal("12.9716"), longitude=Decimal("77.5946"),
+    )
+    return service_request, booker, provider
+
+
+def communicator(service_request, user=None):
+    path = f"/ws/service/{service_request.pk}/"
+    if user is not None:
+        path += f"?token={AccessToken.for_user(user)}"
+    return WebsocketCommunicator(application, path)
+
+
+def location(latitude, longitude):
+    return {"provider_location": True, "latitude": latitude, "longitude": longitude}
+
+
+async def join(comm):
+    connected, _ = await comm.connect()
+    assert connected
+    # Every fresh connection is first told where the event stream is
+    assert (await comm.receive_json_from())["type"] == "sync"
+
+
+async def assert_closed_with(comm, code):
+    connected, _ = await comm.connect()
+    assert connected
+    assert await comm.receive_output() == {"type": "websocket.close", "code": code}
+
+
+class TestTrackingConsumer:
+
+    def test_connect_requires_a_participant(self, tracked_request):
+        service_request, booker, _ = tracked_request
+        stranger = CustomUser.objects.create_user(username="track_stranger", email="ts@example.com", password="pass")
+
+        async def scenario():
+            await assert_closed_with(communicator(service_request), CLOSE_UNAUTHENTICATED)
+            bad_token = WebsocketCommunicator(application, f"/ws/service/{service_request.pk}/?token=garbage")
+            await assert_closed_with(bad_token, CLOSE_UNAUTHENTICATED)
+            await assert_closed_with(communicator(service_request, stranger), CLOSE_FORBIDDEN)
+
+            comm = communicator(service_request, booker)
+            await join(comm)
+            assert await comm.receive_nothing()
+            await comm.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_status_and_chat_events_reach_the_client(self, tracked_request):
+        service_request, booker, _ = tracked_request
+
+        async def scenario():
+            comm = communicator(service_request, booker)
+            await join(comm)
+            await get_channel_layer().group_send(f"service_{service_request.pk}", {
+                "type": "status_update", "status": "CHAT_MESSAGE", "message": "New message received",
+            })
+            assert await comm.receive_json_from() == {
+                "status": "CHAT_MESSAGE", "message": "New message received", "data": {}, "seq": None,
+            }
+            await comm.disconnect()
+
+        async_to_sync(scenario)()
+
+    @override_settings(TRACKING_LOCATION_INTERVAL_SECONDS=0.2)
+    def test_provider_locations_are_coalesced(self, tracked_request):
+        service_request, booker, provider = tracked_request
+
+        async def scenario():
+            watcher = communicator(service_request, booker)
+            sender = communicator(service_request, provider)
+            await join(watcher)
+            await join(sender)
+
+            for i in range(5):
+                await sender.send_json_to(location(12.9 + i / 100, 77.5))
+            # The first position goes out at once, the rest collapse into the latest
+            first = await watcher.receive_json_from()
+            assert (first["type"], first["latitude"], first["longitude"]) == ("location", 12.9, 77.5)
+            latest = await watcher.receive_json_from(timeout=1)
+            assert latest["latitude"] == 12.94
+            assert await watcher.receive_nothing(timeout=0.3)
+            # The provider is not sent their own position back
+            assert await sender.receive_nothing()
+
+            await watcher.disconnect()
+            await sender.disconnect()
+
+        async_to_sync(scenario)()
+        store = get_live_location_store()
+        latitude, longitude = store.get(provider.pk)
+        assert (round(latitude, 4), round(longitude, 4)) == (12.94, 77.5)
+
+    def test_only_the_assigned_provider_publishes(self, tracked_request):
+        service_request, booker, provider = tracked_request
+
+        async def scenario():
+            watcher = communicator(service_request, provider)
+            sender = communicator(service_request, booker)
+            await join(watcher)
+            await join(sender)
+            await sender.send_json_to(location(12.9, 77.5))
+            await sender.send_json_to(location(95, 77.5))
+            await sender.send_to(text_data="not json")
+            assert await watcher.receive_nothing()
+            await watcher.disconnect()
+            await sender.disconnect()
+
+        async_to_sync(scenario)()
+        assert get_live_location_store().get(provider.pk) is None
+
+    @override_settings(TRACKING_LOCATION_INTERVAL_SECONDS=0, TRACKING_PROVIDER_RECHECK_SECONDS=0)
+    def test_reassigned_provider_is_disconnected(self, tracked_request):
+        service_request, booker, provider = tracked_request
+        replacement = CustomUser.objects.create_user(username="track_replacement", email="tr@example.com", password="pass")
+
+        async def scenario():
+            watcher = communicator(service_request, booker)
+            sender = communicator(service_request, provider)
+            await join(watcher)
+            await join(sender)
+            await sender.send_json_to(location(12.9, 77.5))
+            assert (await watcher.receive_json_from())["latitude"] == 12.9
+
+            # Escalation hands the request to someone else
+            await database_sync_to_async(ServiceRequest.objects.filter(pk=service_request.pk).update)(
+                provider=replacement
+            )
+            await sender.send_json_to(location(12.95, 77.5))
+            assert await sender.receive_output() == {"type": "websocket.close", "code": CLOSE_FORBIDDEN}
+            assert await watcher.receive_nothing()
+            await watcher.disconnect()
+            await sender.disconnect()
+
+        async_to_sync(scenario)()
+
+    @override_settings(TRACKING_MAX_FRAMES_PER_SECOND=3)
+    def test_flooding_clients_are_disconnected(self, tracked_request):
+        service_request, _, provider = tracked_request
+
+        async def scenario():
+            comm = communicator(service_request, provider)
+            await join(comm)
+            for _ in range(4):
+                await comm.send_to(text_data=json.dumps({"ping": True}))
+            assert await comm.receive_output() == {"type": "websocket.close", "code": CLOSE_TOO_MANY_FRAMES}
+            await comm.disconnect()
+
+        async_to_sync(scenario)()
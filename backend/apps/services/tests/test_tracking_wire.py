@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+import msgpack
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.channels_auth import JWTAuthMiddlewareStack
+from apps.services.models import ChatMessage, ServiceRequest
+from apps.services.routing import websocket_urlpatterns
+from apps.services.services import tracking_stream
+from apps.services.services.tracking_wire import (
+    COORDINATE_SCALE, SUBPROTOCOL_COMPACT, SUBPROTOCOL_MSGPACK, CompactEncoder, VerboseEncoder, negotiate,
+)
+from apps.users.models import CustomUser
+
+application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.usefixtures("in_memory_channel_layer"),
+]
+
+
+@pytest.fixture
+def in_memory_channel_layer():
+    with override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}):
+        yield
+
+
+@pytest.fixture
+def tracked_request():
+    booker = CustomUser.objects.create_user(username="wire_booker", email="wb@example.com", password="pass")
+    provider = CustomUser.objects.create_user(username="wire_provider", email="wp@example.com", password="pass")
+    service_request = ServiceRequest.objects.create(
+        booker=booker, provider=provider, status="DISPATCHED", service_type="TOWING",
+        latitude=Decimal("12.9716"), longitude=Decimal("77.5946"),
+    )
+    return service_request, booker, provider
+
+
+def communicator(service_request, user, query="", subprotocols=None):
+    path = f"/ws/service/{service_request.pk}/?token={AccessToken.for_user(user)}{query}"
+    return WebsocketCommunicator(application, path, subprotocols=subprotocols)
+
+
+def chat_event(text):
+    return {"type": "status_update", "status": "CHAT_MESSAGE", "message": text}
+
+
+async def publish_live(request_id, event):
+    await sync_to_async(tracking_stream.publish)(request_id, event)
+
+
+def test_compact_positions_are_exact_fixed_point_deltas():
+    encoder = CompactEncoder()
+    fixes = [(12.97161, 77.59461, 1000.2), (12.97201, 77.59530, 1001.1), (12.97195, 77.59602, 1002.4)]
+    frames = [encoder.location({"latitude": lat, "longitude": lng, "timestamp": ts, "seq": i})
+              for i, (lat, lng, ts) in enumerate(fixes, start=1)]
+
+    assert [frame["t"] for frame in frames] == ["L", "l", "l"]
+    assert frames[1]["p"] == [40, 69, 1]
+    position = frames[0]["p"]
+    for frame in frames[1:]:
+        position = [a + b for a, b in zip(position, frame["p"])]
+    assert position == [round(12.97195 * COORDINATE_SCALE), round(77.59602 * COORDINATE_SCALE), 1002]
+
+    # A resync starts over from an absolute position
+    assert encoder.sync(3, resync=True) == {"t": "y", "s": 3, "r": 1}
+    assert encoder.location({"latitude": 1, "longitude": 2, "timestamp": 3, "seq": 4})["t"] == "L"
+
+
+def test_negotiation_falls_back_to_verbose_json():
+    assert isinstance(negotiate(["graphql-ws", SUBPROTOCOL_COMPACT]), CompactEncoder)
+    assert type(negotiate(["graphql-ws"])) is VerboseEncoder
+    assert type(negotiate(None)) is VerboseEncoder
+
+
+def test_msgpack_clients_get_binary_delta_frames(tracked_request):
+    service_request, booker, provider = tracked_request
+
+    async def scenario():
+        watcher = communicator(service_request, booker, subprotocols=[SUBPROTOCOL_MSGPACK])
+        connected, subprotocol = await watcher.connect()
+        assert (connected, subprotocol) == (True, SUBPROTOCOL_MSGPACK)
+        assert msgpack.unpackb(await watcher.receive_from()) == {"t": "y", "s": 0}
+
+        sender = communicator(service_request, provider)
+        await sender.connect()
+        with override_settings(TRACKING_LOCATION_INTERVAL_SECONDS=0):
+            await sender.send_json_to({"provider_location": True, "latitude": 12.9716, "longitude": 77.5946})
+            await sender.send_to(bytes_data=msgpack.packb(
+                {"provider_location": True, "latitude": 12.9718, "longitude": 77.5950}))
+            first = msgpack.unpackb(await watcher.receive_from())
+            second = msgpack.unpackb(await watcher.receive_from())
+
+        assert (first["t"], first["s"], first["p"][:2]) == ("L", 1, [1297160, 7759460])
+        assert (second["t"], second["s"], second["p"][:2]) == ("l", 2, [20, 40])
+        await watcher.disconnect()
+        await sender.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_reconnecting_clients_resume_from_their_sequence(tracked_request):
+    service_request, booker, _ = tracked_request
+    for i in range(3):
+        tracking_stream.publish(service_request.pk, chat_event(f"Message {i}"))
+
+    async def scenario():
+        comm = communicator(service_request, booker, query="&since=1", subprotocols=[SUBPROTOCOL_COMPACT])
+        await comm.connect()
+        assert [await comm.receive_json_from() for _ in range(2)] == [
+            {"t": "s", "s": 2, "st": "CHAT_MESSAGE", "m": "Message 1"},
+            {"t": "s", "s": 3, "st": "CHAT_MESSAGE", "m": "Message 2"},
+        ]
+        # Live events continue the sequence
+        await publish_live(service_request.pk, chat_event("Message 3"))
+        assert (await comm.receive_json_from())["s"] == 4
+        assert await comm.receive_nothing()
+        await comm.disconnect()
+
+        # Up to date: nothing to send
+        comm = communicator(service_request, booker, query="&since=4", subprotocols=[SUBPROTOCOL_COMPACT])
+        await comm.connect()
+        assert await comm.receive_nothing()
+        await comm.disconnect()
+
+    async_to_sync(scenario)()
+
+
+@override_settings(TRACKING_REPLAY_EVENTS=2)
+def test_clients_too_far_behind_are_told_to_resync(tracked_request):
+    service_request, booker, _ = tracked_request
+    for i in range(5):
+        tracking_stream.publish(service_request.pk, chat_event(f"Message {i}"))
+
+    async def scenario():
+        comm = communicator(service_request, booker, query="&since=1")
+        await comm.connect()
+        assert await comm.receive_json_from() == {"type": "sync", "seq": 5, "resync": True}
+        await comm.disconnect()
+
+        # The counter restarted after the stream expired
+        comm = communicator(service_request, booker, query="&since=9")
+        await comm.connect()
+        assert (await comm.receive_json_from())["resync"] is True
+        await comm.disconnect()
+
+    async_to_sync(scenario)()
+
+
+def test_concurrent_publishers_send_in_sequence_order(tracked_request):
+    service_request, _, _ = tracked_request
+    sent = []
+
+    class SlowFirstSendLayer:
+        async def group_send(self, group, event):
+            if not sent and event["seq"] == 1:
+                # The first publisher stalls after numbering its event
+                await asyncio.sleep(0.2)
+            sent.append(event["seq"])
+
+    with patch.object(tracking_stream, "get_channel_layer", return_value=SlowFirstSendLayer()):
+        publishers = [
+            threading.Thread(target=tracking_stream.publish, args=(service_request.pk, chat_event(f"Message {i}")))
+            for i in range(2)
+        ]
+        publishers[0].start()
+        time.sleep(0.05)
+        publishers[1].start()
+        for publisher in publishers:
+            publisher.join()
+
+    assert sent == [1, 2]
+
+
+def test_chat_messages_are_sequenced(tracked_request):
+    service_request, booker, _ = tracked_request
+    ChatMessage.objects.create(request=service_request, sender=booker, message="On my way?")
+
+    current, events = tracking_stream.replay(service_request.pk, since=0)
+    assert current == 1
+    assert events[0]["data"]["message"] == "On my way?"
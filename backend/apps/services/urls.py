@@ -8,7 +8,7 @@ from .views import (
     SubscriptionAnalyticsView, DashboardStatsView, VehicleViewSet,
     ServiceQuoteViewSet, ProviderJobView, AIStatsView,
     ChatMessageViewSet, ProviderLocationUpdateView, VehiclePlacementViewSet,
-    SparePartStoreViewSet
+    SparePartStoreViewSet, PushStatsView
 )
 from .public_stats_view import PublicStatsView
 from .admin_views import user_list, service_request_list, payment_list
@@ -41,6 +41,7 @@ urlpatterns = [
     # Admin endpoints
     path('admin/dashboard-stats/', DashboardStatsView.as_view(), name='admin-dashboard-stats'),
     path('admin/ai-stats/', AIStatsView.as_view(), name='admin-ai-stats'),
+    path('admin/push-stats/', PushStatsView.as_view(), name='admin-push-stats'),
     path('admin/users/', user_list, name='admin-user-list'),
     path('admin/bookings/', service_request_list, name='admin-booking-list'),
     path('admin/payments/', payment_list, name='admin-payment-list'),
@@ -0,0 +1,98 @@
+"""
+A local debugging SMTP server that accepts and counts mail.
+
+Used by bench_email_throughput and the email tests to exercise the real
+SMTP backend without an outside server:
+
+    with SMTPSink() as sink:
+        with override_settings(EMAIL_HOST=sink.host, EMAIL_PORT=sink.port, ...):
+            ...
+        sink.messages, sink.connections
+
+`latency` delays every reply, approximating a remote server's round trip.
+"""
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        if self.server.sink.latency:
+            time.sleep(self.server.sink.latency)
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server.sink
+        sink._count("connections")
+        self.reply("220 localhost VehicAid debugging SMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("RCPT TO:") and any(r.upper() in command for r in sink.refuse):
+                self.reply("550 No such user")
+            elif command.startswith(("MAIL FROM:", "RCPT TO:", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    body.append(data)
+                sink._store(b"".join(body))
+                self.reply("250 OK: queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """Runs the debugging server on a free local port while in use."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, refuse=()):
+        self.latency = latency
+        self.refuse = set(refuse)
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _store(self, message):
+        with self._lock:
+            self.messages.append(message)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
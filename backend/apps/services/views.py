@@ -2,11 +2,12 @@ from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema
 
+from apps.common.notifications import PushNotificationService
 from apps.users.models import ServiceBooker, ServiceProvider
 from django.db.models import Avg, Count, Sum, Q
 
@@ -17,6 +18,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+NEARBY_STORE_RADIUS_KM = 20
+
 from .models import (
     ServiceRequest,
     Vehicle,
@@ -30,6 +33,9 @@ from .models import (
     SparePartStore,
 )
 from .agent_logic import BookingAgent
+from .dispatch_logic import claim_provider, trigger_dispatch
+from apps.common.geo import bounding_box, haversine_km, nearest_within
+from .services.live_location import GEO_MAX_LATITUDE, get_live_location_store
 from .serializers import (
     ServiceRequestSerializer,
     SubscriptionPlanSerializer,
@@ -79,13 +85,16 @@ class ServiceRequestView(APIView):
                     status=status.HTTP_403_FORBIDDEN,
                 )
 
-            # 1. Save request and link to user
+            # The request row and the notifications its post_save signal
+            # queues in the outbox commit together
             with transaction.atomic():
+                # 1. Save request and link to user
                 service_request = serializer.save(
                     booker=request.user, priority="HIGH"
                 )
 
-                # 2. Trigger the automated dispatch process
+                # 2. Trigger the automated dispatch process (the claim is a
+                # short UPDATE; quoting and push run after commit)
                 dispatch_result = trigger_dispatch(service_request)
 
             return Response(
@@ -113,6 +122,16 @@ class ServiceRequestView(APIView):
             service_request = get_object_or_404(
                 ServiceRequest, id=request_id, booker=request.user
             )
+            provider_location = None
+            if service_request.provider_id:
+                position = get_live_location_store().get(service_request.provider_id)
+                if position is None:
+                    provider = ServiceProvider.objects.filter(user_id=service_request.provider_id).first()
+                    if provider and provider.latitude is not None and provider.longitude is not None:
+                        position = (float(provider.latitude), float(provider.longitude))
+                if position:
+                    provider_location = {"latitude": position[0], "longitude": position[1]}
+
             return Response(
                 {
                     "id": service_request.id,
@@ -120,7 +139,7 @@ class ServiceRequestView(APIView):
                     "status": service_request.status,
                     "provider_id": service_request.provider_id,
                     "created_at": service_request.created_at,
-                    "provider_location": None,  # TODO: Fetch real-time from cache
+                    "provider_location": provider_location,
                 }
             )
         else:
@@ -249,6 +268,17 @@ class SubscriptionViewSet(viewsets.ViewSet):
 
 
 
+class PushStatsView(APIView):
+    """
+    Push delivery metrics: messages sent and failed, dead tokens pruned,
+    recipients skipped (no token) and FCM calls made.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(PushNotificationService.stats())
+
+
 class DashboardStatsView(APIView):
     """
     Aggregates high-level operational metrics for the Admin Dashboard.
@@ -823,19 +853,23 @@ class ProviderJobView(viewsets.ViewSet):
     @action(detail=True, methods=['post'])
     def accept(self, request, pk=None):
         """Provider accepts a job."""
-        job = get_object_or_404(ServiceRequest, pk=pk)
-        
-        if job.status != 'PENDING_DISPATCH':
-             return Response({"error": "Job is no longer available."}, status=status.HTTP_400_BAD_REQUEST)
-        
         # Check if provider is available
         provider = getattr(request.user, 'serviceprovider', None)
         if not provider:
              return Response({"error": "User is not a service provider."}, status=status.HTTP_403_FORBIDDEN)
 
-        job.provider = request.user
-        job.status = 'DISPATCHED'
-        job.save()
+        with transaction.atomic():
+            # Lock the job so two providers cannot both accept it
+            job = get_object_or_404(ServiceRequest.objects.select_for_update(), pk=pk)
+
+            if job.status != 'PENDING_DISPATCH':
+                 return Response({"error": "Job is no longer available."}, status=status.HTTP_400_BAD_REQUEST)
+
+            if not claim_provider(provider.pk):
+                 return Response({"error": "You already have an active job or are offline."}, status=status.HTTP_409_CONFLICT)
+
+            job.mark_dispatched(request.user)
+            job.save()
         
         return Response({"status": "Job accepted", "job_id": job.id})
 
@@ -975,9 +1009,16 @@ class ProviderLocationUpdateView(APIView):
         if latitude is None or longitude is None:
             return Response({"error": "Latitude and longitude are required."}, status=status.HTTP_400_BAD_REQUEST)
         
-        provider.latitude = latitude
-        provider.longitude = longitude
-        provider.save()
+        try:
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (TypeError, ValueError):
+            return Response({"error": "Invalid coordinates."}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-GEO_MAX_LATITUDE <= latitude <= GEO_MAX_LATITUDE and -180 <= longitude <= 180):
+            return Response({"error": "Invalid coordinates."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # High-frequency pings go to the live layer; the DB is updated in batches
+        get_live_location_store().update(provider.pk, latitude, longitude)
         
         return Response({"status": "Location updated successfully."})
 
@@ -1002,16 +1043,7 @@ class VehiclePlacementViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 def haversine(lat1, lon1, lat2, lon2):
-    import math
-    # Radius of the Earth in km
-    R = 6371.0
-    
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    return distance
+    return haversine_km(lat1, lon1, lat2, lon2)
 
 class SparePartStoreViewSet(viewsets.ReadOnlyModelViewSet):
     """Endpoints for providers to fetch nearby spare part stores."""
@@ -1033,17 +1065,21 @@ class SparePartStoreViewSet(viewsets.ReadOnlyModelViewSet):
         except (TypeError, ValueError):
             return Response({"error": "Invalid coordinates."}, status=status.HTTP_400_BAD_REQUEST)
             
-        stores = SparePartStore.objects.all()
+        # Bounding box narrows the rows in SQL, then one vectorised pass ranks them
+        lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, NEARBY_STORE_RADIUS_KM)
+        stores = list(SparePartStore.objects.filter(
+            latitude__range=(lat_min, lat_max),
+            longitude__range=(lng_min, lng_max),
+        ))
+        indices, distances = nearest_within(
+            lat, lng,
+            [store.latitude for store in stores], [store.longitude for store in stores],
+            NEARBY_STORE_RADIUS_KM,
+        )
+
         nearby = []
-        
-        for store in stores:
-            dist = haversine(lat, lng, float(store.latitude), float(store.longitude))
-            if dist <= 20: # 20km radius
-                data = self.get_serializer(store).data
-                data['distance_km'] = round(dist, 2)
-                nearby.append(data)
-                
-        # Sort by distance
-        nearby.sort(key=lambda x: x['distance_km'])
+        for index, dist in zip(indices, distances):
+            data = self.get_serializer(stores[index]).data
+            data['distance_km'] = round(float(dist), 2)
+            nearby.append(data)
         return Response(nearby)
-
@@ -8,8 +8,8 @@ class UsersConfig(AppConfig):
     label = "users"
 
     def ready(self):
+        from . import signals  # noqa: F401  Keep provider capability index in sync
         # from auditlog.registry import auditlog
         # from .models import CustomUser, ServiceProvider
         # auditlog.register(CustomUser)
         # auditlog.register(ServiceProvider)
-        pass
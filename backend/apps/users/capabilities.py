@@ -0,0 +1,78 @@
+"""
+Normalised provider capabilities.
+
+Providers declare what they can do as free-form labels in
+ServiceProvider.service_types ('Towing', 'Jumpstart', ...), while requests
+use ServiceRequest.SERVICE_TYPE_CHOICES codes. Both are mapped to the same
+canonical codes here, and each provider's codes are kept in the indexed
+ProviderCapability table so dispatch can filter with a plain join instead
+of scanning JSON.
+"""
+
+# Stored for providers that declare no service types; they take any job
+ANY_SERVICE = "ANY"
+
+# Request types that any provider may be sent to
+UNRESTRICTED_SERVICE_TYPES = {"OTHER"}
+
+SERVICE_TYPE_ALIASES = {
+    "TOW": "TOWING",
+    "FLATBED": "FLATBED_TOWING",
+    "JUMPSTART": "BATTERY_JUMP",
+    "JUMP_START": "BATTERY_JUMP",
+    "BATTERY": "BATTERY_JUMP",
+    "BATTERY_JUMPSTART": "BATTERY_JUMP",
+    "FUEL": "FUEL_DELIVERY",
+    "TIRE_CHANGE": "FLAT_TIRE",
+    "TYRE_CHANGE": "FLAT_TIRE",
+    "FLAT_TYRE": "FLAT_TIRE",
+    "PUNCTURE": "FLAT_TIRE",
+    "REPAIR": "MECHANIC",
+    "MECHANICAL": "MECHANIC",
+    "LOCKSMITH": "LOCKOUT",
+}
+
+
+def normalise_service_type(value):
+    """'Jumpstart' / 'battery-jump' / 'BATTERY_JUMP' -> 'BATTERY_JUMP'."""
+    code = str(value).strip().upper().replace("-", "_").replace(" ", "_")
+    return SERVICE_TYPE_ALIASES.get(code, code)
+
+
+def capability_codes(service_types):
+    """Canonical codes for a provider's declared service types."""
+    codes = {normalise_service_type(s) for s in service_types or [] if str(s).strip()}
+    return codes or {ANY_SERVICE}
+
+
+def required_capabilities(service_type):
+    """
+    Capability codes that qualify a provider for a request of this type, or
+    None when any provider qualifies.
+    """
+    code = normalise_service_type(service_type)
+    if code in UNRESTRICTED_SERVICE_TYPES:
+        return None
+    return [code, ANY_SERVICE]
+
+
+def can_serve(codes, service_type):
+    """True if a provider holding `codes` qualifies for the request type."""
+    required = required_capabilities(service_type)
+    return required is None or not codes.isdisjoint(required)
+
+
+def sync_provider_capabilities(provider):
+    """Brings the provider's ProviderCapability rows in line with service_types."""
+    from .models import ProviderCapability
+
+    wanted = capability_codes(provider.service_types)
+    current = set(provider.capabilities.values_list("service_type", flat=True))
+
+    if current - wanted:
+        provider.capabilities.filter(service_type__in=current - wanted).delete()
+    if wanted - current:
+        ProviderCapability.objects.bulk_create(
+            [ProviderCapability(provider=provider, service_type=code) for code in wanted - current],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+from apps.common.geo import encode_geohash
+
+
+def populate_geo_cells(apps, schema_editor):
+    ServiceProvider = apps.get_model("users", "ServiceProvider")
+    providers = ServiceProvider.objects.exclude(latitude=None).exclude(longitude=None)
+    batch = []
+    for provider in providers.iterator():
+        provider.geo_cell = encode_geohash(provider.latitude, provider.longitude)
+        batch.append(provider)
+    ServiceProvider.objects.bulk_update(batch, ["geo_cell"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_customuser_role"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="serviceprovider",
+            name="geo_cell",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="Geohash of the last known location, used for nearby lookups.",
+                max_length=12,
+            ),
+        ),
+        migrations.RunPython(populate_geo_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+# Request states in which the assigned provider is busy
+ACTIVE_JOB_STATUSES = [
+    "DISPATCHED",
+    "ARRIVED",
+    "SERVICE_IN_PROGRESS",
+    "AWAITING_FINAL_FARE",
+    "FINAL_FARE_PENDING",
+]
+
+
+def mark_providers_on_job(apps, schema_editor):
+    ServiceProvider = apps.get_model("users", "ServiceProvider")
+    ServiceRequest = apps.get_model("services", "ServiceRequest")
+    busy = ServiceRequest.objects.filter(
+        status__in=ACTIVE_JOB_STATUSES, provider__isnull=False
+    ).values("provider_id")
+    ServiceProvider.objects.filter(user_id__in=busy).update(is_on_job=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_serviceprovider_geo_cell"),
+        ("services", "0019_replacement_vehicle_nullable_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="serviceprovider",
+            name="is_on_job",
+            field=models.BooleanField(
+                default=False,
+                help_text="Set atomically when the provider is claimed for a job, cleared when it closes.",
+            ),
+        ),
+        migrations.RunPython(mark_providers_on_job, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from apps.users.capabilities import capability_codes
+
+
+def populate_capabilities(apps, schema_editor):
+    ServiceProvider = apps.get_model("users", "ServiceProvider")
+    ProviderCapability = apps.get_model("users", "ProviderCapability")
+    batch = []
+    for provider_id, service_types in ServiceProvider.objects.values_list("user_id", "service_types").iterator():
+        batch.extend(
+            ProviderCapability(provider_id=provider_id, service_type=code)
+            for code in capability_codes(service_types)
+        )
+    ProviderCapability.objects.bulk_create(batch, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_serviceprovider_is_on_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProviderCapability",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("service_type", models.CharField(max_length=50)),
+                (
+                    "provider",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="capabilities",
+                        to="users.serviceprovider",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["service_type", "provider"], name="users_provi_service_800d4f_idx")],
+                "constraints": [
+                    models.UniqueConstraint(fields=("provider", "service_type"), name="unique_provider_capability")
+                ],
+            },
+        ),
+        migrations.RunPython(populate_capabilities, migrations.RunPython.noop),
+    ]
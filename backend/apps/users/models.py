@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+
+from apps.common.geo import encode_geohash
 # gettext_lazy not used in this file
 
 # --- Custom User Model ---
@@ -74,6 +76,10 @@ class ServiceProvider(models.Model):
     is_available = models.BooleanField(
         default=False, help_text="Provider toggle for receiving jobs."
     )
+    is_on_job = models.BooleanField(
+        default=False,
+        help_text="Set atomically when the provider is claimed for a job, cleared when it closes.",
+    )
 
     # Banking/Payout Details (for automatic daily settlements)
     bank_account_number = models.CharField(max_length=20, blank=True, null=True)
@@ -90,15 +96,59 @@ class ServiceProvider(models.Model):
     longitude = models.DecimalField(
         max_digits=10, decimal_places=8, null=True, blank=True
     )
+    geo_cell = models.CharField(
+        max_length=12,
+        blank=True,
+        default="",
+        db_index=True,
+        editable=False,
+        help_text="Geohash of the last known location, used for nearby lookups.",
+    )
 
     # Performance Metrics
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
     jobs_completed = models.IntegerField(default=0)
 
+    def save(self, *args, **kwargs):
+        # Keep the geohash cell in step with the coordinates
+        if self.latitude is not None and self.longitude is not None:
+            self.geo_cell = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geo_cell = ""
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"geo_cell"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Provider: {self.user.username} ({'Verified' if self.is_verified else 'Unverified'})"
 
 
+class ProviderCapability(models.Model):
+    """
+    One row per service a provider can perform, derived from
+    ServiceProvider.service_types (see apps/users/capabilities.py) and kept
+    in sync by a post_save signal. Dispatch filters on this index.
+    """
+
+    provider = models.ForeignKey(
+        ServiceProvider, on_delete=models.CASCADE, related_name="capabilities"
+    )
+    service_type = models.CharField(max_length=50)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["provider", "service_type"], name="unique_provider_capability"),
+        ]
+        indexes = [
+            models.Index(fields=["service_type", "provider"]),
+        ]
+
+    def __str__(self):
+        return f"{self.provider_id}: {self.service_type}"
+
+
 class Notification(models.Model):
     """Stores in-app notifications for users and admins."""
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications')
@@ -1,6 +1,10 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from apps.services.services.live_location import GEO_MAX_LATITUDE
+
 from .models import CustomUser, ServiceBooker, ServiceProvider, Notification
 
 
@@ -99,8 +103,12 @@ class ProviderRegistrationSerializer(serializers.ModelSerializer):
 class ProviderProfileUpdateSerializer(serializers.ModelSerializer):
     """Updates operational details for the provider."""
 
-    latitude = serializers.DecimalField(max_digits=10, decimal_places=8)
-    longitude = serializers.DecimalField(max_digits=10, decimal_places=8)
+    # Positions outside the GEO index's range would make the live layer's GEOADD fail
+    latitude = serializers.DecimalField(
+        max_digits=10, decimal_places=8,
+        min_value=Decimal(str(-GEO_MAX_LATITUDE)), max_value=Decimal(str(GEO_MAX_LATITUDE)),
+    )
+    longitude = serializers.DecimalField(max_digits=10, decimal_places=8, min_value=-180, max_value=180)
     is_available = serializers.BooleanField()
 
     class Meta:
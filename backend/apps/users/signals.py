@@ -0,0 +1,17 @@
+"""
+Signals for ServiceProvider to keep derived indexes up to date
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .capabilities import sync_provider_capabilities
+from .models import ServiceProvider
+
+
+@receiver(post_save, sender=ServiceProvider)
+def sync_capabilities(sender, instance, created, update_fields=None, **kwargs):
+    """Rebuilds the capability rows whenever service_types may have changed"""
+    # Location pings and availability toggles save with update_fields; skip them
+    if update_fields is not None and "service_types" not in update_fields:
+        return
+    sync_provider_capabilities(instance)
@@ -0,0 +1,43 @@
+import pytest
+from decimal import Decimal
+from types import SimpleNamespace
+
+from apps.services.dispatch_logic import find_nearest_available_provider
+from apps.users.capabilities import ANY_SERVICE, capability_codes, normalise_service_type
+
+
+def codes(provider):
+    return set(provider.capabilities.values_list("service_type", flat=True))
+
+
+def test_labels_normalise_to_request_codes():
+    assert normalise_service_type("Jumpstart") == "BATTERY_JUMP"
+    assert normalise_service_type("flat tire") == "FLAT_TIRE"
+    assert normalise_service_type("Towing") == "TOWING"
+    assert capability_codes([]) == {ANY_SERVICE}
+
+
+@pytest.mark.django_db
+class TestCapabilityIndex:
+
+    def test_index_follows_service_types(self, provider_factory):
+        provider = provider_factory("cap_p1", service_types=["Towing", "Jumpstart"])
+        assert codes(provider) == {"TOWING", "BATTERY_JUMP"}
+
+        provider.service_types = ["Fuel"]
+        provider.save()
+        assert codes(provider) == {"FUEL_DELIVERY"}
+
+    def test_partial_saves_leave_index_alone(self, django_assert_num_queries, provider_factory):
+        provider = provider_factory("cap_p2", service_types=["Towing"])
+        with django_assert_num_queries(1):
+            provider.save(update_fields=["is_available"])
+
+    def test_dispatch_only_considers_capable_providers(self, provider_factory):
+        provider_factory("cap_tow", service_types=["Towing"])
+        jumper = provider_factory("cap_jump", service_types=["Jumpstart"])
+        generalist = provider_factory("cap_any", service_types=[])
+
+        request = SimpleNamespace(latitude=Decimal("12.9716"), longitude=Decimal("77.5946"), service_type="BATTERY_JUMP")
+        found = {p.pk for p in find_nearest_available_provider(request)}
+        assert found == {jumper.pk, generalist.pk}
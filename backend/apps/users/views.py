@@ -5,6 +5,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.services.services.live_location import get_live_location_store
+
 from .models import ServiceBooker, ServiceProvider, Notification
 from .serializers import (
     BookerRegistrationSerializer,
@@ -101,7 +103,21 @@ class ProviderLocationUpdateView(APIView):
             provider, data=request.data, partial=True
         )
         if serializer.is_valid():
-            serializer.save()
+            data = serializer.validated_data
+            latitude = data.pop("latitude", None)
+            longitude = data.pop("longitude", None)
+
+            # Position pings go to the live layer and are flushed to the DB in batches
+            if latitude is not None and longitude is not None:
+                get_live_location_store().update(provider.pk, latitude, longitude)
+                provider.latitude = latitude
+                provider.longitude = longitude
+
+            # Anything else (e.g. the availability toggle) is written straight away
+            if data:
+                for field, value in data.items():
+                    setattr(provider, field, value)
+                provider.save(update_fields=list(data))
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -9,3 +9,58 @@ from rest_framework.test import APIClient
 def client():
     """Provide DRF APIClient instead of Django test client for tests that use force_authenticate."""
     return APIClient()
+
+
+@pytest.fixture(autouse=True)
+def reset_state_client():
+    """The in-process stand-in for Redis outlives a test; start each one empty."""
+    from apps.services.services.live_location import InMemoryGeoClient, get_state_client
+
+    client = get_state_client()
+    if isinstance(client, InMemoryGeoClient):
+        client.flushall()
+    yield
+
+
+@pytest.fixture
+def fake_sms():
+    """Routes every SMS through a FakeSMSGateway for the test; yields the gateway."""
+    from apps.services.services.sms import FakeSMSGateway, SMSTransport, set_sms_transport
+
+    gateway = FakeSMSGateway()
+    previous = set_sms_transport(SMSTransport(api_key="test-key", gateway=gateway))
+    yield gateway
+    set_sms_transport(previous)
+
+
+@pytest.fixture
+def fake_fcm():
+    """Routes every push through a FakeFCMBackend for the test; yields the backend."""
+    from apps.common.notifications import FakeFCMBackend, PushNotificationService
+
+    backend = FakeFCMBackend()
+    previous = PushNotificationService.set_backend(backend)
+    yield backend
+    PushNotificationService.set_backend(previous)
+
+
+@pytest.fixture
+def provider_factory():
+    """
+    Creates verified, available service providers:
+    provider_factory(username, lat="12.9720", lng="77.5950", **fields).
+    """
+    from decimal import Decimal
+
+    from apps.users.models import CustomUser, ServiceProvider
+
+    def make(username, lat="12.9720", lng="77.5950", **fields):
+        user = CustomUser.objects.create_user(
+            username=username, email=f"{username}@example.com", password="pass", is_service_provider=True
+        )
+        fields = {"is_verified": True, "is_available": True, **fields}
+        return ServiceProvider.objects.create(
+            user=user, latitude=Decimal(str(lat)), longitude=Decimal(str(lng)), **fields
+        )
+
+    return make
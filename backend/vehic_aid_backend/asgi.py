@@ -1,6 +1,5 @@
 import os
 
-from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 
@@ -9,13 +8,14 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "vehic_aid_backend.settings.prod
 
 # Import routing from the services app
 import apps.services.routing
+from apps.common.channels_auth import JWTAuthMiddlewareStack
 
 application = ProtocolTypeRouter(
     {
         # Standard Django HTTP requests are delegated to the WSGI application
         "http": get_asgi_application(),
-        # WebSocket requests (wss://) are handled here
-        "websocket": AuthMiddlewareStack(
+        # WebSocket requests (wss://) are handled here, authenticated by JWT
+        "websocket": JWTAuthMiddlewareStack(
             URLRouter(apps.services.routing.websocket_urlpatterns)
         ),
     }
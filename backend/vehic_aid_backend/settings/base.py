@@ -225,6 +225,7 @@ REST_FRAMEWORK = {
         "anon": "100/day",
         "user": "1000/day",
         "booking": "20/hour",  # Custom scope for booking security
+        "iot_ingest": "600/minute",  # MQTT gateway batches
     },
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "EXCEPTION_HANDLER": "vehic_aid_backend.security.generic_exception_handler",
@@ -312,6 +313,14 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 
+# IoT button presses (and the finalize step of their dispatch) get a queue of
+# their own so an emergency never waits behind bulk jobs. Run a dedicated
+# worker for it: celery -A vehic_aid_backend worker -Q iot_priority --prefetch-multiplier=1
+IOT_PRIORITY_QUEUE = "iot_priority"
+CELERY_TASK_ROUTES = {
+    "iot.process_button_press": {"queue": IOT_PRIORITY_QUEUE},
+}
+
 # Channels Layer configuration (using Redis locally/in prod)
 CHANNEL_LAYERS = {
     "default": {
@@ -328,6 +337,73 @@ VEHIC_AID_COMMISSION_RATE = 0.25  # 25% commission rate (provider receives 75%)
 PLATFORM_COMMISSION_RATE = 0.25  # Alias for financial_tools.py
 PLATFORM_FEE = 11.00  # ₹11 per service
 
+# Dispatch: providers further than this are never considered for a request
+DISPATCH_SEARCH_RADIUS_KM = env.float("DISPATCH_SEARCH_RADIUS_KM", default=50.0)
+DISPATCH_CANDIDATE_LIMIT = 3
+# Surge mode: queue requests and match each window's backlog in one optimised batch
+DISPATCH_BATCH_MODE = env.bool("DISPATCH_BATCH_MODE", default=False)
+DISPATCH_BATCH_WINDOW_SECONDS = 5
+DISPATCH_BATCH_SIZE = 500
+# Escalation of dispatched requests nobody progresses: backoff doubles from
+# DISPATCH_ESCALATION_MINUTES and the radius grows each attempt
+DISPATCH_ESCALATION_MINUTES = 15
+DISPATCH_ESCALATION_MAX_MINUTES = 240
+DISPATCH_MAX_ATTEMPTS = 5
+DISPATCH_ESCALATION_RADIUS_GROWTH = 1.5
+DISPATCH_MAX_SEARCH_RADIUS_KM = 150.0
+ESCALATION_SWEEP_LIMIT = 2000
+ESCALATION_CHUNK_SIZE = 100
+
+# Live provider pings older than this are ignored by dispatch and tracking
+LIVE_LOCATION_FRESHNESS_SECONDS = 300
+# Tracking WebSocket: a provider's positions are coalesced per connection and
+# published (latest wins) at most once per interval; connections sending
+# more frames per second than the cap are closed
+TRACKING_LOCATION_INTERVAL_SECONDS = 1.0
+TRACKING_MAX_FRAMES_PER_SECOND = 10
+# How stale the publishing provider's assignment may be before it is re-read;
+# a provider reassigned by escalation is disconnected on their next publish
+TRACKING_PROVIDER_RECHECK_SECONDS = 5.0
+# Events kept per request so reconnecting clients can resume with ?since=<seq>
+TRACKING_REPLAY_EVENTS = 200
+TRACKING_REPLAY_TTL_SECONDS = 3600
+
+# Largest batch the bulk IoT ingestion endpoint accepts in one request
+IOT_INGEST_MAX_BATCH = 5000
+
+# MQTT ingestion worker (manage.py run_mqtt_ingest): devices publish to
+# <MQTT_TOPIC_PREFIX>/<device_id>/telemetry and .../button
+MQTT_BROKER_URL = env("MQTT_BROKER_URL", default="mqtt://localhost:1883")
+MQTT_TOPIC_PREFIX = env("MQTT_TOPIC_PREFIX", default="vehicaid/devices")
+MQTT_INGEST_BATCH_SIZE = 500
+MQTT_INGEST_FLUSH_SECONDS = 1.0
+
+# Device telemetry history: raw readings are rolled up hourly (re-rolling the
+# last few hours to catch late readings) and expire before the rollups do
+IOT_TELEMETRY_ROLLUP_LOOKBACK_HOURS = 3
+IOT_TELEMETRY_RAW_RETENTION_DAYS = 14
+IOT_TELEMETRY_HOURLY_RETENTION_DAYS = 365
+IOT_HISTORY_MAX_POINTS = 10000
+
+# Heartbeat write coalescing: a reading is only written to the database when
+# the device moved, its battery changed or the keep-alive interval passed
+IOT_COALESCE_DISTANCE_METERS = 50
+IOT_COALESCE_BATTERY_DELTA = 2
+IOT_COALESCE_MAX_INTERVAL_SECONDS = 900
+
+# Fleet health: devices not heard from for this long count as silent
+IOT_SILENT_MINUTES = 30
+
+# Notification outbox: email/SMS are queued in the database and delivered by
+# the relay_outbox task in batches, with retries and dead-lettering after
+# OUTBOX_MAX_ATTEMPTS
+OUTBOX_BATCH_SIZE = 200
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_RETENTION_DAYS = 7
+
 # Payment Gateway (Razorpay/Stripe) Keys
 RAZORPAY_KEY_ID = env("RAZORPAY_KEY_ID", default="key_id_default")
 RAZORPAY_KEY_SECRET = env("RAZORPAY_KEY_SECRET", default="key_secret_default")
@@ -348,12 +424,48 @@ CELERY_BEAT_SCHEDULE = {
         "task": "apps.services.tasks.send_compliance_reminders",
         "schedule": crontab(hour=9, minute=0),  # 9 AM every day
     },
-    "escalate_stuck_requests_every_15_mins": {
+    "escalate_stuck_requests_every_minute": {
         "task": "apps.services.tasks.auto_escalate_stuck_requests",
-        "schedule": crontab(minute="*/15"),  # Every 15 minutes
+        "schedule": 60.0,  # Cheap indexed sweep; backoff lives on each row
+    },
+    "relay_outbox": {
+        "task": "apps.services.tasks.relay_outbox",
+        "schedule": 10.0,  # Retries and anything a kick missed
+    },
+    "prune_outbox_daily": {
+        "task": "apps.services.tasks.prune_outbox",
+        "schedule": crontab(hour=2, minute=30),  # 2:30 AM every day
+    },
+    "flush_provider_locations": {
+        "task": "apps.services.tasks.flush_provider_locations",
+        "schedule": 10.0,  # Every 10 seconds
+    },
+    "flush_device_last_seen": {
+        "task": "apps.iot_devices.tasks.flush_device_last_seen",
+        "schedule": 60.0,  # Every minute
+    },
+    "rollup_device_telemetry_hourly": {
+        "task": "apps.iot_devices.tasks.rollup_device_telemetry",
+        "schedule": crontab(minute=5),  # Shortly after every hour closes
+    },
+    "prune_device_telemetry_daily": {
+        "task": "apps.iot_devices.tasks.prune_device_telemetry",
+        "schedule": crontab(hour=3, minute=30),  # 3:30 AM every day
+    },
+    "rebuild_fleet_health_daily": {
+        "task": "apps.iot_devices.tasks.rebuild_fleet_health",
+        "schedule": crontab(hour=4, minute=0),  # 4 AM every day
     },
 }
 
+# Batch windows only run in surge mode; otherwise requests are dispatched
+# inline and the job board stays manual
+if DISPATCH_BATCH_MODE:
+    CELERY_BEAT_SCHEDULE["batch_dispatch_pending"] = {
+        "task": "apps.services.tasks.batch_dispatch_pending",
+        "schedule": float(DISPATCH_BATCH_WINDOW_SECONDS),
+    }
+
 # Configures all models to use a BigAutoField (64-bit) for the primary key by default.
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -375,20 +487,39 @@ EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='VehicAid <noreply@vehicaid.com>')
 SERVER_EMAIL = env('SERVER_EMAIL', default=DEFAULT_FROM_EMAIL)
 EMAIL_TIMEOUT = 10  # seconds
+# Batched sends (outbox relay) share this many persistent SMTP connections
+EMAIL_CONNECTIONS = 4
 
 # SMS Configuration
 SMS_PROVIDER = env('SMS_PROVIDER', default='fast2sms')
 FAST2SMS_API_KEY = env('FAST2SMS_API_KEY', default='')
 SMS_API_KEY = FAST2SMS_API_KEY # Alias for Service usage
+# One pooled transport carries every SMS (apps/services/services/sms.py):
+# same-text recipients share bulk calls, calls run SMS_CONCURRENCY at a time
+# and SMS_DAILY_QUOTA (0 = unlimited; the free plan allows 50) caps sends
+SMS_CONCURRENCY = 8
+SMS_NUMBERS_PER_CALL = 100
+SMS_TIMEOUT_SECONDS = 10
+SMS_DAILY_QUOTA = env.int('SMS_DAILY_QUOTA', default=0)
+# Answer SMS locally instead of calling Fast2SMS (load tests, demos)
+SMS_FAKE_GATEWAY = env.bool('SMS_FAKE_GATEWAY', default=False)
 
 # Google Maps Configuration
 GOOGLE_MAPS_API_KEY = env("GOOGLE_MAPS_API_KEY", default="")
+# Route cache for Distance Matrix lookups, keyed on coordinates snapped to ~11m
+DISTANCE_MATRIX_CACHE_TTL_SECONDS = 15 * 60
+DISTANCE_MATRIX_CACHE_SIZE = 10000
 
 # Razorpay Webhook Configuration
 RAZORPAY_WEBHOOK_SECRET = env("RAZORPAY_WEBHOOK_SECRET", default="test_secret")
 
 # Firebase/Push Notification Configuration
 FIREBASE_CONFIG = env.json("FIREBASE_CONFIG", default={})
+# Pushes are flushed in send_each / multicast calls of up to this many
+# messages (FCM allows 500); dead tokens are cleared after each flush
+FCM_BATCH_SIZE = 500
+# Record pushes instead of calling FCM (load tests, demos)
+PUSH_FAKE_BACKEND = env.bool("PUSH_FAKE_BACKEND", default=False)
 
 # Import logging configuration
 from .logging_config import LOGGING
@@ -22,6 +22,12 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Concurrency tests write from several threads: wait for the lock
+        # instead of failing, and take it up front so transactions never
+        # deadlock upgrading from a read lock
+        "OPTIONS": {"timeout": 20, "transaction_mode": "IMMEDIATE"},
+        # A file (not shared in-memory) database so threads get real locking
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
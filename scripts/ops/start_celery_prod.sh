@@ -15,7 +15,12 @@ echo "Starting Vehic-Aid Production Background Services..."
 # -P gevent/eventlet for higher concurrency on cloud infrastructure
 # -c 4 sets concurrency (adjust based on CPU cores)
 echo "Starting Celery Worker..."
-celery -A ${CELERY_APP} worker -l ${LOG_LEVEL} -P gevent -c 4 & 
+celery -A ${CELERY_APP} worker -l ${LOG_LEVEL} -P gevent -c 4 -Q celery -n default@%h & 
+
+# IoT emergencies get their own worker so they never queue behind bulk jobs;
+# prefetch 1 keeps a slow job from holding presses another process could take
+echo "Starting IoT Priority Worker..."
+celery -A ${CELERY_APP} worker -l ${LOG_LEVEL} -c 2 -Q iot_priority --prefetch-multiplier=1 -n iot_priority@%h &
 
 # 2. Start Celery Beat Scheduler (Must be a single instance for scheduled tasks)
 # The pidfile is necessary to ensure only one instance runs
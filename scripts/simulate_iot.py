@@ -1,44 +1,394 @@
-import requests
-import time
+"""
+IoT fleet simulator and ingestion load generator.
+
+Drives tens of thousands of virtual two-button devices against the
+ingestion API from a single asyncio process and reports what the backend
+did with them: ingestion latency percentiles per kind of request, status
+codes, rejected readings and the error rate. Use it to size ingestion
+workers before a spike, not to test correctness.
+
+Register the fleet first (ingestion rejects unknown devices):
+
+    python backend/manage.py seed_iot_fleet --devices 20000 --paired
+
+Then, for example:
+
+    # One reading, as before
+    python scripts/simulate_iot.py send SIM-0 --button 2
+
+    # 20k devices heartbeating every 30s through the bulk endpoint for 5 minutes
+    python scripts/simulate_iot.py fleet --devices 20000 --heartbeat 30 --duration 300
+
+    # A highway pile-up: 150 devices within 500m press "towing" within 20s
+    python scripts/simulate_iot.py fleet --devices 20000 --scenario pileup --burst-devices 150
+
+    # Monsoon evening: heartbeats twice as often and breakdowns across the city
+    python scripts/simulate_iot.py fleet --devices 20000 --scenario monsoon --json > monsoon.json
+
+Heartbeats go either one per request to data-ingest/ (--mode single, how
+devices talking HTTP directly behave) or through a simulated gateway that
+batches them into data-ingest/bulk/ (--mode bulk, the default). Button
+presses are never held back by the gateway. If the simulator itself cannot
+keep up, the "schedule lag" line says so; lower the fleet or raise
+--concurrency before trusting the numbers.
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import math
 import random
 import sys
+import time
+from collections import Counter, defaultdict
 
-BASE_URL = "http://localhost:8001/api/v1/iot/data-ingest/"
-
-def send_iot_data(device_id, latitude, longitude, button_pressed=None, battery=100):
-    payload = {
-        "device_id": device_id,
-        "latitude": latitude,
-        "longitude": longitude,
-        "battery": battery
-    }
-    if button_pressed:
-        payload["button_pressed"] = button_pressed
-        
-    print(f"Sending data for device {device_id}: {payload}")
-    try:
-        response = requests.post(BASE_URL, json=payload)
-        if response.status_code == 202:
-            print(f"Successfully sent data. Status: {response.status_code}")
+import httpx
+
+DEFAULT_BASE_URL = "http://localhost:8001/api/v1/iot/"
+
+# Bangalore: city centre, and a stretch of NH44 north of Hebbal for pile-ups
+CITY_CENTRE = (12.9716, 77.5946)
+CITY_SPREAD_DEG = 0.08
+HIGHWAY = ((13.0358, 77.5970), (13.1986, 77.7066))
+
+KM_PER_DEG = 111.0
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class VirtualDevice:
+    """A device's position and battery, advanced one heartbeat at a time."""
+
+    __slots__ = ("device_id", "latitude", "longitude", "battery", "heading", "moving")
+
+    def __init__(self, device_id, rng, moving_share):
+        self.device_id = device_id
+        self.latitude = CITY_CENTRE[0] + rng.gauss(0, CITY_SPREAD_DEG)
+        self.longitude = CITY_CENTRE[1] + rng.gauss(0, CITY_SPREAD_DEG)
+        self.battery = rng.randint(30, 100)
+        self.heading = rng.uniform(0, 2 * math.pi)
+        self.moving = rng.random() < moving_share
+
+    def _reading(self, **extra):
+        return {
+            "device_id": self.device_id,
+            "latitude": f"{self.latitude:.8f}",
+            "longitude": f"{self.longitude:.8f}",
+            "battery": self.battery,
+            "timestamp": time.time(),
+            **extra,
+        }
+
+    def heartbeat(self, rng):
+        if self.moving:
+            # ~200m per heartbeat, turning now and then
+            self.heading += rng.gauss(0, 0.3)
+            self.latitude += 0.0018 * math.cos(self.heading)
+            self.longitude += 0.0018 * math.sin(self.heading)
+        if rng.random() < 0.01:
+            self.battery = max(0, self.battery - 1)
+        # GPS jitter of a few metres
+        self.latitude += rng.gauss(0, 0.00003)
+        self.longitude += rng.gauss(0, 0.00003)
+        return self._reading()
+
+    def press(self, button, latitude=None, longitude=None):
+        if latitude is not None:
+            self.latitude, self.longitude = latitude, longitude
+        return self._reading(button_pressed=button)
+
+
+class Burst:
+    """`devices` devices within `radius_km` of `centre` press `button` over `window` seconds."""
+
+    def __init__(self, name, start, window, devices, button, centre, radius_km):
+        self.name = name
+        self.start = start
+        self.window = window
+        self.devices = devices
+        self.button = button
+        self.centre = centre
+        self.radius_km = radius_km
+
+    def presses(self, rng, fleet):
+        """(offset seconds, device, latitude, longitude) for every press of the burst."""
+        events = []
+        for device in rng.sample(fleet, min(self.devices, len(fleet))):
+            distance = self.radius_km * math.sqrt(rng.random()) / KM_PER_DEG
+            angle = rng.uniform(0, 2 * math.pi)
+            latitude = self.centre[0] + distance * math.cos(angle)
+            longitude = self.centre[1] + distance * math.sin(angle)
+            events.append((self.start + rng.uniform(0, self.window), device, latitude, longitude))
+        return events
+
+
+def build_scenario(args, rng):
+    """Returns (bursts, heartbeat interval multiplier) for the chosen scenario."""
+    if args.scenario == "pileup":
+        # Somewhere along the highway, everyone nearby needs a tow
+        t = rng.random()
+        centre = tuple(a + (b - a) * t for a, b in zip(*HIGHWAY))
+        return [Burst("pileup", args.burst_at, args.burst_window, args.burst_devices, 2, centre, 0.5)], 1.0
+    if args.scenario == "monsoon":
+        # Waterlogged roads: breakdowns all over town, and anxious devices
+        # (and owners) report twice as often
+        return [
+            Burst("monsoon-breakdowns", args.burst_at, max(args.burst_window, args.duration / 2),
+                  args.burst_devices, 1, CITY_CENTRE, CITY_SPREAD_DEG * KM_PER_DEG * 2),
+            Burst("monsoon-tows", args.burst_at + args.burst_window, args.burst_window,
+                  max(1, args.burst_devices // 5), 2, CITY_CENTRE, CITY_SPREAD_DEG * KM_PER_DEG),
+        ], 0.5
+    return [], 1.0
+
+
+class Stats:
+    """Latency, status codes and rejections per kind of request."""
+
+    def __init__(self):
+        self.latencies_ms = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.readings = Counter()
+        self.rejected = Counter()
+        self.lag_ms = []
+
+    def record(self, kind, status, latency_ms, readings, rejected=0):
+        self.latencies_ms[kind].append(latency_ms)
+        self.statuses[kind][status] += 1
+        self.readings[kind] += readings
+        self.rejected[kind] += rejected
+
+    def summary(self, elapsed):
+        kinds = {}
+        for kind, latencies in self.latencies_ms.items():
+            statuses = self.statuses[kind]
+            requests = sum(statuses.values())
+            errors = sum(n for status, n in statuses.items() if status == "error" or int(status) >= 400)
+            kinds[kind] = {
+                "requests": requests,
+                "readings": self.readings[kind],
+                "readings_per_second": self.readings[kind] / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+                "p99_ms": percentile(latencies, 0.99),
+                "max_ms": max(latencies),
+                "error_rate": errors / requests,
+                "throttled": statuses.get("429", 0),
+                "rejected_readings": self.rejected[kind],
+                "statuses": dict(statuses),
+            }
+        return {
+            "elapsed_s": elapsed,
+            "schedule_lag_p99_ms": percentile(self.lag_ms, 0.99),
+            "kinds": kinds,
+        }
+
+
+class FleetSimulator:
+    """Schedules heartbeats and presses for the whole fleet on one event loop."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.base_url = args.base_url.rstrip("/") + "/"
+        self.fleet = [
+            VirtualDevice(f"{args.prefix}{i}", self.rng, args.moving) for i in range(args.devices)
+        ]
+        self.bursts, multiplier = build_scenario(args, self.rng)
+        self.interval = args.heartbeat * multiplier
+        self.stats = Stats()
+        self.buffer = []
+        self.in_flight = asyncio.Semaphore(args.concurrency)
+        self.tasks = set()
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _post(self, client, kind, path, body, readings):
+        async with self.in_flight:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, content=body, headers={"Content-Type": "application/json"})
+                status = str(response.status_code)
+                rejected = 0
+                if path.endswith("bulk/") and response.status_code in (202, 400):
+                    rejected = len(response.json().get("rejected", []))
+            except httpx.HTTPError:
+                status, rejected = "error", readings
+            self.stats.record(kind, status, (time.perf_counter() - start) * 1000, readings, rejected)
+
+    def _send(self, client, kind, readings):
+        if self.args.mode == "single":
+            for reading in readings:
+                self._spawn(self._post(client, kind, "data-ingest/", json.dumps(reading), 1))
         else:
-            print(f"Failed to send data. Status: {response.status_code}, Body: {response.text}")
-    except Exception as e:
+            self._spawn(self._post(client, kind, "data-ingest/bulk/", json.dumps(readings), len(readings)))
+
+    def _flush(self, client):
+        if self.buffer:
+            readings, self.buffer = self.buffer, []
+            self._send(client, "heartbeat", readings)
+
+    def _heartbeat(self, client, device):
+        reading = device.heartbeat(self.rng)
+        if self.args.mode == "single":
+            self._send(client, "heartbeat", [reading])
+            return
+        self.buffer.append(reading)
+        if len(self.buffer) >= self.args.batch:
+            self._flush(client)
+
+    def _schedule(self, started):
+        """Initial heap of (due, order, kind, payload) events."""
+        events = []
+        for order, device in enumerate(self.fleet):
+            # Spread first heartbeats over one interval so the fleet is not in lockstep
+            events.append((started + self.rng.uniform(0, self.interval), order, "heartbeat", device))
+        order = len(events)
+        for burst in self.bursts:
+            for offset, device, latitude, longitude in burst.presses(self.rng, self.fleet):
+                events.append((started + offset, order, "button", (device, burst.button, latitude, longitude)))
+                order += 1
+        heapq.heapify(events)
+        return events, order
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.args.timeout) as client:
+            started = time.monotonic()
+            deadline = started + self.args.duration
+            events, order = self._schedule(started)
+            next_flush = started + self.args.flush
+            next_report = started + self.args.report_every
+
+            while events and events[0][0] < deadline:
+                due, _, kind, payload = events[0]
+                now = time.monotonic()
+                wake = min(due, next_flush) if self.args.mode == "bulk" else due
+                if wake > now:
+                    await asyncio.sleep(wake - now)
+                    now = time.monotonic()
+                if self.args.mode == "bulk" and now >= next_flush:
+                    self._flush(client)
+                    next_flush = now + self.args.flush
+                if now >= next_report:
+                    self._progress(now - started)
+                    next_report = now + self.args.report_every
+                if due > now:
+                    continue
+
+                heapq.heappop(events)
+                self.stats.lag_ms.append((now - due) * 1000)
+                if kind == "heartbeat":
+                    self._heartbeat(client, payload)
+                    jittered = self.interval * self.rng.uniform(0.8, 1.2)
+                    heapq.heappush(events, (due + jittered, order, "heartbeat", payload))
+                    order += 1
+                else:
+                    device, button, latitude, longitude = payload
+                    # A gateway forwards presses at once, ahead of the batching window
+                    self._send(client, "button", [device.press(button, latitude, longitude)])
+
+            self._flush(client)
+            if self.tasks:
+                await asyncio.wait(set(self.tasks))
+            return self.stats.summary(time.monotonic() - started)
+
+    def _progress(self, elapsed):
+        sent = sum(self.stats.readings.values())
+        errors = sum(
+            n for statuses in self.stats.statuses.values() for status, n in statuses.items()
+            if status == "error" or int(status) >= 400
+        )
+        print(
+            f"[{elapsed:6.0f}s] {sent} readings ({sent / elapsed:.0f}/s), {errors} failed requests, "
+            f"{len(self.tasks)} in flight",
+            file=sys.stderr,
+        )
+
+
+def print_report(report, args):
+    print(f"\n--- Fleet simulation: {args.devices} devices, {args.mode} mode, scenario {args.scenario} ---")
+    print(f"Elapsed: {report['elapsed_s']:.1f}s, schedule lag p99: {report['schedule_lag_p99_ms']:.1f}ms")
+    print(f"{'kind':>10} {'requests':>9} {'readings/s':>11} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} "
+          f"{'errors':>7} {'429s':>6} {'rejected':>9}")
+    for kind, row in report["kinds"].items():
+        print(
+            f"{kind:>10} {row['requests']:>9} {row['readings_per_second']:>11.0f} "
+            f"{row['p50_ms']:>7.1f}ms {row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms "
+            f"{row['error_rate']:>6.1%} {row['throttled']:>6} {row['rejected_readings']:>9}"
+        )
+    if report["schedule_lag_p99_ms"] > 1000:
+        print("Warning: the simulator fell behind its schedule; results understate the offered load.")
+
+
+def send_one(args):
+    """Sends a single reading, like the original script did."""
+    device = VirtualDevice(args.device_id, random.Random(), moving_share=0)
+    reading = device.press(args.button) if args.button else device.heartbeat(random.Random())
+    print(f"Sending data for device {args.device_id}: {reading}")
+    try:
+        response = httpx.post(args.base_url.rstrip("/") + "/data-ingest/", json=reading, timeout=args.timeout)
+    except httpx.HTTPError as e:
         print(f"Error: {e}")
+        return 1
+    if response.status_code == 202:
+        print(f"Successfully sent data. Status: {response.status_code}")
+        return 0
+    print(f"Failed to send data. Status: {response.status_code}, Body: {response.text}")
+    return 1
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python simulate_iot.py <device_id> [button_id]")
-        sys.exit(1)
-        
-    device_id = sys.argv[1]
-    
-    # Coordinates for simulation (Bangalore central)
-    lat = 12.9716 + (random.random() - 0.5) * 0.01
-    lng = 77.5946 + (random.random() - 0.5) * 0.01
-    
-    if len(sys.argv) == 3:
-        btn = int(sys.argv[2])
-        send_iot_data(device_id, lat, lng, button_pressed=btn)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="IoT API root")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Request timeout in seconds")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    send = commands.add_parser("send", help="Send one reading")
+    send.add_argument("device_id")
+    send.add_argument("--button", type=int, choices=[1, 2], help="Press a button instead of a heartbeat")
+
+    fleet = commands.add_parser("fleet", help="Drive a virtual fleet and report ingestion latency")
+    fleet.add_argument("--devices", type=int, default=1000, help="Virtual devices")
+    fleet.add_argument("--prefix", default="SIM-", help="Device ID prefix, as given to seed_iot_fleet")
+    fleet.add_argument("--heartbeat", type=float, default=30.0, help="Mean seconds between a device's heartbeats")
+    fleet.add_argument("--moving", type=float, default=0.2, help="Share of devices that are driving")
+    fleet.add_argument("--duration", type=float, default=60.0, help="Seconds to run")
+    fleet.add_argument("--mode", choices=["bulk", "single"], default="bulk",
+                       help="Batch heartbeats through a gateway, or one request per reading")
+    fleet.add_argument("--batch", type=int, default=500, help="Gateway batch size (bulk mode)")
+    fleet.add_argument("--flush", type=float, default=1.0, help="Gateway flush interval in seconds (bulk mode)")
+    fleet.add_argument("--concurrency", type=int, default=100, help="Requests in flight at most")
+    fleet.add_argument("--scenario", choices=["steady", "pileup", "monsoon"], default="steady")
+    fleet.add_argument("--burst-at", type=float, default=10.0, help="Seconds into the run the burst starts")
+    fleet.add_argument("--burst-window", type=float, default=20.0, help="Seconds the burst's presses spread over")
+    fleet.add_argument("--burst-devices", type=int, default=100, help="Devices pressing in the burst")
+    fleet.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    fleet.add_argument("--seed", type=int, default=1, help="Random seed, same seed = same fleet and bursts")
+    fleet.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "send":
+        return send_one(args)
+
+    report = asyncio.run(FleetSimulator(args).run())
+    if args.json:
+        print(json.dumps(report, indent=2))
     else:
-        # Send a regular heartbeat
-        send_iot_data(device_id, lat, lng, battery=random.randint(80, 100))
+        print_report(report, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
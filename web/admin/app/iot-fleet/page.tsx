@@ -10,15 +10,29 @@ import { motion } from 'framer-motion';
 
 export default function IoTFleetPage() {
     const [devices, setDevices] = useState<any[]>([]);
+    const [health, setHealth] = useState<any>(null);
+    const [nextPage, setNextPage] = useState<string | null>(null);
     const [loading, setLoading] = useState(true);
     const [filter, setFilter] = useState('');
 
+    const loadMore = async () => {
+        if (!nextPage) return;
+        const res = await apiClient.get(nextPage);
+        setDevices(prev => [...prev, ...res.data.results]);
+        setNextPage(res.data.next);
+    };
 
     useEffect(() => {
         const fetchFleet = async () => {
             try {
-                const res = await apiClient.get('/iot/fleet-status/');
-                setDevices(res.data);
+                // Totals come precomputed; devices are listed a cursor page at a time
+                const [healthRes, listRes] = await Promise.all([
+                    apiClient.get('/iot/fleet-health/'),
+                    apiClient.get('/iot/fleet-status/'),
+                ]);
+                setHealth(healthRes.data);
+                setDevices(listRes.data.results);
+                setNextPage(listRes.data.next);
             } catch (err) {
                 console.error("Fleet fetch error", err);
             } finally {
@@ -55,6 +69,24 @@ export default function IoTFleetPage() {
                 </div>
             </div>
 
+            {health && (
+                <div className="grid gap-4 md:grid-cols-4">
+                    {[
+                        ['Devices', health.total],
+                        ['Active', health.active],
+                        [`Silent > ${health.silent_minutes} min`, health.silent],
+                        ['Critical battery', health.battery.critical],
+                    ].map(([label, value]) => (
+                        <Card key={label} className="glass-card">
+                            <CardContent className="pt-6">
+                                <p className="text-[10px] text-muted-foreground uppercase font-bold">{label}</p>
+                                <p className="text-2xl font-bold">{value}</p>
+                            </CardContent>
+                        </Card>
+                    ))}
+                </div>
+            )}
+
             <div className="grid gap-6 md:grid-cols-2 lg:grid-cols-3">
                 {loading ? (
                     [1, 2, 3].map(i => <div key={i} className="h-48 bg-card/50 rounded-2xl animate-pulse" />)
@@ -113,6 +145,14 @@ export default function IoTFleetPage() {
                 ))}
             </div>
 
+            {!loading && nextPage && (
+                <div className="text-center">
+                    <button onClick={loadMore} className="text-sm text-primary hover:underline">
+                        Load more devices
+                    </button>
+                </div>
+            )}
+
             {!loading && filteredDevices.length === 0 && (
                 <div className="text-center py-20">
                     <Activity className="mx-auto text-muted-foreground opacity-20" size={64} />
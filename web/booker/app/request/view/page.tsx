@@ -112,7 +112,9 @@ function RequestStatusContent() {
             console.warn("Invalid API URL for WS, falling back to localhost", e);
         }
 
-        const wsUrl = `${wsProtocol}//${wsHost}/ws/service/${id}/`;
+        // Browsers cannot set headers on a WebSocket handshake, so the JWT goes in the query string
+        const token = localStorage.getItem('customer_access_token') || '';
+        const wsUrl = `${wsProtocol}//${wsHost}/ws/service/${id}/?token=${encodeURIComponent(token)}`;
 
         const ws = new WebSocket(wsUrl);
         socketRef.current = ws;
@@ -140,7 +142,7 @@ function RequestStatusContent() {
                     return prev ? { ...prev, status: data.status } : null;
                 });
             }
-            if (data.type === 'status_update' && data.message === 'location') {
+            if (data.type === 'location') {
                 console.debug("Provider Location:", data.latitude, data.longitude);
             }
         };